@@ -1,6 +1,8 @@
 from django.contrib import admin
 # Importamos los modelos con sus NOMBRES NUEVOS
-from .models import Madre, Parto, RecienNacido, Alta, LogAudit, Perfil
+from .models import Madre, Parto, RecienNacido, Alta, LogAudit, Perfil, ArchivoAuditoria
+from .busqueda import candidatos_por_nombre
+from core.hashing import blind_indexer
 
 # 1. Perfil (Roles)
 @admin.register(Perfil)
@@ -15,6 +17,16 @@ class MadreAdmin(admin.ModelAdmin):
     search_fields = ('nombre_completo', 'rut')
     list_filter = ('nacionalidad', 'comuna')
 
+    # Los campos están cifrados: buscamos por los índices ciegos (RUT exacto o nombre parcial)
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        por_rut = queryset.filter(rut_hash=blind_indexer.rut(search_term))
+        candidatos = candidatos_por_nombre(search_term)
+        if candidatos is None:
+            return por_rut, False
+        return por_rut | queryset.filter(id__in=candidatos), False
+
 # 3. Parto
 @admin.register(Parto)
 class PartoAdmin(admin.ModelAdmin):
@@ -49,4 +61,15 @@ class LogAuditAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
         return False
     def has_delete_permission(self, request, obj=None):
-        return False
\ No newline at end of file
+        return False
+
+# Meses de auditoría ya archivados (solo lectura: los crea archivar_auditoria)
+@admin.register(ArchivoAuditoria)
+class ArchivoAuditoriaAdmin(admin.ModelAdmin):
+    list_display = ('mes', 'archivo', 'filas', 'creado')
+    readonly_fields = ('mes', 'archivo', 'filas', 'sha256', 'desde', 'hasta', 'primer_id', 'ultimo_id', 'creado')
+
+    def has_add_permission(self, request):
+        return False
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ClinicalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'clinical'
+
+    def ready(self):
+        # Conecta las señales (invalidación de la caché de PDF de altas)
+        from . import signals  # noqa: F401
+        # Compila la matriz de permisos por rol (falla aquí si settings tiene un rol inválido)
+        from .permissions import matriz_permisos
+        matriz_permisos.compilar()
@@ -0,0 +1,251 @@
+import os
+import gzip
+import json
+import heapq
+import hashlib
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import LogAudit, ArchivoAuditoria
+
+CAMPOS = ['id', 'usuario', 'rol', 'accion', 'modelo', 'detalles', 'fecha', 'ip_address']
+TABLA = LogAudit._meta.db_table
+
+
+# --- MESES ---
+def inicio_mes(fecha):
+    return timezone.make_aware(datetime.combine(fecha.replace(day=1), time.min))
+
+def mes_siguiente(inicio):
+    return inicio_mes((inicio.replace(day=28) + timedelta(days=4)).date())
+
+def meses_para_archivar(meses_calientes):
+    """Meses cerrados con filas en la tabla caliente, más antiguos que los `meses_calientes` recientes."""
+    limite = inicio_mes(timezone.localdate())
+    for _ in range(meses_calientes):
+        limite = inicio_mes((limite - timedelta(days=1)).date())
+
+    primera = LogAudit.objects.order_by('fecha').values_list('fecha', flat=True).first()
+    if primera is None:
+        return []
+    meses = []
+    inicio = inicio_mes(timezone.localtime(primera).date())
+    while inicio < limite:
+        meses.append(inicio)
+        inicio = mes_siguiente(inicio)
+    return meses
+
+
+# --- ARCHIVO FRÍO ---
+def directorio_archivo():
+    directorio = getattr(settings, 'AUDITORIA_ARCHIVO_DIR')
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+def sha256_archivo(ruta):
+    digest = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+def _escribir_manifiesto():
+    """manifest.json junto a los .gz: permite verificar el archivo sin la BD."""
+    ruta = os.path.join(directorio_archivo(), 'manifest.json')
+    datos = [
+        {'mes': a.mes, 'archivo': a.archivo, 'filas': a.filas, 'sha256': a.sha256,
+         'primer_id': a.primer_id, 'ultimo_id': a.ultimo_id}
+        for a in ArchivoAuditoria.objects.order_by('mes', 'id')
+    ]
+    with open(f"{ruta}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(datos, f, indent=2)
+    os.replace(f"{ruta}.tmp", ruta)
+
+
+def archivar_mes(inicio, batch_size=5000):
+    """
+    Copia las filas del mes a logaudit_AAAA-MM_<n>.jsonl.gz, registra filas y sha256 en
+    ArchivoAuditoria y recién entonces las quita de la tabla caliente.
+    Solo se quitan los id exportados: lo que llegue tarde queda para una parte siguiente.
+    """
+    fin = mes_siguiente(inicio)
+    filas = LogAudit.objects.filter(fecha__gte=inicio, fecha__lt=fin).order_by('id')
+    if not filas.exists():
+        return None
+
+    mes = inicio.strftime('%Y-%m')
+    parte = ArchivoAuditoria.objects.filter(mes=mes).count() + 1
+    nombre = f"logaudit_{mes}_{parte}.jsonl.gz"
+    ruta = os.path.join(directorio_archivo(), nombre)
+
+    total, primer_id, ultimo_id = 0, None, None
+    with gzip.open(f"{ruta}.tmp", 'wt', encoding='utf-8') as f:
+        for fila in filas.values(*CAMPOS).iterator(chunk_size=batch_size):
+            fila['fecha'] = fila['fecha'].isoformat()
+            f.write(json.dumps(fila, ensure_ascii=False) + '\n')
+            total += 1
+            primer_id = primer_id or fila['id']
+            ultimo_id = fila['id']
+    os.replace(f"{ruta}.tmp", ruta)
+
+    # Verificación: el .gz se lee completo y tiene todas las filas antes de borrar nada
+    with gzip.open(ruta, 'rt', encoding='utf-8') as f:
+        if sum(1 for _ in f) != total:
+            os.remove(ruta)
+            raise RuntimeError(f"El archivo de {mes} quedó incompleto; no se borró nada.")
+
+    with transaction.atomic():
+        archivo = ArchivoAuditoria.objects.create(
+            mes=mes, archivo=nombre, filas=total, sha256=sha256_archivo(ruta),
+            desde=inicio, hasta=fin, primer_id=primer_id, ultimo_id=ultimo_id,
+        )
+        if not _soltar_particion(inicio, total):
+            LogAudit.objects.filter(fecha__gte=inicio, fecha__lt=fin, id__lte=ultimo_id).delete()
+    _escribir_manifiesto()
+    return archivo
+
+
+# ruta -> (sha256, tamaño, mtime) de los .gz ya verificados en este proceso
+_verificados = {}
+
+
+def _verificar(archivo, ruta):
+    """Calcula el sha256 solo la primera vez (o si el archivo cambió de tamaño o fecha)."""
+    info = os.stat(ruta)
+    firma = (archivo.sha256, info.st_size, info.st_mtime_ns)
+    if _verificados.get(ruta) == firma:
+        return
+    if sha256_archivo(ruta) != archivo.sha256:
+        raise RuntimeError(f"El archivo {archivo.archivo} no coincide con su checksum.")
+    _verificados[ruta] = firma
+
+
+def leer_archivo(archivo):
+    """Filas de un .gz archivado (como LogAudit sin guardar), verificando antes su sha256."""
+    ruta = os.path.join(directorio_archivo(), archivo.archivo)
+    _verificar(archivo, ruta)
+    with gzip.open(ruta, 'rt', encoding='utf-8') as f:
+        for linea in f:
+            datos = json.loads(linea)
+            datos['fecha'] = parse_datetime(datos['fecha'])
+            yield LogAudit(**datos)
+
+
+def consultar(desde, hasta, filtros=None, limite=1000):
+    """
+    Logs entre `desde` y `hasta` (datetime), más recientes primero, leyendo la tabla caliente
+    y los meses archivados que toquen el rango. `filtros` son igualdades sobre CAMPOS.
+    En memoria quedan a lo más `limite` filas, y los meses más antiguos que lo ya elegido
+    ni se abren. Devuelve (logs, meses_archivados_leidos).
+    """
+    filtros = filtros or {}
+    if limite <= 0:
+        return [], []
+
+    # Min-heap de (fecha, id, log) con los `limite` más recientes vistos hasta ahora
+    elegidos = []
+
+    def considerar(log):
+        if len(elegidos) < limite:
+            heapq.heappush(elegidos, (log.fecha, log.id, log))
+        elif (log.fecha, log.id) > elegidos[0][:2]:
+            heapq.heapreplace(elegidos, (log.fecha, log.id, log))
+
+    for log in LogAudit.objects.filter(fecha__gte=desde, fecha__lt=hasta, **filtros).order_by('-fecha', '-id')[:limite]:
+        considerar(log)
+
+    leidos = set()
+    for archivo in ArchivoAuditoria.objects.filter(desde__lt=hasta, hasta__gt=desde).order_by('-hasta', '-id'):
+        if len(elegidos) == limite and archivo.hasta <= elegidos[0][0]:
+            break  # Este mes y los anteriores son más antiguos que todo lo elegido
+        leidos.add(archivo.mes)
+        for log in leer_archivo(archivo):
+            if desde <= log.fecha < hasta and all(getattr(log, c) == v for c, v in filtros.items()):
+                considerar(log)
+
+    logs = [log for _, _, log in sorted(elegidos, key=lambda e: e[:2], reverse=True)]
+    return logs, sorted(leidos)
+
+
+# --- PARTICIONES MENSUALES (solo PostgreSQL) ---
+def nombre_particion(inicio):
+    return f"{TABLA}_p{inicio:%Y%m}"
+
+def esta_particionada():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLA])
+        return cursor.fetchone() is not None
+
+def convertir_a_particionada():
+    """
+    Convierte clinical_logaudit en tabla particionada por RANGE(fecha) sin copiar datos:
+    la tabla actual se renombra y se adjunta como partición de todo lo anterior al mes siguiente.
+    La PK pasa a ser (id, fecha), requisito de PostgreSQL para particionar.
+    Los índices de LogAudit.Meta se crean en la tabla madre (así los heredan las particiones
+    nuevas) y al adjuntar la tabla antigua PostgreSQL reutiliza los suyos, sin reconstruirlos.
+    """
+    siguiente = mes_siguiente(inicio_mes(timezone.localdate()))
+    legado = f"{TABLA}_legado"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{TABLA}" IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'ALTER TABLE "{TABLA}" RENAME TO "{legado}"')
+        # Los nombres de índice son únicos por esquema: los de la tabla antigua dejan libre el suyo
+        for indice in LogAudit._meta.indexes:
+            cursor.execute(f'ALTER INDEX IF EXISTS "{indice.name}" RENAME TO "{indice.name}_legado"')
+        cursor.execute(
+            f'CREATE TABLE "{TABLA}" (LIKE "{legado}" INCLUDING DEFAULTS INCLUDING IDENTITY) '
+            f'PARTITION BY RANGE (fecha)'
+        )
+        # La identidad nueva parte donde iba la antigua
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE((SELECT MAX(id) FROM \"{legado}\"), 0) + 1, false)",
+            [TABLA],
+        )
+        cursor.execute(f'ALTER TABLE "{TABLA}" ADD PRIMARY KEY (id, fecha)')
+        with connection.schema_editor(atomic=False) as editor:
+            for indice in LogAudit._meta.indexes:
+                editor.add_index(LogAudit, indice)
+        cursor.execute(f'ALTER TABLE "{legado}" ALTER COLUMN id DROP IDENTITY IF EXISTS')
+        cursor.execute(
+            f'ALTER TABLE "{TABLA}" ATTACH PARTITION "{legado}" FOR VALUES FROM (MINVALUE) TO (%s)',
+            [siguiente],
+        )
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS "{TABLA}_default" PARTITION OF "{TABLA}" DEFAULT')
+
+def crear_particiones(meses_adelante):
+    """Crea las particiones mensuales desde el mes siguiente a la tabla legado hasta N meses adelante."""
+    creadas = []
+    inicio = mes_siguiente(inicio_mes(timezone.localdate()))
+    with connection.cursor() as cursor:
+        for _ in range(meses_adelante):
+            fin = mes_siguiente(inicio)
+            nombre = nombre_particion(inicio)
+            cursor.execute("SELECT to_regclass(%s)", [nombre])
+            if cursor.fetchone()[0] is None:
+                cursor.execute(
+                    f'CREATE TABLE "{nombre}" PARTITION OF "{TABLA}" FOR VALUES FROM (%s) TO (%s)',
+                    [inicio, fin],
+                )
+                creadas.append(nombre)
+            inicio = fin
+    return creadas
+
+def _soltar_particion(inicio, filas_archivadas):
+    """Si el mes tiene su propia partición y se archivó entera, se desprende y se borra (instantáneo)."""
+    if not esta_particionada():
+        return False
+    nombre = nombre_particion(inicio)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [nombre])
+        if cursor.fetchone()[0] is None:
+            return False
+        cursor.execute(f'SELECT COUNT(*) FROM "{nombre}"')
+        if cursor.fetchone()[0] != filas_archivadas:
+            return False  # Llegaron filas después de exportar: se borra por rango
+        cursor.execute(f'ALTER TABLE "{TABLA}" DETACH PARTITION "{nombre}"')
+        cursor.execute(f'DROP TABLE "{nombre}"')
+    return True
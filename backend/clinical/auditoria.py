@@ -0,0 +1,141 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class BufferAuditoria:
+    """
+    Cola en memoria de entradas de LogAudit. Un hilo las escribe con bulk_create cuando
+    se juntan AUDITORIA_FLUSH_TAMANO o pasan AUDITORIA_FLUSH_SEGUNDOS, así el INSERT
+    sale del camino del request. La cola tiene tope (AUDITORIA_BUFFER_MAX); si se llena:
+      - 'bloquear': el request espera hasta AUDITORIA_ESPERA_MAX a que el hilo libere espacio
+        y si no alcanza escribe él mismo;
+      - 'sincrono': el request escribe de inmediato todo lo pendiente.
+    Nunca se descartan entradas. Al terminar el proceso se escribe lo que quede.
+    Si el lote falla se reintenta fila por fila; la que tampoco entra queda en el log de errores.
+    """
+
+    def __init__(self, iniciar_hilo=True):
+        self.max_entradas = getattr(settings, 'AUDITORIA_BUFFER_MAX', 10000)
+        self.tamano_flush = getattr(settings, 'AUDITORIA_FLUSH_TAMANO', 100)
+        self.intervalo = getattr(settings, 'AUDITORIA_FLUSH_SEGUNDOS', 2.0)
+        self.politica = getattr(settings, 'AUDITORIA_POLITICA_LLENO', 'bloquear')
+        self.espera_max = getattr(settings, 'AUDITORIA_ESPERA_MAX', 1.0)
+
+        self.cola = deque()
+        self.condicion = threading.Condition()
+        self.iniciar_hilo = iniciar_hilo
+        self.hilo = None
+        self.escritas = 0
+        self.escrituras_directas = 0
+        self.perdidas = 0
+        atexit.register(self.flush)
+
+    @property
+    def sincrono(self):
+        # Se lee en cada llamada para que override_settings funcione en los tests
+        return getattr(settings, 'AUDITORIA_MODO', 'sincrono') == 'sincrono'
+
+    def encolar(self, entradas, inmediato=False):
+        """Agrega instancias de LogAudit (sin guardar). inmediato=True las escribe ya."""
+        entradas = list(entradas)
+        if not entradas:
+            return
+        if inmediato or self.sincrono:
+            self._escribir(entradas)
+            return
+
+        self._asegurar_hilo()
+        with self.condicion:
+            if len(self.cola) + len(entradas) > self.max_entradas and self.politica == 'bloquear':
+                limite = time.monotonic() + self.espera_max
+                self.condicion.notify_all()
+                while len(self.cola) + len(entradas) > self.max_entradas:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self.condicion.wait(restante)
+
+            if len(self.cola) + len(entradas) > self.max_entradas:
+                # Sin espacio: este request paga la escritura (contrapresión, no pérdida)
+                pendientes = list(self.cola) + entradas
+                self.cola.clear()
+            else:
+                self.cola.extend(entradas)
+                pendientes = None
+                if len(self.cola) >= self.tamano_flush:
+                    self.condicion.notify_all()
+
+        if pendientes is not None:
+            self.escrituras_directas += 1
+            self._escribir(pendientes)
+
+    def flush(self):
+        """Escribe todo lo pendiente en el hilo que llama."""
+        with self.condicion:
+            pendientes = list(self.cola)
+            self.cola.clear()
+            self.condicion.notify_all()
+        if pendientes:
+            self._escribir(pendientes)
+
+    def pendientes(self):
+        return len(self.cola)
+
+    def _escribir(self, entradas):
+        from .models import LogAudit
+        try:
+            # Si hay una transacción abierta es un savepoint: el fallo no la deja inservible
+            with transaction.atomic():
+                LogAudit.objects.bulk_create(entradas, batch_size=500)
+            self.escritas += len(entradas)
+            return
+        except Exception:
+            logger.exception("Falló el lote de %s entradas de auditoría; se reintenta fila por fila", len(entradas))
+
+        # Una fila mala (o un corte pasajero) no se lleva al resto del lote
+        for entrada in entradas:
+            # bulk_create pudo asignarles pk antes del rollback
+            entrada.pk = None
+            entrada._state.adding = True
+            try:
+                with transaction.atomic():
+                    entrada.save(force_insert=True)
+                self.escritas += 1
+            except Exception:
+                self.perdidas += 1
+                logger.exception(
+                    "Entrada de auditoría NO guardada: usuario=%s rol=%s accion=%s modelo=%s fecha=%s ip=%s detalles=%r",
+                    entrada.usuario, entrada.rol, entrada.accion, entrada.modelo, entrada.fecha,
+                    entrada.ip_address, entrada.detalles,
+                )
+
+    def _asegurar_hilo(self):
+        if not self.iniciar_hilo or (self.hilo is not None and self.hilo.is_alive()):
+            return
+        with self.condicion:
+            if self.hilo is None or not self.hilo.is_alive():
+                self.hilo = threading.Thread(target=self._bucle, name='auditoria-flush', daemon=True)
+                self.hilo.start()
+
+    def _bucle(self):
+        while True:
+            with self.condicion:
+                if len(self.cola) < self.tamano_flush:
+                    self.condicion.wait(self.intervalo)
+                lote = list(self.cola)
+                self.cola.clear()
+                # Despierta a los requests que esperaban espacio
+                self.condicion.notify_all()
+            if lote:
+                close_old_connections()
+                self._escribir(lote)
+
+# Instancia global
+buffer_auditoria = BufferAuditoria()
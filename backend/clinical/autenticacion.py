@@ -0,0 +1,118 @@
+import threading
+import time
+from django.conf import settings
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+
+class RevocacionesJWT:
+    """
+    Copia en memoria de RevocacionToken (usuario -> instante desde el que sus tokens no valen).
+    Se recarga con una sola consulta cada JWT_REVOCACION_REFRESCO segundos, así el camino
+    caliente de autenticación no toca la BD. El proceso que revoca actualiza su copia al tiro;
+    los demás workers se enteran en la siguiente recarga.
+    """
+
+    def __init__(self):
+        self._desde = {}
+        self._cargado = None
+        self._lock = threading.Lock()
+
+    @property
+    def intervalo(self):
+        return getattr(settings, 'JWT_REVOCACION_REFRESCO', 5)
+
+    @property
+    def vigencia(self):
+        # Pasado esto ya no queda ningún token (ni de refresco) emitido antes de la revocación
+        return settings.SIMPLE_JWT.get('REFRESH_TOKEN_LIFETIME') or api_settings.REFRESH_TOKEN_LIFETIME
+
+    def revocado(self, token):
+        """
+        Compara con el claim `emitido` (epoch con fracción). Los tokens anteriores a ese claim
+        solo traen iat truncado al segundo, que cae antes de una revocación del mismo segundo.
+        """
+        self._recargar_si_toca()
+        desde = self._desde.get(int(token[api_settings.USER_ID_CLAIM]))
+        return desde is not None and token.get('emitido', token['iat']) < desde
+
+    def revocar(self, usuario_id):
+        from .models import RevocacionToken
+        ahora = timezone.now()
+        RevocacionToken.objects.update_or_create(usuario_id=usuario_id, defaults={'desde': ahora})
+        RevocacionToken.objects.filter(desde__lt=ahora - self.vigencia).delete()
+        with self._lock:
+            self._desde = {**self._desde, int(usuario_id): ahora.timestamp()}
+
+    def invalidar(self):
+        """Obliga a recargar desde la BD en la próxima consulta."""
+        self._cargado = None
+
+    def _recargar_si_toca(self):
+        if self._cargado is not None and time.monotonic() - self._cargado < self.intervalo:
+            return
+        from .models import RevocacionToken
+        with self._lock:
+            if self._cargado is not None and time.monotonic() - self._cargado < self.intervalo:
+                return
+            filas = RevocacionToken.objects.filter(desde__gte=timezone.now() - self.vigencia)
+            self._desde = {uid: desde.timestamp() for uid, desde in filas.values_list('usuario_id', 'desde')}
+            self._cargado = time.monotonic()
+
+# Instancia global
+revocaciones = RevocacionesJWT()
+
+
+class UsuarioToken(TokenUser):
+    """Usuario armado solo con los claims del JWT (id, username, rol, staff). No es un modelo."""
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def rol(self):
+        return self.token.get('rol')
+
+    def usuario_bd(self):
+        """El User real, para los pocos casos que lo necesitan (cuesta una consulta)."""
+        from django.contrib.auth.models import User
+        return User.objects.get(pk=self.id)
+
+
+def rol_de(usuario):
+    """Rol del claim (UsuarioToken) o del perfil (User del admin, force_authenticate, etc.)."""
+    rol = getattr(usuario, 'rol', None)
+    if rol:
+        return rol
+    perfil = getattr(usuario, 'perfil', None)
+    return perfil.rol if perfil else None
+
+
+class JWTSinConsultas(JWTAuthentication):
+    """
+    Autentica solo con el token: cero consultas por request. Los tokens emitidos antes de que
+    existieran los claims is_staff/is_superuser se resuelven como antes, cargando el User.
+    """
+
+    def get_user(self, validated_token):
+        if revocaciones.revocado(validated_token):
+            raise AuthenticationFailed('El token fue revocado, inicie sesión nuevamente.', code='token_revocado')
+        if 'is_staff' not in validated_token:
+            return super().get_user(validated_token)
+        return UsuarioToken(validated_token)
+
+
+class TokenRefreshConRevocacion(TokenRefreshSerializer):
+    """Un refresh emitido antes de la revocación no puede sacar access tokens nuevos."""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if revocaciones.revocado(refresh):
+            raise AuthenticationFailed('El token fue revocado, inicie sesión nuevamente.', code='token_revocado')
+        return super().validate(attrs)
@@ -0,0 +1,44 @@
+from django.db.models import Count
+from core.fields import descifrar_en_lote
+from core.hashing import blind_indexer, normalizar_nombre
+from .models import MadreNombreToken
+
+
+def candidatos_por_nombre(texto):
+    """
+    Subconsulta con los id de madres que tienen TODOS los trigramas del texto.
+    Intersección en SQL: agrupa los tokens por madre y exige que estén todos.
+    Devuelve None si el texto no alcanza para un trigrama (palabras de 1 letra).
+    """
+    tokens = blind_indexer.tokens_nombre(texto)
+    if not tokens:
+        return None
+    return (
+        MadreNombreToken.objects.filter(token__in=tokens)
+        .values('madre_id')
+        .annotate(encontrados=Count('token', distinct=True))
+        .filter(encontrados=len(tokens))
+        .values('madre_id')
+    )
+
+
+def buscar_por_nombre(queryset, texto):
+    """
+    Madres cuyo nombre contiene cada palabra del texto como inicio de palabra.
+    Solo se descifran los candidatos del índice; luego se descartan falsos positivos
+    (los trigramas no guardan el orden ni la adyacencia).
+    """
+    candidatos = candidatos_por_nombre(texto)
+    if candidatos is None:
+        return None
+
+    madres = list(queryset.filter(id__in=candidatos))
+    descifrar_en_lote(madres, ['nombre_completo'])
+
+    buscadas = [p for p in normalizar_nombre(texto).split() if len(p) > 1]
+    resultado = []
+    for madre in madres:
+        palabras = normalizar_nombre(madre.nombre_completo).split()
+        if all(any(p.startswith(b) for p in palabras) for b in buscadas):
+            resultado.append(madre)
+    return resultado
@@ -0,0 +1,123 @@
+import os
+import glob
+import json
+import struct
+import time
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from core.encryption import crypto_manager
+from core.hashing import blind_indexer
+
+# Cabecera del contenido cifrado: segundos epoch de cuando se generó el PDF
+_CABECERA = struct.Struct('>d')
+
+
+class CachePDFAltas:
+    """
+    Caché en disco de los PDF de Alta ya renderizados.
+    Cada archivo se llama alta_<id>_<hash>.pdf, donde el hash cubre la versión de la
+    plantilla y todos los datos que entran al PDF: si algo cambia, cambia el nombre.
+    El mtime del archivo hace de "último uso" para desalojar por LRU al pasar el límite.
+
+    Los PDF llevan datos de la paciente: en disco quedan cifrados con crypto_manager
+    (igual que en la BD) junto con su hora de generación, y una copia con más de
+    ALTA_PDF_CACHE_MAX_HORAS, o que ya no se puede descifrar (llave retirada), se descarta.
+    """
+
+    @property
+    def directorio(self):
+        return getattr(settings, 'ALTA_PDF_CACHE_DIR')
+
+    @property
+    def max_bytes(self):
+        return getattr(settings, 'ALTA_PDF_CACHE_MAX_MB', 200) * 1024 * 1024
+
+    @property
+    def max_segundos(self):
+        return getattr(settings, 'ALTA_PDF_CACHE_MAX_HORAS', 24) * 3600
+
+    @property
+    def activa(self):
+        return self.max_bytes > 0
+
+    def clave(self, version_plantilla, datos):
+        # HMAC con la llave del índice ciego: el nombre del archivo no permite confirmar
+        # por fuerza bruta los datos de una paciente (un sha256 pelado sí)
+        contenido = json.dumps(datos, sort_keys=True, cls=DjangoJSONEncoder)
+        return blind_indexer.digest(f"{version_plantilla}:{contenido}", 'pdf_alta')
+
+    def _ruta(self, alta_id, clave):
+        return os.path.join(self.directorio, f"alta_{alta_id}_{clave}.pdf")
+
+    def get(self, alta_id, clave):
+        ruta = self._ruta(alta_id, clave)
+        try:
+            with open(ruta, 'rb') as f:
+                contenido = crypto_manager.decrypt_a_bytes(f.read())
+        except FileNotFoundError:
+            return None
+        if contenido is None or len(contenido) < _CABECERA.size:
+            self._borrar(ruta)  # Ilegible: llave retirada o archivo de antes del cifrado
+            return None
+        generado, = _CABECERA.unpack_from(contenido)
+        if time.time() - generado > self.max_segundos:
+            self._borrar(ruta)
+            return None
+        try:
+            os.utime(ruta)  # Marca de uso para el LRU
+        except FileNotFoundError:
+            pass  # Otro proceso lo desalojó justo ahora; igual ya lo leímos
+        return contenido[_CABECERA.size:]
+
+    def set(self, alta_id, clave, pdf):
+        os.makedirs(self.directorio, exist_ok=True)
+        # Las versiones anteriores de esta alta ya no sirven
+        self.invalidar(alta_id)
+        ruta = self._ruta(alta_id, clave)
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, 'wb') as f:
+            f.write(crypto_manager.encrypt_bytes(_CABECERA.pack(time.time()) + pdf))
+        os.replace(temporal, ruta)
+        self._desalojar()
+
+    def invalidar(self, alta_id):
+        for ruta in glob.glob(os.path.join(self.directorio, f"alta_{alta_id}_*.pdf")):
+            self._borrar(ruta)
+
+    def _borrar(self, ruta):
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+    def _desalojar(self):
+        """Borra los PDF usados hace más tiempo hasta quedar bajo ALTA_PDF_CACHE_MAX_MB."""
+        archivos = []
+        total = 0
+        with os.scandir(self.directorio) as entradas:
+            for entrada in entradas:
+                if not entrada.name.endswith('.pdf'):
+                    continue
+                try:
+                    info = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                archivos.append((info.st_mtime, info.st_size, entrada.path))
+                total += info.st_size
+
+        if total <= self.max_bytes:
+            return
+        for _, tamano, ruta in sorted(archivos):
+            self._borrar(ruta)
+            total -= tamano
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        if not os.path.isdir(self.directorio):
+            return {'archivos': 0, 'bytes': 0, 'max_bytes': self.max_bytes}
+        tamanos = [e.stat().st_size for e in os.scandir(self.directorio) if e.name.endswith('.pdf')]
+        return {'archivos': len(tamanos), 'bytes': sum(tamanos), 'max_bytes': self.max_bytes}
+
+# Instancia global
+cache_altas = CachePDFAltas()
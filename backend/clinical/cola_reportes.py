@@ -0,0 +1,102 @@
+import os
+import uuid
+from contextlib import nullcontext
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from core.replica import estado_replica, usar_replica
+from .models import ReporteJob
+from .reportes import REPORTES
+
+
+def directorio_reportes():
+    directorio = getattr(settings, 'REPORTES_DIR')
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def ruta_archivo(job):
+    return os.path.join(directorio_reportes(), job.archivo)
+
+
+def encolar(tipo, usuario, parametros=None):
+    """Registra el trabajo; un worker de procesar_reportes lo genera después."""
+    definicion = REPORTES[tipo]
+    parametros = parametros or {}
+    return ReporteJob.objects.create(
+        tipo=tipo,
+        parametros=parametros,
+        solicitado_por_id=usuario.id if usuario else None,  # User o UsuarioToken (JWT)
+        nombre_archivo=definicion['archivo'].format(**parametros),
+        content_type=definicion['content_type'],
+    )
+
+
+def tomar_siguiente():
+    """
+    Reserva el PENDIENTE más antiguo. El UPDATE condicionado al estado hace de candado:
+    si dos workers eligen el mismo trabajo, solo a uno le afecta la fila.
+    Funciona igual en SQLite y PostgreSQL, sin SELECT ... FOR UPDATE.
+    """
+    candidatos = (
+        ReporteJob.objects.filter(estado='PENDIENTE')
+        .order_by('creado', 'id')
+        .values_list('id', flat=True)[:10]
+    )
+    for job_id in candidatos:
+        tomado = ReporteJob.objects.filter(pk=job_id, estado='PENDIENTE').update(
+            estado='EN_PROCESO', iniciado=timezone.now(), intentos=F('intentos') + 1,
+        )
+        if tomado:
+            return ReporteJob.objects.select_related('solicitado_por').get(pk=job_id)
+    return None
+
+
+def ejecutar(job):
+    """Genera el archivo en un temporal y lo publica con un rename atómico."""
+    definicion = REPORTES[job.tipo]
+    nombre = f"{job.id}_{uuid.uuid4().hex}{os.path.splitext(job.nombre_archivo)[1]}"
+    ruta = os.path.join(directorio_reportes(), nombre)
+    temporal = f"{ruta}.tmp"
+    try:
+        # Los datos del reporte se leen de la réplica si está al día; el job se actualiza en la primaria
+        lectura = usar_replica() if estado_replica.disponible() else nullcontext()
+        with open(temporal, 'wb') as destino, lectura:
+            definicion['funcion'](destino, job.solicitado_por, **job.parametros)
+        os.replace(temporal, ruta)
+    except Exception as e:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        job.estado = 'ERROR'
+        job.error = str(e) or e.__class__.__name__
+    else:
+        job.estado = 'LISTO'
+        job.archivo = nombre
+        job.expira = timezone.now() + timedelta(hours=getattr(settings, 'REPORTES_TTL_HORAS', 24))
+    job.terminado = timezone.now()
+    job.save(update_fields=['estado', 'archivo', 'error', 'terminado', 'expira'])
+    return job
+
+
+def purgar_vencidos():
+    """Borra del disco los archivos expirados y marca sus trabajos como VENCIDO."""
+    vencidos = ReporteJob.objects.filter(estado='LISTO', expira__lte=timezone.now())
+    total = 0
+    for job in vencidos.only('id', 'archivo'):
+        try:
+            os.remove(ruta_archivo(job))
+        except FileNotFoundError:
+            pass
+        total += ReporteJob.objects.filter(pk=job.pk, estado='LISTO').update(estado='VENCIDO', archivo='')
+    return total
+
+
+def recuperar_colgados():
+    """Trabajos EN_PROCESO de un worker que murió: se reintentan o se dan por fallidos."""
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'REPORTES_JOB_TIMEOUT', 600))
+    colgados = ReporteJob.objects.filter(estado='EN_PROCESO', iniciado__lt=limite)
+    max_intentos = getattr(settings, 'REPORTES_MAX_INTENTOS', 2)
+    reintentados = colgados.filter(intentos__lt=max_intentos).update(estado='PENDIENTE')
+    fallidos = colgados.update(estado='ERROR', error='El worker no terminó el trabajo', terminado=timezone.now())
+    return reintentados, fallidos
@@ -0,0 +1,146 @@
+from collections import Counter
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+
+# --- TRAMOS (REM) ---
+def tramo_edad_gestacional(semanas):
+    """Extremo (<28), muy prematuro (28-31), prematuro (32-36), término (37-41), post-término (42+)."""
+    if semanas is None:
+        return 'S/I'
+    if semanas < 28:
+        return '<28'
+    if semanas < 32:
+        return '28-31'
+    if semanas < 37:
+        return '32-36'
+    if semanas < 42:
+        return '37-41'
+    return '42+'
+
+
+def tramo_peso(gramos):
+    """Extremo bajo peso, muy bajo peso, bajo peso, normal y macrosomía."""
+    if gramos is None:
+        return 'S/I'
+    if gramos < 1000:
+        return '<1000'
+    if gramos < 1500:
+        return '1000-1499'
+    if gramos < 2500:
+        return '1500-2499'
+    if gramos < 4000:
+        return '2500-3999'
+    return '4000+'
+
+
+def _dia(fecha):
+    return timezone.localdate(fecha) if timezone.is_aware(fecha) else fecha.date()
+
+
+# --- CONTRIBUCIONES: qué filas del rollup suma cada registro ---
+def contribuciones_parto(fecha, tipo_parto, edad_gestacional):
+    dia = _dia(fecha)
+    return [
+        (dia, 'partos', 'total'),
+        (dia, 'parto_tipo', (tipo_parto or 'S/I').upper()[:50]),
+        (dia, 'parto_edad_gestacional', tramo_edad_gestacional(edad_gestacional)),
+    ]
+
+
+def contribuciones_rn(fecha_parto, sexo, peso_gramos):
+    dia = _dia(fecha_parto)
+    return [
+        (dia, 'rn', 'total'),
+        (dia, 'rn_sexo', (sexo or 'S/I').upper()[:50]),
+        (dia, 'rn_peso', tramo_peso(peso_gramos)),
+    ]
+
+
+def aplicar(sumar=(), restar=()):
+    """Suma/resta 1 a cada fila del rollup (solo las que cambian, con UPDATE total = total + n)."""
+    from .models import EstadisticaDiaria
+
+    deltas = Counter(sumar)
+    deltas.subtract(restar)
+    with transaction.atomic():
+        for (dia, dimension, valor), delta in deltas.items():
+            if not delta:
+                continue
+            fila = EstadisticaDiaria.objects.filter(fecha=dia, dimension=dimension, valor=valor)
+            if fila.update(total=F('total') + delta):
+                continue
+            try:
+                with transaction.atomic():
+                    EstadisticaDiaria.objects.create(fecha=dia, dimension=dimension, valor=valor, total=delta)
+            except IntegrityError:
+                # Otro proceso creó la fila entre medio
+                fila.update(total=F('total') + delta)
+
+
+def reconstruir(Parto, RecienNacido, EstadisticaDiaria, chunk_size=2000, using='default'):
+    """
+    Recalcula todo el rollup desde Parto/RecienNacido. Recibe los modelos (y la BD) como
+    parámetro para poder usarse también desde una migración (modelos históricos).
+    """
+    conteo = Counter()
+    partos = Parto.objects.using(using).values_list('fecha', 'tipo_parto', 'edad_gestacional')
+    for fecha, tipo, semanas in partos.iterator(chunk_size=chunk_size):
+        conteo.update(contribuciones_parto(fecha, tipo, semanas))
+    recien_nacidos = RecienNacido.objects.using(using).values_list('parto__fecha', 'sexo', 'peso_gramos')
+    for fecha, sexo, peso in recien_nacidos.iterator(chunk_size=chunk_size):
+        conteo.update(contribuciones_rn(fecha, sexo, peso))
+
+    with transaction.atomic(using=using):
+        EstadisticaDiaria.objects.using(using).all().delete()
+        EstadisticaDiaria.objects.using(using).bulk_create(
+            [EstadisticaDiaria(fecha=d, dimension=dim, valor=v, total=t) for (d, dim, v), t in conteo.items() if t],
+            batch_size=chunk_size,
+        )
+    return len(conteo)
+
+
+# --- LECTURA (solo el rollup, nunca Parto/RecienNacido) ---
+def totales_rem(desde=None, hasta=None):
+    """Total de partos y cesáreas en una sola consulta agregada."""
+    from .models import CESAREAS, EstadisticaDiaria
+
+    filas = EstadisticaDiaria.objects.all()
+    if desde:
+        filas = filas.filter(fecha__gte=desde)
+    if hasta:
+        filas = filas.filter(fecha__lte=hasta)
+    totales = filas.aggregate(
+        partos=Sum('total', filter=Q(dimension='partos')),
+        cesareas=Sum('total', filter=Q(dimension='parto_tipo', valor__in=CESAREAS)),
+    )
+    return totales['partos'] or 0, totales['cesareas'] or 0
+
+
+def resumen(desde=None, hasta=None, por_mes=False):
+    """
+    {dimension: {valor: total}} para el rango; con por_mes, {'AAAA-MM': {dimension: {...}}}.
+    """
+    from .models import EstadisticaDiaria
+
+    filas = EstadisticaDiaria.objects.exclude(total=0)  # Filas que quedaron en cero tras borrados
+    if desde:
+        filas = filas.filter(fecha__gte=desde)
+    if hasta:
+        filas = filas.filter(fecha__lte=hasta)
+
+    campos = ['dimension', 'valor']
+    if por_mes:
+        filas = filas.annotate(mes=TruncMonth('fecha'))
+        campos.insert(0, 'mes')
+    filas = filas.values(*campos).annotate(suma=Sum('total')).order_by(*campos)
+
+    resultado = {}
+    for fila in filas:
+        destino = resultado
+        if por_mes:
+            destino = resultado.setdefault(fila['mes'].strftime('%Y-%m'), {})
+        destino.setdefault(fila['dimension'], {})[fila['valor']] = fila['suma']
+    return resultado
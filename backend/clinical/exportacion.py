@@ -0,0 +1,81 @@
+import csv
+import json
+from itertools import islice
+from django.core.serializers.json import DjangoJSONEncoder
+from core.encryption import crypto_manager
+from core.fields import CampoCifradoMixin, PENDIENTES
+from .models import Madre, Parto, RecienNacido, Alta
+
+
+# Dataset -> (modelo, campo usado por ?desde=&hasta=)
+DATASETS = {
+    'madres': (Madre, 'created_at'),
+    'partos': (Parto, 'fecha'),
+    'recien-nacidos': (RecienNacido, 'parto__fecha'),
+    'altas': (Alta, 'fecha_solicitud'),
+}
+
+# Columnas internas que no se exportan (HMAC de búsqueda, no aportan al análisis)
+EXCLUIDAS = {'rut_hash'}
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def columnas_disponibles(modelo):
+    """Columnas exportables: campos concretos (las FK como '<campo>_id')."""
+    return [f.attname for f in modelo._meta.concrete_fields if f.attname not in EXCLUIDAS]
+
+
+def columnas_cifradas(modelo, columnas):
+    """Posiciones de las columnas que vienen cifradas desde la BD."""
+    cifrados = {f.attname for f in modelo._meta.concrete_fields if isinstance(f, CampoCifradoMixin)}
+    return [i for i, c in enumerate(columnas) if c in cifrados]
+
+
+def filas_descifradas(queryset, columnas, posiciones_cifradas, chunk_size):
+    """
+    Recorre el queryset con .values_list().iterator() por bloques y descifra las columnas
+    cifradas de todo el bloque con una sola llamada a decrypt_many. Nunca carga la tabla entera.
+    """
+    filas = queryset.values_list(*columnas).iterator(chunk_size=chunk_size)
+    while True:
+        bloque = [list(f) for f in islice(filas, chunk_size)]
+        if not bloque:
+            return
+        if posiciones_cifradas:
+            tokens = list(dict.fromkeys(
+                f[i] for f in bloque for i in posiciones_cifradas if isinstance(f[i], PENDIENTES)
+            ))
+            descifrados = dict(zip(tokens, crypto_manager.decrypt_many(tokens)))
+            for fila in bloque:
+                for i in posiciones_cifradas:
+                    if isinstance(fila[i], PENDIENTES):
+                        fila[i] = descifrados[fila[i]]
+        yield from bloque
+
+
+class _Eco:
+    """Buffer falso para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, valor):
+        return valor
+
+
+def lineas_csv(columnas, filas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(columnas)
+    for fila in filas:
+        yield escritor.writerow(fila)
+
+
+def lineas_jsonl(columnas, filas):
+    for fila in filas:
+        yield json.dumps(dict(zip(columnas, fila)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def generar_exportacion(formato, columnas, filas):
+    if formato == 'csv':
+        return lineas_csv(columnas, filas)
+    return lineas_jsonl(columnas, filas)
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from clinical.archivo_auditoria import meses_para_archivar, archivar_mes
+
+
+class Command(BaseCommand):
+    help = ("Mueve los meses cerrados de LogAudit a archivos .jsonl.gz con checksum "
+            "(AUDITORIA_ARCHIVO_DIR) y los quita de la tabla. /api/logs/historico/ los sigue leyendo.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses-calientes', type=int,
+                            default=getattr(settings, 'AUDITORIA_MESES_CALIENTES', 3),
+                            help="Meses recientes (además del actual) que se quedan en la tabla.")
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Filas leídas por bloque (por defecto 5000).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Solo muestra qué meses se archivarían.")
+
+    def handle(self, *args, **options):
+        meses = meses_para_archivar(options['meses_calientes'])
+        if not meses:
+            self.stdout.write("No hay meses cerrados para archivar.")
+            return
+
+        for inicio in meses:
+            if options['dry_run']:
+                self.stdout.write(f"Se archivaría {inicio:%Y-%m}")
+                continue
+            archivo = archivar_mes(inicio, batch_size=options['batch_size'])
+            if archivo:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{archivo.mes}: {archivo.filas} logs -> {archivo.archivo} (sha256 {archivo.sha256[:12]}…)"
+                ))
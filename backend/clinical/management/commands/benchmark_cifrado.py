@@ -0,0 +1,82 @@
+import time
+from datetime import date
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from clinical.models import Madre
+from core.encryption import crypto_manager
+from core.fields import CampoCifradoMixin, descifrar_en_lote
+
+
+class Command(BaseCommand):
+    help = ("Compara el costo de recorrer un queryset de Madre con descifrado ansioso "
+            "(como el antiguo from_db_value) versus el descifrado perezoso de los campos cifrados. "
+            "Los datos sintéticos se crean dentro de una transacción que se revierte al final.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=2000, help="Madres sintéticas a crear.")
+        parser.add_argument('--repeticiones', type=int, default=3, help="Se informa el mejor tiempo.")
+
+    def handle(self, *args, **options):
+        filas = options['filas']
+        repeticiones = options['repeticiones']
+        campos = [f for f in Madre._meta.concrete_fields if isinstance(f, CampoCifradoMixin)]
+
+        with transaction.atomic():
+            self._crear_datos(filas)
+            # Queryset nuevo en cada medición: uno reutilizado trae filas ya descifradas
+            qs = lambda: Madre.objects.all()
+
+            def antes_ansioso():
+                # Simula el descifrado en from_db_value: todo campo, toda fila
+                for madre in qs():
+                    for campo in campos:
+                        crypto_manager.decrypt(madre.__dict__[campo.attname])
+
+            def despues_sin_pii():
+                for madre in qs():
+                    madre.comuna
+
+            def despues_leyendo_nombre():
+                for madre in qs():
+                    madre.nombre_completo
+
+            def despues_lote():
+                descifrar_en_lote(list(qs()))
+
+            casos = [
+                ("Antes: descifrado ansioso (5 campos)", antes_ansioso),
+                ("Después: sin tocar PII", despues_sin_pii),
+                ("Después: leyendo solo nombre", despues_leyendo_nombre),
+                ("Después: descifrar_en_lote (5 campos)", despues_lote),
+            ]
+
+            self.stdout.write(f"Filas: {filas} | Campos cifrados: {len(campos)}")
+            base = None
+            for nombre, funcion in casos:
+                mejor = min(self._medir(funcion) for _ in range(repeticiones))
+                base = base or mejor
+                self.stdout.write(f"{nombre:<42} {mejor * 1000:>9.1f} ms  ({mejor / base:.2f}x)")
+
+            # No dejamos datos sintéticos en la BD
+            transaction.set_rollback(True)
+
+    def _medir(self, funcion):
+        inicio = time.perf_counter()
+        funcion()
+        return time.perf_counter() - inicio
+
+    def _crear_datos(self, filas):
+        madres = [
+            Madre(
+                rut=f"{10000000 + i}-{i % 10}",
+                rut_hash=None,
+                nombre_completo=f"Paciente Sintética {i}",
+                direccion=f"Calle Falsa {i}",
+                telefono=f"+5691234{i:04d}",
+                email=f"paciente{i}@example.com",
+                fecha_nacimiento=date(1990, 1, 1),
+                comuna="Benchmark",
+            )
+            for i in range(filas)
+        ]
+        Madre.objects.bulk_create(madres, batch_size=500)
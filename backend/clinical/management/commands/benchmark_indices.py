@@ -0,0 +1,139 @@
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date, datetime
+from pathlib import Path
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+from clinical.models import Madre, Parto, RecienNacido, Alta, TIPOS_PARTO, CESAREAS
+from core.management.commands.benchmark_sqlite import registrar_alias, quitar_alias
+
+ALIAS = 'benchmark_indices'
+MODELOS = [Madre, Parto, RecienNacido, Alta]
+INICIO_MES = timezone.make_aware(datetime(2025, 3, 1))
+FIN_MES = timezone.make_aware(datetime(2025, 4, 1))
+
+
+def _ultimos_partos(db):
+    return list(Parto.objects.using(db).order_by('-fecha').values_list('id', flat=True)[:50])
+
+
+# (nombre, descripción, consulta): cada consulta recibe el alias y devuelve un queryset
+CONSULTAS = [
+    ('partos_recientes', "Listado de partos y reportes: ORDER BY -fecha",
+     lambda db: Parto.objects.using(db).order_by('-fecha').values_list('id', flat=True)[:50]),
+    ('partos_cesarea_mes', "REM: cesáreas de un mes por código",
+     lambda db: Parto.objects.using(db).filter(tipo_parto__in=CESAREAS, fecha__gte=INICIO_MES, fecha__lt=FIN_MES)
+     .values_list('id', flat=True)),
+    ('partos_icontains_mes', "Lo mismo con tipo_parto__icontains (como antes)",
+     lambda db: Parto.objects.using(db).filter(tipo_parto__icontains='cesarea', fecha__gte=INICIO_MES, fecha__lt=FIN_MES)
+     .values_list('id', flat=True)),
+    ('altas_pendientes', "Altas: ?estado=PENDIENTE ORDER BY -fecha_solicitud",
+     lambda db: Alta.objects.using(db).filter(estado='PENDIENTE').order_by('-fecha_solicitud')
+     .values_list('id', flat=True)[:50]),
+    ('madres_recientes', "Listado de madres (cursor): ORDER BY -created_at, -id",
+     lambda db: Madre.objects.using(db).order_by('-created_at', '-id').values_list('id', flat=True)[:50]),
+    ('rn_bajo_peso', "RN de 50 partos, sexo F y < 2500 g",
+     lambda db: RecienNacido.objects.using(db).filter(parto_id__in=_ultimos_partos(db), sexo='F', peso_gramos__lt=2500)
+     .values_list('id', flat=True)),
+]
+
+
+class Command(BaseCommand):
+    help = ("Muestra el EXPLAIN y el tiempo de cada consulta caliente de las tablas clínicas. "
+            "Por defecto arma una BD SQLite temporal con datos sintéticos y compara sin índices "
+            "contra el plan de Meta.indexes; con --database solo lee una BD existente.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--partos', type=int, default=20000, help="Partos sintéticos (por defecto 20000).")
+        parser.add_argument('--repeticiones', type=int, default=20, help="Corridas por consulta (se informa la mediana).")
+        parser.add_argument('--database', help="Alias existente (p. ej. 'default'): solo lectura, sin datos sintéticos.")
+
+    def handle(self, *args, **options):
+        if options['database']:
+            self._medir(options['database'], options['repeticiones'], 'actual')
+            return
+
+        directorio = Path(tempfile.mkdtemp(prefix='benchmark_indices_'))
+        registrar_alias(ALIAS, directorio / 'indices.sqlite3', 'django.db.backends.sqlite3', {})
+        try:
+            with connections[ALIAS].schema_editor() as editor:
+                for modelo in [User, *MODELOS]:  # Alta.autorizado_por apunta a User
+                    editor.create_model(modelo)
+            self._poblar(options['partos'])
+
+            self._cambiar_indices('remove_index')
+            self._medir(ALIAS, options['repeticiones'], 'sin índices')
+            self._cambiar_indices('add_index')
+            self._medir(ALIAS, options['repeticiones'], 'con índices')
+        finally:
+            connections[ALIAS].close()
+            quitar_alias(ALIAS)
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    # --- DATOS SINTÉTICOS ---
+    def _poblar(self, partos):
+        azar = random.Random(42)
+        inicio = time.perf_counter()
+        codigos = [codigo for codigo, _ in TIPOS_PARTO]
+        pesos = [60, 12, 10, 3, 5, 5, 5]
+
+        madres = max(partos // 5, 1)
+        Madre.objects.using(ALIAS).bulk_create(
+            [Madre(rut=f"{10000000 + i}-{i % 10}", nombre_completo=f"Paciente {i}",
+                   fecha_nacimiento=date(1990, 1, 1), comuna='Sintética') for i in range(madres)],
+            batch_size=2000,
+        )
+        Parto.objects.using(ALIAS).bulk_create(
+            [Parto(madre_id=azar.randint(1, madres), tipo_parto=azar.choices(codigos, pesos)[0],
+                   edad_gestacional=azar.randint(30, 41)) for _ in range(partos)],
+            batch_size=2000,
+        )
+        RecienNacido.objects.using(ALIAS).bulk_create(
+            [RecienNacido(parto_id=p, sexo=azar.choice('FM'), peso_gramos=azar.randint(900, 4500),
+                          talla_cm=50, apgar_1=9, apgar_5=10)
+             for p in range(1, partos + 1) for _ in range(2 if azar.random() < 0.05 else 1)],
+            batch_size=2000,
+        )
+        Alta.objects.using(ALIAS).bulk_create(
+            [Alta(parto_id=p, estado=azar.choices(['AUTORIZADA', 'PENDIENTE', 'RECHAZADA'], [85, 10, 5])[0])
+             for p in range(1, partos + 1)],
+            batch_size=2000,
+        )
+
+        # auto_now_add deja todo con la misma hora: se reparten las fechas en el último año
+        with connections[ALIAS].cursor() as cursor:
+            for tabla, columna in (('clinical_madre', 'created_at'), ('clinical_parto', 'fecha'),
+                                   ('clinical_alta', 'fecha_solicitud')):
+                cursor.execute(
+                    f"UPDATE {tabla} SET {columna} = datetime('2025-12-31', '-' || ((id * 7919) % 525600) || ' minutes')"
+                )
+            cursor.execute("ANALYZE")
+        self.stdout.write(f"Datos sintéticos: {madres} madres, {partos} partos "
+                          f"({time.perf_counter() - inicio:.1f}s)")
+
+    def _cambiar_indices(self, operacion):
+        with connections[ALIAS].schema_editor() as editor:
+            for modelo in MODELOS:
+                for indice in modelo._meta.indexes:
+                    getattr(editor, operacion)(modelo, indice)
+        with connections[ALIAS].cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    # --- MEDICIÓN ---
+    def _medir(self, db, repeticiones, escenario):
+        self.stdout.write("")
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== {escenario} ({connections[db].vendor}) =="))
+        for nombre, descripcion, consulta in CONSULTAS:
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                filas = len(list(consulta(db)))
+                tiempos.append(time.perf_counter() - inicio)
+            self.stdout.write(f"{nombre:<22}{statistics.median(tiempos) * 1000:>9.2f} ms {filas:>7} filas  {descripcion}")
+            for linea in consulta(db).explain().splitlines():
+                self.stdout.write(f"{'':<24}{linea}")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from clinical.archivo_auditoria import esta_particionada, convertir_a_particionada, crear_particiones
+
+
+class Command(BaseCommand):
+    help = ("PostgreSQL: particiona clinical_logaudit por mes (RANGE sobre fecha) y crea las "
+            "particiones de los próximos meses. Correr por cron antes de fin de mes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convertir', action='store_true',
+                            help="Convierte la tabla actual en particionada (una sola vez; bloquea la tabla).")
+        parser.add_argument('--meses-adelante', type=int, default=3,
+                            help="Particiones mensuales a tener creadas por adelantado (por defecto 3).")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("El particionado es solo para PostgreSQL. En SQLite use archivar_auditoria.")
+
+        if not esta_particionada():
+            if not options['convertir']:
+                raise CommandError("clinical_logaudit no está particionada. Ejecute con --convertir.")
+            convertir_a_particionada()
+            self.stdout.write(self.style.SUCCESS("Tabla clinical_logaudit convertida a particionada por mes."))
+
+        creadas = crear_particiones(options['meses_adelante'])
+        for nombre in creadas:
+            self.stdout.write(self.style.SUCCESS(f"Partición creada: {nombre}"))
+        if not creadas:
+            self.stdout.write("Las particiones ya existían.")
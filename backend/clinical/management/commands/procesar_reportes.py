@@ -0,0 +1,73 @@
+import os
+import time
+import multiprocessing
+from django.core.management.base import BaseCommand
+from django.db import connections, close_old_connections
+
+
+def bucle_worker(numero, intervalo, intervalo_purga, una_vez):
+    """
+    Toma trabajos de la cola hasta que no queden (--una-vez) o para siempre.
+    El worker 0 además purga los archivos vencidos y recupera trabajos colgados.
+    """
+    import django
+    django.setup()  # Necesario si el proceso hijo arrancó con "spawn" (Windows)
+    from clinical.cola_reportes import tomar_siguiente, ejecutar, purgar_vencidos, recuperar_colgados
+
+    ultima_purga = 0
+    procesados = 0
+    while True:
+        close_old_connections()
+        if numero == 0 and time.monotonic() - ultima_purga >= intervalo_purga:
+            purgar_vencidos()
+            recuperar_colgados()
+            ultima_purga = time.monotonic()
+
+        job = tomar_siguiente()
+        if job is None:
+            if una_vez:
+                break
+            time.sleep(intervalo)
+            continue
+        ejecutar(job)
+        procesados += 1
+
+    connections.close_all()
+    return procesados
+
+
+class Command(BaseCommand):
+    help = ("Worker de la cola de reportes (PDF/Excel) guardada en la BD: genera los trabajos "
+            "pendientes en procesos aparte del servidor web, deja los archivos en REPORTES_DIR "
+            "y cada cierto tiempo borra los vencidos. No necesita Redis ni otro broker.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help="Procesos en paralelo.")
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help="Segundos de espera cuando la cola está vacía.")
+        parser.add_argument('--intervalo-purga', type=float, default=300.0,
+                            help="Cada cuántos segundos se borran los archivos vencidos.")
+        parser.add_argument('--una-vez', action='store_true',
+                            help="Procesa lo pendiente y termina (para cron o pruebas).")
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        if workers > 1 and connections['default'].vendor == 'sqlite':
+            # SQLite admite un solo escritor: varios procesos solo se bloquean entre sí
+            self.stdout.write(self.style.WARNING("SQLite: se usa un solo worker."))
+            workers = 1
+
+        argumentos = [
+            (i, options['intervalo'], options['intervalo_purga'], options['una_vez'])
+            for i in range(workers)
+        ]
+        self.stdout.write(f"Procesando reportes con {workers} worker(s) (PID {os.getpid()})")
+        if workers == 1:
+            procesados = [bucle_worker(*argumentos[0])]
+        else:
+            # Los hijos no deben heredar conexiones abiertas del padre
+            connections.close_all()
+            with multiprocessing.Pool(processes=workers) as pool:
+                procesados = pool.starmap(bucle_worker, argumentos)
+
+        self.stdout.write(self.style.SUCCESS(f"Trabajos procesados: {sum(procesados)}"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from clinical.models import Parto, RecienNacido, EstadisticaDiaria
+from clinical.estadisticas import reconstruir
+
+
+class Command(BaseCommand):
+    help = ("Recalcula desde cero la tabla de estadísticas diarias (rollup REM) a partir de "
+            "Parto y RecienNacido. Usar tras cargas masivas (bulk_create/update no disparan señales).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help="Filas leídas por bloque (por defecto 2000).")
+
+    def handle(self, *args, **options):
+        filas = reconstruir(Parto, RecienNacido, EstadisticaDiaria, chunk_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Estadísticas reconstruidas: {filas} filas de rollup."))
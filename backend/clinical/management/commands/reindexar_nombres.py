@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from clinical.models import Madre, MadreNombreToken
+from core.fields import descifrar_en_lote
+from core.hashing import blind_indexer
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice ciego de trigramas de nombre_completo (búsqueda ?nombre=)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Madres por lote (por defecto 500).")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ultimo = 0
+        procesadas = tokens_creados = ilegibles = 0
+
+        while True:
+            # Lotes por id: memoria constante y transacciones cortas
+            madres = list(Madre.objects.filter(id__gt=ultimo).order_by('id').only('id', 'nombre_completo')[:batch_size])
+            if not madres:
+                break
+            descifrar_en_lote(madres, ['nombre_completo'])
+
+            nuevos = []
+            for madre in madres:
+                if madre.nombre_completo == "ERROR_DECRYPT":
+                    ilegibles += 1
+                    continue
+                nuevos += [MadreNombreToken(madre=madre, token=t)
+                           for t in blind_indexer.tokens_nombre(madre.nombre_completo)]
+
+            with transaction.atomic():
+                MadreNombreToken.objects.filter(madre__in=madres).delete()
+                MadreNombreToken.objects.bulk_create(nuevos, batch_size=1000)
+
+            procesadas += len(madres)
+            tokens_creados += len(nuevos)
+            ultimo = madres[-1].id
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Procesadas: {procesadas} | Tokens: {tokens_creados} | Ilegibles: {ilegibles}"
+        ))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from clinical.models import Madre
+from core.hashing import blind_indexer
+
+
+class Command(BaseCommand):
+    help = "Recalcula rut_hash (índice ciego HMAC del RUT normalizado) para las madres existentes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Filas por lote de bulk_update (por defecto 500).")
+        parser.add_argument('--solo-faltantes', action='store_true',
+                            help="Procesa solo las filas sin rut_hash.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        qs = Madre.objects.order_by('id').only('id', 'rut', 'rut_hash')
+        if options['solo_faltantes']:
+            qs = qs.filter(rut_hash__isnull=True)
+
+        procesadas = actualizadas = ilegibles = 0
+        lote = []
+        # Recorremos por id para no cargar toda la tabla en memoria
+        for madre in qs.iterator(chunk_size=batch_size):
+            procesadas += 1
+            # EncryptedBinaryField descifra el RUT al leerlo
+            rut_real = madre.rut
+            if rut_real == "ERROR_DECRYPT":
+                ilegibles += 1
+                continue
+
+            nuevo_hash = blind_indexer.rut(rut_real)
+            if nuevo_hash != madre.rut_hash:
+                madre.rut_hash = nuevo_hash
+                lote.append(madre)
+
+            if len(lote) >= batch_size:
+                Madre.objects.bulk_update(lote, ['rut_hash'])
+                actualizadas += len(lote)
+                lote = []
+
+        if lote:
+            Madre.objects.bulk_update(lote, ['rut_hash'])
+            actualizadas += len(lote)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Procesadas: {procesadas} | Actualizadas: {actualizadas} | Ilegibles: {ilegibles}"
+        ))
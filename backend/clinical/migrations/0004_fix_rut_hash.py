@@ -0,0 +1,29 @@
+# Reconstruye rut_hash antes de volverlo obligatorio en 0005.
+
+from django.db import migrations
+
+
+def rellenar_rut_hash(apps, schema_editor):
+    from core.encryption import crypto_manager
+    from core.hashing import blind_indexer
+
+    Madre = apps.get_model('clinical', 'Madre')
+    db = schema_editor.connection.alias
+    for madre in Madre.objects.using(db).filter(rut_hash__isnull=True).only('id', 'rut').iterator():
+        rut_real = crypto_manager.decrypt(madre.rut)
+        if rut_real == "ERROR_DECRYPT":
+            # RUT antiguo en texto plano
+            rut_real = madre.rut
+        madre.rut_hash = blind_indexer.rut(rut_real) or f"sin-rut-{madre.id}"
+        madre.save(update_fields=['rut_hash'], using=db)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0003_alter_logaudit_rol_alter_logaudit_usuario'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_rut_hash, migrations.RunPython.noop),
+    ]
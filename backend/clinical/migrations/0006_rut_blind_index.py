@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0005_alter_madre_rut_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='madre',
+            name='rut_hash',
+            field=models.CharField(db_index=True, editable=False, max_length=64, null=True),
+        ),
+    ]
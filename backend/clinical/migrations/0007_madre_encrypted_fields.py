@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:58
+
+import core.fields
+from django.db import migrations
+
+CAMPOS_CIFRADOS = ['rut', 'nombre_completo', 'direccion', 'telefono', 'email']
+
+
+def cifrar_texto_plano(apps, schema_editor):
+    # Filas antiguas guardadas sin cifrar: se cifran para que el campo las lea bien
+    from core.encryption import crypto_manager
+
+    Madre = apps.get_model('clinical', 'Madre')
+    db = schema_editor.connection.alias
+    filas = Madre.objects.using(db).order_by('id').values_list('id', *CAMPOS_CIFRADOS)
+    for fila in filas.iterator(chunk_size=500):
+        pk, valores = fila[0], fila[1:]
+        cambios = {}
+        for campo, valor in zip(CAMPOS_CIFRADOS, valores):
+            if valor and crypto_manager.decrypt(valor) == "ERROR_DECRYPT":
+                # get_prep_value del campo cifra el texto plano al hacer update()
+                cambios[campo] = str(valor)
+        if cambios:
+            Madre.objects.using(db).filter(pk=pk).update(**cambios)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0006_rut_blind_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='madre',
+            name='direccion',
+            field=core.fields.EncryptedTextField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AlterField(
+            model_name='madre',
+            name='email',
+            field=core.fields.EncryptedTextField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AlterField(
+            model_name='madre',
+            name='nombre_completo',
+            field=core.fields.EncryptedTextField(max_length=500),
+        ),
+        migrations.AlterField(
+            model_name='madre',
+            name='rut',
+            field=core.fields.EncryptedTextField(max_length=500, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='madre',
+            name='telefono',
+            field=core.fields.EncryptedTextField(blank=True, max_length=500, null=True),
+        ),
+        migrations.RunPython(cifrar_texto_plano, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,130 @@
+# Pasa los campos cifrados de Madre de texto base64 a bytes crudos (EncryptedBinaryField).
+# La conversión no descifra: solo decodifica el base64 y antepone el id de llave.
+# Es reversible: al volver a 0007 los bytes se pasan de nuevo a texto "<id llave>:<base64>".
+
+import core.fields
+from django.db import migrations, transaction
+
+CAMPOS_CIFRADOS = ['rut', 'nombre_completo', 'direccion', 'telefono', 'email']
+TAMANO_LOTE = 1000
+
+
+def convertir_a_binario(apps, schema_editor):
+    from core.encryption import crypto_manager
+    from core.fields import BytesCifrados
+
+    Madre = apps.get_model('clinical', 'Madre')
+    db = schema_editor.connection.alias  # La BD que se está migrando (no siempre 'default')
+    ultimo = 0
+    while True:
+        # Lotes por id: memoria constante y transacciones cortas
+        filas = list(
+            Madre.objects.using(db).filter(id__gt=ultimo).order_by('id')
+            .values_list('id', *CAMPOS_CIFRADOS)[:TAMANO_LOTE]
+        )
+        if not filas:
+            break
+        with transaction.atomic(using=db):
+            for pk, *tokens in filas:
+                cambios = {}
+                for campo, token in zip(CAMPOS_CIFRADOS, tokens):
+                    if token is None:
+                        continue
+                    binario = crypto_manager.token_a_binario(token) if token else b''
+                    # BytesCifrados: el campo lo guarda tal cual, sin volver a cifrar
+                    cambios[f'{campo}_bin'] = BytesCifrados(binario)
+                Madre.objects.using(db).filter(pk=pk).update(**cambios)
+        ultimo = filas[-1][0]
+
+
+def convertir_a_texto(apps, schema_editor):
+    from core.encryption import crypto_manager
+    from core.fields import TokenCifrado
+
+    Madre = apps.get_model('clinical', 'Madre')
+    db = schema_editor.connection.alias
+    ultimo = 0
+    while True:
+        filas = list(
+            Madre.objects.using(db).filter(id__gt=ultimo).order_by('id')
+            .values_list('id', *[f'{campo}_bin' for campo in CAMPOS_CIFRADOS])[:TAMANO_LOTE]
+        )
+        if not filas:
+            break
+        with transaction.atomic(using=db):
+            for pk, *binarios in filas:
+                cambios = {}
+                for campo, binario in zip(CAMPOS_CIFRADOS, binarios):
+                    if binario is None:
+                        continue
+                    token = crypto_manager.binario_a_token(binario) if binario else ''
+                    cambios[campo] = TokenCifrado(token)
+                Madre.objects.using(db).filter(pk=pk).update(**cambios)
+        ultimo = filas[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0007_madre_encrypted_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='madre',
+            name='rut_bin',
+            field=core.fields.EncryptedBinaryField(max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='madre',
+            name='nombre_completo_bin',
+            field=core.fields.EncryptedBinaryField(max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='madre',
+            name='direccion_bin',
+            field=core.fields.EncryptedBinaryField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='madre',
+            name='telefono_bin',
+            field=core.fields.EncryptedBinaryField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='madre',
+            name='email_bin',
+            field=core.fields.EncryptedBinaryField(blank=True, max_length=500, null=True),
+        ),
+        # Columnas de texto nulas mientras conviven: al revertir se recrean vacías y se llenan
+        migrations.AlterField(
+            model_name='madre',
+            name='rut',
+            field=core.fields.EncryptedTextField(max_length=500, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='madre',
+            name='nombre_completo',
+            field=core.fields.EncryptedTextField(max_length=500, null=True),
+        ),
+        migrations.RunPython(convertir_a_binario, convertir_a_texto),
+        migrations.RemoveField(model_name='madre', name='rut'),
+        migrations.RemoveField(model_name='madre', name='nombre_completo'),
+        migrations.RemoveField(model_name='madre', name='direccion'),
+        migrations.RemoveField(model_name='madre', name='telefono'),
+        migrations.RemoveField(model_name='madre', name='email'),
+        migrations.RenameField(model_name='madre', old_name='rut_bin', new_name='rut'),
+        migrations.RenameField(model_name='madre', old_name='nombre_completo_bin', new_name='nombre_completo'),
+        migrations.RenameField(model_name='madre', old_name='direccion_bin', new_name='direccion'),
+        migrations.RenameField(model_name='madre', old_name='telefono_bin', new_name='telefono'),
+        migrations.RenameField(model_name='madre', old_name='email_bin', new_name='email'),
+        migrations.AlterField(
+            model_name='madre',
+            name='rut',
+            field=core.fields.EncryptedBinaryField(max_length=500, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='madre',
+            name='nombre_completo',
+            field=core.fields.EncryptedBinaryField(max_length=500),
+        ),
+    ]
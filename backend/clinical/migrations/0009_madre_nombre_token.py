@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0008_madre_binary_ciphertext'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MadreNombreToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=32)),
+                ('madre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens_nombre', to='clinical.madre')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'madre'], name='nombre_token_madre_idx')],
+                'constraints': [models.UniqueConstraint(fields=('madre', 'token'), name='madre_token_unico')],
+            },
+        ),
+    ]
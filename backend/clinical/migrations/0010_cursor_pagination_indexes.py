@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0009_madre_nombre_token'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logaudit',
+            index=models.Index(fields=['-fecha', '-id'], name='logaudit_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='madre',
+            index=models.Index(fields=['-created_at', '-id'], name='madre_cursor_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0010_cursor_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alta',
+            index=models.Index(fields=['estado', '-fecha_solicitud'], name='alta_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alta',
+            index=models.Index(fields=['tipo', '-fecha_solicitud'], name='alta_tipo_fecha_idx'),
+        ),
+    ]
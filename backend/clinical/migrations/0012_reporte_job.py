@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0011_alta_filtros_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReporteJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_PROCESO', 'En proceso'), ('LISTO', 'Listo'), ('ERROR', 'Error'), ('VENCIDO', 'Vencido')], default='PENDIENTE', max_length=20)),
+                ('archivo', models.CharField(blank=True, max_length=255)),
+                ('nombre_archivo', models.CharField(blank=True, max_length=255)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('error', models.TextField(blank=True)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('iniciado', models.DateTimeField(blank=True, null=True)),
+                ('terminado', models.DateTimeField(blank=True, null=True)),
+                ('expira', models.DateTimeField(blank=True, null=True)),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reportes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'creado'], name='reportejob_cola_idx'), models.Index(fields=['expira'], name='reportejob_expira_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:17
+
+from django.db import migrations, models
+
+
+def poblar_estadisticas(apps, schema_editor):
+    # Las señales solo cuentan lo nuevo: el historial se suma una vez aquí
+    from clinical.estadisticas import reconstruir
+
+    reconstruir(
+        apps.get_model('clinical', 'Parto'),
+        apps.get_model('clinical', 'RecienNacido'),
+        apps.get_model('clinical', 'EstadisticaDiaria'),
+        using=schema_editor.connection.alias,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0012_reporte_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('dimension', models.CharField(max_length=30)),
+                ('valor', models.CharField(max_length=50)),
+                ('total', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dimension', 'fecha'], name='estadistica_dim_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'dimension', 'valor'), name='estadistica_dia_unica')],
+            },
+        ),
+        migrations.RunPython(poblar_estadisticas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0013_estadistica_diaria'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='logaudit',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
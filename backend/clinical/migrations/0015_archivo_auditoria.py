@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0014_logaudit_fecha_evento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivoAuditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.CharField(max_length=7)),
+                ('archivo', models.CharField(max_length=255)),
+                ('filas', models.IntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('desde', models.DateTimeField()),
+                ('hasta', models.DateTimeField()),
+                ('primer_id', models.BigIntegerField()),
+                ('ultimo_id', models.BigIntegerField()),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['desde', 'hasta'], name='archivo_auditoria_rango_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0015_archivo_auditoria'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logaudit',
+            index=models.Index(fields=['usuario', '-fecha', '-id'], name='logaudit_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logaudit',
+            index=models.Index(fields=['modelo', 'accion', '-fecha', '-id'], name='logaudit_modelo_accion_idx'),
+        ),
+    ]
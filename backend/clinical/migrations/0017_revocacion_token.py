@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0016_logaudit_filtros_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevocacionToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('usuario_id', models.IntegerField(unique=True)),
+                ('desde', models.DateTimeField()),
+            ],
+        ),
+    ]
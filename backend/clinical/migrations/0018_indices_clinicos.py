@@ -0,0 +1,81 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:50
+
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Copia congelada de clinical.models.normalizar_tipo_parto tal como estaba al escribir esta
+# migración: si la función cambia después, esta migración debe seguir haciendo lo mismo
+CODIGOS = ('EUTOCICO', 'CESAREA_URGENCIA', 'CESAREA_ELECTIVA', 'CESAREA', 'FORCEPS', 'VACUUM', 'OTRO')
+
+
+def codigo_tipo_parto(texto):
+    limpio = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode()
+    limpio = ' '.join(limpio.upper().replace('_', ' ').split())
+    codigo = limpio.replace(' ', '_')
+    if codigo in CODIGOS:
+        return codigo
+    if 'CESAREA' in limpio:
+        if 'ELECTIVA' in limpio:
+            return 'CESAREA_ELECTIVA'
+        if 'URGENCIA' in limpio or 'EMERGENCIA' in limpio:
+            return 'CESAREA_URGENCIA'
+        return 'CESAREA'
+    if 'FORCEPS' in limpio:
+        return 'FORCEPS'
+    if 'VACUUM' in limpio or 'VENTOSA' in limpio:
+        return 'VACUUM'
+    if any(palabra in limpio for palabra in ('EUTOCICO', 'NORMAL', 'VAGINAL')):
+        return 'EUTOCICO'
+    return 'OTRO'
+
+
+def normalizar_tipos(apps, schema_editor):
+    # Texto libre -> código (lo no reconocido queda como OTRO) y el rollup REM se recalcula
+    from clinical.estadisticas import reconstruir
+
+    db = schema_editor.connection.alias
+    Parto = apps.get_model('clinical', 'Parto')
+    for tipo in list(Parto.objects.using(db).order_by().values_list('tipo_parto', flat=True).distinct()):
+        codigo = codigo_tipo_parto(tipo)
+        if codigo != tipo:
+            Parto.objects.using(db).filter(tipo_parto=tipo).update(tipo_parto=codigo)
+
+    reconstruir(Parto, apps.get_model('clinical', 'RecienNacido'), apps.get_model('clinical', 'EstadisticaDiaria'),
+                using=db)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0017_revocacion_token'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='parto',
+            name='tipo_parto',
+            field=models.CharField(choices=[('EUTOCICO', 'Eutócico (vaginal normal)'), ('CESAREA_URGENCIA', 'Cesárea urgencia'), ('CESAREA_ELECTIVA', 'Cesárea electiva'), ('CESAREA', 'Cesárea (sin especificar)'), ('FORCEPS', 'Fórceps'), ('VACUUM', 'Vacuum'), ('OTRO', 'Otro')], max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='parto',
+            index=models.Index(fields=['-fecha'], name='parto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parto',
+            index=models.Index(fields=['tipo_parto', '-fecha'], name='parto_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reciennacido',
+            index=models.Index(fields=['parto', 'sexo', 'peso_gramos'], name='rn_parto_sexo_peso_idx'),
+        ),
+        # Recién ahora se suelta el índice simple de la FK: el compuesto ya lo cubre
+        migrations.AlterField(
+            model_name='reciennacido',
+            name='parto',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recien_nacidos', to='clinical.parto'),
+        ),
+        migrations.RunPython(normalizar_tipos, migrations.RunPython.noop),
+    ]
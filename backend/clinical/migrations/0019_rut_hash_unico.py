@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:12
+
+import core.fields
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def revisar_duplicados(apps, schema_editor):
+    # Mensaje claro en vez de un IntegrityError al crear el índice único
+    Madre = apps.get_model('clinical', 'Madre')
+    madres = Madre.objects.using(schema_editor.connection.alias)
+    repetidos = (madres.exclude(rut_hash=None).values('rut_hash')
+                 .annotate(n=Count('id')).filter(n__gt=1).values_list('rut_hash', flat=True))
+    ids = list(madres.filter(rut_hash__in=list(repetidos)).order_by('rut_hash', 'id').values_list('id', flat=True))
+    if ids:
+        raise RuntimeError(f"Hay madres con el mismo RUT (ids {ids}): fusionarlas antes de migrar.")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0018_indices_clinicos'),
+    ]
+
+    operations = [
+        migrations.RunPython(revisar_duplicados, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='madre',
+            name='rut',
+            field=core.fields.EncryptedBinaryField(editable=True, max_length=500),
+        ),
+        migrations.AlterField(
+            model_name='madre',
+            name='rut_hash',
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -1,6 +1,9 @@
-import hashlib
-from django.db import models
+import unicodedata
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import User
+from core.fields import PENDIENTES, EncryptedBinaryField
+from core.hashing import blind_indexer
 
 # 1. PERFIL (Roles)
 class Perfil(models.Model):
@@ -18,16 +21,27 @@ class Perfil(models.Model):
     def __str__(self):
         return f"{self.usuario.username} - {self.rol}"
 
+# 1.1 REVOCACIÓN DE JWT (Tokens emitidos antes de `desde` ya no valen: bloqueo, cambio de rol, etc.)
+class RevocacionToken(models.Model):
+    usuario_id = models.IntegerField(unique=True)  # Sin FK: la revocación sobrevive al borrado del usuario
+    desde = models.DateTimeField()
+
+    def __str__(self):
+        return f"Usuario {self.usuario_id} revocado desde {self.desde}"
+
 
 class Madre(models.Model):
     # --- TUS CAMPOS (Están perfectos) ---
-    rut = models.CharField(max_length=500, unique=True) # Encriptado
-    rut_hash = models.CharField(max_length=64, db_index=True, editable=False, null=True) # Hash Búsqueda
+    # El cifrado usa nonce aleatorio: dos cifrados del mismo RUT nunca son iguales, así que
+    # la unicidad la garantiza rut_hash (NULL solo en filas que aún no pasan por reindexar_rut)
+    rut = EncryptedBinaryField(max_length=500) # Encriptado
+    rut_hash = models.CharField(max_length=64, unique=True, editable=False, null=True) # Hash Búsqueda
     
-    nombre_completo = models.CharField(max_length=500)
-    direccion = models.CharField(max_length=500, null=True, blank=True)
-    telefono = models.CharField(max_length=500, null=True, blank=True)
-    email = models.CharField(max_length=500, null=True, blank=True)
+    # Encriptados (bytes crudos): se descifran recién al leer el atributo
+    nombre_completo = EncryptedBinaryField(max_length=500)
+    direccion = EncryptedBinaryField(max_length=500, null=True, blank=True)
+    telefono = EncryptedBinaryField(max_length=500, null=True, blank=True)
+    email = EncryptedBinaryField(max_length=500, null=True, blank=True)
     
     # Demográficos
     fecha_nacimiento = models.DateField()
@@ -72,29 +86,131 @@ class Madre(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Soporta la paginación por cursor del listado (orden -created_at, -id)
+        indexes = [models.Index(fields=['-created_at', '-id'], name='madre_cursor_idx')]
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
+        # Los índices ciegos se mantienen aquí y no en la API: el admin, el shell y los
+        # fixtures también guardan madres, y ?rut=, la unicidad y la búsqueda dependen de ellos
+        update_fields = kwargs.get('update_fields')
+        rut_cambio = self._cifrado_cambio('rut', update_fields)
+        nombre_cambio = self._cifrado_cambio('nombre_completo', update_fields)
+        if rut_cambio:
+            self.rut_hash = blind_indexer.rut(self.rut)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'rut_hash'}
+
+        with transaction.atomic(using=kwargs.get('using') or self._state.db):
+            super().save(*args, **kwargs)
+            if nombre_cambio:
+                self.indexar_nombre()
+        for nombre, cambio in (('rut', rut_cambio), ('nombre_completo', nombre_cambio)):
+            if cambio:
+                self.__dict__[f'_{nombre}_indexado'] = self.__dict__.get(nombre)
+
+    def _cifrado_cambio(self, nombre, update_fields=None):
+        """True si el campo cifrado se va a guardar con un valor que sus índices aún no reflejan."""
+        if update_fields is not None and nombre not in update_fields:
+            return False
+        campo = self._meta.get_field(nombre)
+        if campo.attname not in self.__dict__:
+            return False  # Diferido (.only()/.defer()): no se tocó
+        if self._state.adding:
+            return True
+        valor = self.__dict__[campo.attname]
+        if isinstance(valor, PENDIENTES):
+            return False  # Nunca se leyó, así que tampoco cambió
+        original = self.__dict__.get(campo.clave_original)
+        if original is not None and original[1] == valor:
+            return False
+        indexado = self.__dict__.get(f'_{nombre}_indexado')
+        return indexado is None or indexado != valor
+
+    def indexar_nombre(self):
+        """Reemplaza los tokens de búsqueda (trigramas HMAC) del nombre de esta madre."""
+        tokens = blind_indexer.tokens_nombre(self.nombre_completo)
+        with transaction.atomic(using=self._state.db):
+            self.tokens_nombre.all().delete()
+            MadreNombreToken.objects.using(self._state.db).bulk_create(
+                [MadreNombreToken(madre=self, token=t) for t in tokens]
+            )
 
     def __str__(self):
         return f"Madre ID {self.id}"
 
+# 2.1 ÍNDICE CIEGO DEL NOMBRE (Búsqueda parcial sin desencriptar)
+class MadreNombreToken(models.Model):
+    madre = models.ForeignKey(Madre, on_delete=models.CASCADE, related_name='tokens_nombre')
+    token = models.CharField(max_length=32) # HMAC de un trigrama del nombre normalizado
+
+    class Meta:
+        indexes = [models.Index(fields=['token', 'madre'], name='nombre_token_madre_idx')]
+        constraints = [models.UniqueConstraint(fields=['madre', 'token'], name='madre_token_unico')]
+
+    def __str__(self):
+        return f"Token {self.token[:8]}… (Madre {self.madre_id})"
+
 # 3. PARTO
+# Código corto e indexable; los reportes filtran por igualdad (o __in) en vez de __icontains
+TIPOS_PARTO = [
+    ('EUTOCICO', 'Eutócico (vaginal normal)'),
+    ('CESAREA_URGENCIA', 'Cesárea urgencia'),
+    ('CESAREA_ELECTIVA', 'Cesárea electiva'),
+    ('CESAREA', 'Cesárea (sin especificar)'),  # Registros antiguos que solo decían "cesárea"
+    ('FORCEPS', 'Fórceps'),
+    ('VACUUM', 'Vacuum'),
+    ('OTRO', 'Otro'),
+]
+CESAREAS = ('CESAREA_URGENCIA', 'CESAREA_ELECTIVA', 'CESAREA')
+
+
+def normalizar_tipo_parto(texto):
+    """Texto libre ('Cesárea urgencia', 'NORMAL', ...) -> código de TIPOS_PARTO, o None si no se reconoce."""
+    limpio = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode()
+    limpio = ' '.join(limpio.upper().replace('_', ' ').split())
+    codigo = limpio.replace(' ', '_')
+    if codigo in dict(TIPOS_PARTO):
+        return codigo
+    if 'CESAREA' in limpio:
+        if 'ELECTIVA' in limpio:
+            return 'CESAREA_ELECTIVA'
+        if 'URGENCIA' in limpio or 'EMERGENCIA' in limpio:
+            return 'CESAREA_URGENCIA'
+        return 'CESAREA'
+    if 'FORCEPS' in limpio:
+        return 'FORCEPS'
+    if 'VACUUM' in limpio or 'VENTOSA' in limpio:
+        return 'VACUUM'
+    if any(palabra in limpio for palabra in ('EUTOCICO', 'NORMAL', 'VAGINAL')):
+        return 'EUTOCICO'
+    return None
+
+
 class Parto(models.Model):
     madre = models.ForeignKey(Madre, on_delete=models.PROTECT, related_name='partos')
     fecha = models.DateTimeField(auto_now_add=True) # Simplificado para evitar error de campo fecha
-    tipo_parto = models.CharField(max_length=50)
+    tipo_parto = models.CharField(max_length=50, choices=TIPOS_PARTO)
     edad_gestacional = models.IntegerField()
     profesional_acargo = models.CharField(max_length=150, blank=True, null=True)
     observaciones = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Listado y reportes ordenan por -fecha; los filtros por tipo van acotados por fecha
+        indexes = [
+            models.Index(fields=['-fecha'], name='parto_fecha_idx'),
+            models.Index(fields=['tipo_parto', '-fecha'], name='parto_tipo_fecha_idx'),
+        ]
+
     def __str__(self):
         return f"Parto {self.id} - {self.madre.nombre_completo}"
 
 # 4. RECIEN NACIDO (¡Importante mantenerlo!)
 class RecienNacido(models.Model):
-    parto = models.ForeignKey(Parto, on_delete=models.CASCADE, related_name='recien_nacidos')
+    # Sin índice propio: rn_parto_sexo_peso_idx empieza por parto y cubre el JOIN/prefetch
+    parto = models.ForeignKey(Parto, on_delete=models.CASCADE, related_name='recien_nacidos', db_index=False)
     apellido_paterno = models.CharField(max_length=500, blank=True, null=True)
     sexo = models.CharField(max_length=20)
     peso_gramos = models.IntegerField()
@@ -109,6 +225,10 @@ class RecienNacido(models.Model):
     malformacion_congenita = models.CharField(max_length=500, default='NO')
     observaciones = models.TextField(blank=True, null=True)
 
+    class Meta:
+        # RN de un parto filtrados por sexo y tramo de peso (reportes REM)
+        indexes = [models.Index(fields=['parto', 'sexo', 'peso_gramos'], name='rn_parto_sexo_peso_idx')]
+
     def __str__(self):
         return f"RN {self.sexo} ({self.parto.id})"
 
@@ -121,17 +241,101 @@ class Alta(models.Model):
     estado = models.CharField(max_length=20, default='PENDIENTE') # PENDIENTE, AUTORIZADA, RECHAZADA
     autorizado_por = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
 
+    class Meta:
+        # Filtros del listado (?estado=, ?tipo=, rango de fechas) y el conteo de /resumen/
+        indexes = [
+            models.Index(fields=['estado', '-fecha_solicitud'], name='alta_estado_fecha_idx'),
+            models.Index(fields=['tipo', '-fecha_solicitud'], name='alta_tipo_fecha_idx'),
+        ]
+
     def __str__(self):
         return f"Alta {self.estado}"
 
+# 5.1 ESTADÍSTICAS DIARIAS (Rollup para REM, lo mantienen las señales de Parto/RecienNacido)
+class EstadisticaDiaria(models.Model):
+    fecha = models.DateField()
+    dimension = models.CharField(max_length=30)  # partos, parto_tipo, parto_edad_gestacional, rn, rn_sexo, rn_peso
+    valor = models.CharField(max_length=50)      # Tipo, sexo o tramo ('total' para los conteos generales)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'dimension', 'valor'], name='estadistica_dia_unica'),
+        ]
+        indexes = [models.Index(fields=['dimension', 'fecha'], name='estadistica_dim_fecha_idx')]
+
+    def __str__(self):
+        return f"{self.fecha} {self.dimension}={self.valor}: {self.total}"
+
 class LogAudit(models.Model):
     usuario = models.CharField(max_length=150, null=True, blank=True)
     rol = models.CharField(max_length=50, default='Desconocido')
     accion = models.CharField(max_length=50)    # <--- Se llama 'accion'
     modelo = models.CharField(max_length=50)    # <--- Se llama 'modelo'
     detalles = models.TextField()               # <--- Se llama 'detalles'
-    fecha = models.DateTimeField(auto_now_add=True) 
+    fecha = models.DateTimeField(default=timezone.now, editable=False)  # Hora del evento (el buffer escribe después)
     ip_address = models.CharField(max_length=50, null=True, blank=True)
 
+    class Meta:
+        # Soporta la paginación por cursor de /api/logs/ (orden -fecha, -id) y sus filtros;
+        # el índice de cursor sirve también para el rango de fechas sin otros filtros
+        indexes = [
+            models.Index(fields=['-fecha', '-id'], name='logaudit_cursor_idx'),
+            models.Index(fields=['usuario', '-fecha', '-id'], name='logaudit_usuario_fecha_idx'),
+            models.Index(fields=['modelo', 'accion', '-fecha', '-id'], name='logaudit_modelo_accion_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.usuario}"
+
+# 5.2 ARCHIVO FRÍO DE AUDITORÍA (Manifiesto de los meses movidos a .jsonl.gz por archivar_auditoria)
+class ArchivoAuditoria(models.Model):
+    mes = models.CharField(max_length=7)            # 'AAAA-MM'
+    archivo = models.CharField(max_length=255)      # Relativo a AUDITORIA_ARCHIVO_DIR
+    filas = models.IntegerField()
+    sha256 = models.CharField(max_length=64)
+    desde = models.DateTimeField()                  # Rango [desde, hasta) del mes
+    hasta = models.DateTimeField()
+    primer_id = models.BigIntegerField()
+    ultimo_id = models.BigIntegerField()
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['desde', 'hasta'], name='archivo_auditoria_rango_idx')]
+
+    def __str__(self):
+        return f"{self.mes} ({self.filas} logs)"
+
+# 6. TRABAJOS DE REPORTES (Cola en la BD, la procesan los workers de procesar_reportes)
+class ReporteJob(models.Model):
+    ESTADOS = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_PROCESO', 'En proceso'),
+        ('LISTO', 'Listo'),
+        ('ERROR', 'Error'),
+        ('VENCIDO', 'Vencido'),
+    ]
+
+    tipo = models.CharField(max_length=50)  # Clave de clinical.reportes.REPORTES
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='PENDIENTE')
+    solicitado_por = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='reportes')
+    archivo = models.CharField(max_length=255, blank=True)  # Relativo a REPORTES_DIR
+    nombre_archivo = models.CharField(max_length=255, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+    expira = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Los workers toman el PENDIENTE más antiguo
+            models.Index(fields=['estado', 'creado'], name='reportejob_cola_idx'),
+            models.Index(fields=['expira'], name='reportejob_expira_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.fecha} - {self.usuario}"
\ No newline at end of file
+        return f"Reporte {self.tipo} #{self.id} ({self.estado})"
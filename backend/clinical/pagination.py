@@ -0,0 +1,27 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class CursorPaginacion(CursorPagination):
+    """
+    Paginación por cursor: cada página es un WHERE sobre la columna de orden + LIMIT,
+    así que cuesta lo mismo en la página 1 que en la 10.000 (sin OFFSET ni COUNT).
+    Cada viewset define su orden en `orden_cursor` (columna de fecha + id para desempatar).
+
+    Compatibilidad: con API_PAGINACION_LEGACY=True, si el cliente no manda `cursor`
+    ni `page_size` recibe la lista completa como antes.
+    """
+    page_size = getattr(settings, 'API_PAGE_SIZE', 50)
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('-id',)
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'orden_cursor', self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if getattr(settings, 'API_PAGINACION_LEGACY', True):
+            params = request.query_params
+            if self.cursor_query_param not in params and self.page_size_query_param not in params:
+                return None
+        return super().paginate_queryset(queryset, request, view)
@@ -1,27 +1,80 @@
+import time
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from rest_framework import permissions
+from core.metricas import metricas
+from .autenticacion import rol_de
 
-class EsAdministradorAdmision(permissions.BasePermission):
-    def has_permission(self, request, view):
-        if request.user.is_superuser or request.user.is_staff: return True
-        return bool(request.user.is_authenticated and hasattr(request.user, 'perfil') and request.user.perfil.rol == 'ADMISION')
+TODOS = '*'
 
-class EsMatrona(permissions.BasePermission):
-    def has_permission(self, request, view):
-        if request.user.is_superuser: return True
-        return bool(request.user.is_authenticated and hasattr(request.user, 'perfil') and request.user.perfil.rol == 'MATRONA')
 
-class EsEquipoClinico(permissions.BasePermission):
-    def has_permission(self, request, view):
-        if request.user.is_superuser: return True
-        return bool(request.user.is_authenticated and hasattr(request.user, 'perfil') and request.user.perfil.rol in ['MATRONA', 'MEDICO', 'ENFERMERA', 'TECNICO'])
+class MatrizPermisos:
+    """
+    Matriz rol x recurso x acción de settings.PERMISOS_ROLES, compilada una vez al arrancar
+    en {(recurso, accion): frozenset(roles)}: cada chequeo es un dict.get y un `in`.
+    Un rol mal escrito en settings detiene el arranque en vez de dejar a alguien sin acceso.
+    """
 
-class EsSupervisor(permissions.BasePermission):
-    def has_permission(self, request, view):
-        if request.user.is_superuser: return True
-        return bool(request.user.is_authenticated and hasattr(request.user, 'perfil') and request.user.perfil.rol == 'SUPERVISOR')
+    def __init__(self):
+        self._matriz = None
+
+    def compilar(self, definicion=None):
+        from .models import Perfil
+        validos = {codigo for codigo, _ in Perfil._meta.get_field('rol').choices} | {TODOS}
+        definicion = settings.PERMISOS_ROLES if definicion is None else definicion
+
+        matriz = {}
+        for recurso, reglas in definicion.items():
+            for acciones, roles in reglas.items():
+                desconocidos = set(roles) - validos
+                if desconocidos:
+                    raise ImproperlyConfigured(f"PERMISOS_ROLES['{recurso}']: roles desconocidos {sorted(desconocidos)}")
+                for accion in acciones.split():
+                    if (recurso, accion) in matriz:
+                        raise ImproperlyConfigured(f"PERMISOS_ROLES['{recurso}']: '{accion}' está repetida")
+                    matriz[(recurso, accion)] = frozenset(roles)
+        self._matriz = matriz
+        return matriz
+
+    @property
+    def matriz(self):
+        if self._matriz is None:
+            self.compilar()
+        return self._matriz
+
+    def roles_permitidos(self, recurso, accion):
+        return self.matriz.get((recurso, accion), frozenset())
+
+    def permitido(self, usuario, recurso, accion):
+        inicio = time.perf_counter()
+        if usuario.is_superuser:
+            resultado = True
+        else:
+            roles = self.roles_permitidos(recurso, accion)
+            resultado = TODOS in roles or rol_de(usuario) in roles or (usuario.is_staff and 'TI' in roles)
+        metricas.incrementar('permisos_chequeos_total', resultado='permitido' if resultado else 'denegado')
+        metricas.incrementar('permisos_segundos_total', time.perf_counter() - inicio)
+        return resultado
+
+# Instancia global
+matriz_permisos = MatrizPermisos()
+
+
+class PermisoPorRol(permissions.BasePermission):
+    """
+    Viewsets: declaran `recurso_permisos` y la acción sale de view.action.
+    Vistas función: PermisoPorRol.para('reportes', 'rem').
+    """
+    recurso = None
+    accion = None
 
-class EsAdminTI(permissions.BasePermission):
     def has_permission(self, request, view):
-        # TIene acceso si es Superuser, Staff o tiene rol TI/ADMIN_TI
-        if request.user.is_superuser or request.user.is_staff: return True
-        return bool(request.user.is_authenticated and hasattr(request.user, 'perfil') and request.user.perfil.rol in ['TI', 'ADMIN_TI'])
\ No newline at end of file
+        if not (request.user and request.user.is_authenticated):
+            return False
+        recurso = self.recurso or getattr(view, 'recurso_permisos', None)
+        accion = self.accion or getattr(view, 'action', None)
+        return matriz_permisos.permitido(request.user, recurso, accion)
+
+    @classmethod
+    def para(cls, recurso, accion):
+        return type(f"PermisoPorRol_{recurso}_{accion}", (cls,), {'recurso': recurso, 'accion': accion})
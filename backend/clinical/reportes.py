@@ -0,0 +1,404 @@
+import io
+import os
+import hashlib
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from itertools import islice
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db.models import Prefetch
+from django.template.loader import get_template
+from django.utils.dateparse import parse_date
+from django.utils import timezone
+from xhtml2pdf import pisa
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from core.fields import descifrar_en_lote
+from core.metricas import metricas
+from .models import Parto, RecienNacido, Alta, LogAudit
+from .cache_pdf import cache_altas
+from .estadisticas import totales_rem
+from . import worker_pdf
+
+
+class ErrorReporte(Exception):
+    """La plantilla se renderizó pero xhtml2pdf no pudo armar el PDF."""
+
+
+# --- HELPERS QUERYSETS (Sin N+1) ---
+def partos_para_reporte():
+    """Partos con la madre en el mismo JOIN y los RN precargados en 1 consulta extra."""
+    return (
+        Parto.objects
+        .select_related('madre')
+        .only('id', 'fecha', 'tipo_parto', 'madre__id', 'madre__rut', 'madre__nombre_completo')
+        .prefetch_related(Prefetch(
+            'recien_nacidos',
+            queryset=RecienNacido.objects.only('id', 'parto_id', 'sexo', 'peso_gramos').order_by('id'),
+        ))
+        .order_by('-fecha')
+    )
+
+def iterar_partos_descifrados(chunk_size=None):
+    """
+    Recorre los partos del reporte por bloques (.iterator) en vez de cargarlos todos:
+    cada bloque trae sus RN con un prefetch propio y descifra sus madres en lote.
+    """
+    chunk_size = chunk_size or getattr(settings, 'REPORTES_CHUNK_SIZE', 2000)
+    partos = partos_para_reporte().iterator(chunk_size=chunk_size)
+    while True:
+        bloque = list(islice(partos, chunk_size))
+        if not bloque:
+            return
+        descifrar_madres(bloque)
+        yield from bloque
+
+def primer_rn(parto):
+    # .first() haría otra consulta: usamos la lista ya precargada
+    return next(iter(parto.recien_nacidos.all()), None)
+
+def descifrar_madres(partos):
+    """Desencripta RUT y nombre de todas las madres en una sola llamada en lote."""
+    descifrar_en_lote([p.madre for p in partos], ['rut', 'nombre_completo'])
+
+def _renderizar_pdf(template_path, context, destino):
+    html = get_template(template_path).render(context)
+    pisa_status = pisa.CreatePDF(html, dest=destino)
+    if pisa_status.err:
+        raise ErrorReporte('Error creando PDF')
+
+
+# ==========================================
+# GENERADORES (escriben el archivo en `destino`)
+# Los usan tanto las vistas síncronas como los workers de la cola.
+# ==========================================
+@metricas.cronometrar('excel_partos')
+def generar_excel_partos(destino, usuario=None):
+    # --- 1. LIBRO EN MODO SOLO-ESCRITURA ---
+    # Las filas se escriben directo al XML temporal de openpyxl, nunca quedan todas en memoria
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Registro Clínico")
+
+    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                         top=Side(style='thin'), bottom=Side(style='thin'))
+    # Estilos con nombre: se registran una vez y cada celda solo guarda la referencia
+    estilos = {
+        'encabezado': NamedStyle(
+            name='encabezado',
+            font=Font(name='Calibri', size=11, bold=True, color='FFFFFF'),
+            fill=PatternFill(start_color='003366', end_color='003366', fill_type='solid'),
+            alignment=Alignment(horizontal='center', vertical='center'),
+            border=thin_border,
+        ),
+        'centro': NamedStyle(name='centro', alignment=Alignment(horizontal='center', vertical='center'), border=thin_border),
+        'izquierda': NamedStyle(name='izquierda', alignment=Alignment(horizontal='left', vertical='center'), border=thin_border),
+    }
+    for estilo in estilos.values():
+        wb.add_named_style(estilo)
+
+    # En modo solo-escritura los anchos se definen antes de la primera fila
+    column_widths = [5, 20, 35, 15, 15, 10, 10]
+    for i, column_width in enumerate(column_widths, 1):
+        ws.column_dimensions[openpyxl.utils.get_column_letter(i)].width = column_width
+
+    # Estilo por columna: el nombre de la paciente va a la izquierda, el resto centrado
+    estilos_fila = ['centro', 'centro', 'izquierda', 'centro', 'centro', 'centro', 'centro']
+
+    def fila(valores, nombres_estilo):
+        celdas = []
+        for valor, nombre in zip(valores, nombres_estilo):
+            celda = WriteOnlyCell(ws, value=valor)
+            celda.style = nombre
+            celdas.append(celda)
+        return celdas
+
+    # --- 2. ENCABEZADOS ---
+    headers = ['ID', 'Fecha Ingreso', 'Nombre Paciente', 'RUT', 'Tipo Parto', 'Sexo RN', 'Peso (gr)']
+    ws.append(fila(headers, ['encabezado'] * len(headers)))
+
+    # --- 3. DATOS (Por bloques, con desencriptación en lote) ---
+    for p in iterar_partos_descifrados():
+        rn = primer_rn(p)
+        ws.append(fila([
+            p.id,
+            str(p.fecha)[:16],
+            p.madre.nombre_completo,
+            p.madre.rut or "",
+            p.get_tipo_parto_display(),
+            rn.sexo if rn else "-",
+            rn.peso_gramos if rn else 0,
+        ], estilos_fila))
+
+    wb.save(destino)
+
+
+@metricas.cronometrar('rem')
+def generar_rem_pdf(destino, usuario=None):
+    # 1. Estadísticas Generales (desde el rollup diario, no recorre Parto)
+    total, cesareas = totales_rem()
+    normales = total - cesareas
+
+    # 2. PROCESAMIENTO DE DATOS (Limpieza forense)
+    partos_db = list(partos_para_reporte()[:50])
+    descifrar_madres(partos_db)
+    lista_partos_limpia = []
+
+    for p in partos_db:
+        # A. RUT y B. NOMBRE (ya descifrados por el lote)
+        rut_visible = p.madre.rut or "Error"
+        nombre_visible = p.madre.nombre_completo or "Desconocido"
+
+        # C. Datos del Bebé
+        rn = primer_rn(p)
+        sexo_rn = rn.sexo if rn else "S/I"
+        peso_rn = f"{rn.peso_gramos} gr" if rn else "0 gr"
+
+        # D. Armamos la fila limpia
+        lista_partos_limpia.append({
+            'fecha': p.fecha,
+            'tipo': p.get_tipo_parto_display(),
+            'profesional': "Matrona Turno",
+            'rut_madre': rut_visible,
+            'nombre_madre': nombre_visible,
+            'sexo': sexo_rn,
+            'peso': peso_rn
+        })
+
+    # 3. Contexto
+    context = {
+        'lista_partos': lista_partos_limpia,
+        'total_partos': total,
+        'total_cesareas': cesareas,
+        'total_normales': normales,
+        'fecha_generacion': timezone.now(),
+        'generado_por': usuario.username if usuario else "Sistema"
+    }
+
+    # 4. Generar PDF
+    _renderizar_pdf('reporte_pdf.html', context, destino)
+
+
+@lru_cache(maxsize=None)
+def version_plantilla(template_path):
+    """Hash del HTML de la plantilla: si se edita, los PDF cacheados dejan de coincidir."""
+    return hashlib.sha256(get_template(template_path).template.source.encode('utf-8')).hexdigest()[:16]
+
+
+def datos_alta(alta):
+    """Datos que van al PDF del alta; son también la llave de la caché."""
+    # Datos de la madre (EncryptedBinaryField los descifra al leerlos)
+    madre = alta.parto.madre
+    return {
+        'tipo_alta': alta.tipo,
+        'paciente_nombre': madre.nombre_completo or "Nombre No Disponible",
+        'rut_visible': madre.rut or "RUT No Disponible",
+        'fecha_ingreso': alta.parto.fecha,
+        'responsable': alta.autorizado_por.username if alta.autorizado_por else "Sin Firma",
+    }
+
+
+def renderizar_alta(datos, ip=None):
+    """
+    HTML -> PDF (bytes). No toca la BD, así que corre también en los procesos del pool.
+    `fecha_generacion` es la hora de este renderizado: una copia servida desde la caché
+    muestra la de cuando se generó (a lo más ALTA_PDF_CACHE_MAX_HORAS atrás, con los mismos datos).
+    """
+    context = {**datos, 'fecha_generacion': timezone.now(), 'ip': ip}
+    buffer = io.BytesIO()
+    _renderizar_pdf('alta_medica.html', context, buffer)
+    return buffer.getvalue()
+
+
+@metricas.cronometrar('alta_pdf')
+def generar_alta_pdf(destino, usuario=None, alta_id=None, ip=None):
+    """
+    Escribe el PDF del alta en `destino`. Devuelve True si salió de la caché en disco.
+    Lanza Alta.DoesNotExist si no existe (la vista lo convierte en 404).
+    """
+    alta = Alta.objects.select_related('parto__madre', 'autorizado_por').get(pk=alta_id)
+    datos = datos_alta(alta)
+
+    # Caché: el mismo contenido no se vuelve a pasar por xhtml2pdf
+    if cache_altas.activa:
+        clave = cache_altas.clave(version_plantilla('alta_medica.html'), datos)
+        pdf = cache_altas.get(alta.id, clave)
+        if pdf is not None:
+            destino.write(pdf)
+            return True
+
+    # Una copia cacheada la bajan varias personas: no lleva la IP de quien la generó
+    # (quién la descarga, desde dónde y cuándo queda en LogAudit) y su "Fecha de Emisión"
+    # es la del renderizado, no la de la descarga
+    pdf = renderizar_alta(datos, ip=None if cache_altas.activa else ip)
+    if cache_altas.activa:
+        cache_altas.set(alta.id, clave, pdf)
+    destino.write(pdf)
+    return False
+
+
+# --- PDF DE ALTAS EN LOTE (Pool de procesos) ---
+_pool_pdf = None
+
+
+def _obtener_pool_pdf():
+    # Un solo pool por proceso web: arrancar intérpretes en cada request sería más lento que renderizar
+    global _pool_pdf
+    if _pool_pdf is None:
+        _pool_pdf = ProcessPoolExecutor(
+            max_workers=getattr(settings, 'ALTAS_PDF_WORKERS', None) or os.cpu_count() or 1,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=worker_pdf.iniciar,  # Los procesos "spawn" arrancan sin Django cargado
+        )
+    return _pool_pdf
+
+
+def _enviar_al_pool(pendientes):
+    """
+    Encola los renders y devuelve {futuro: (alta_id, clave)}. Si el pool quedó roto (un worker
+    murió después del último lote) submit falla al tiro: se arma uno nuevo y se reintenta una vez.
+    None si tampoco se pudo con el pool nuevo.
+    """
+    global _pool_pdf
+    for _ in range(2):
+        try:
+            pool = _obtener_pool_pdf()
+            return {pool.submit(worker_pdf.renderizar_alta, datos): (alta_id, clave) for alta_id, clave, datos in pendientes}
+        except BrokenProcessPool:
+            _pool_pdf = None
+    return None
+
+
+def _pool_caido():
+    raise BrokenProcessPool("No se pudo iniciar el pool de PDF")
+
+
+def pdfs_altas(altas):
+    """
+    Genera los PDF de varias altas y los entrega (alta_id, pdf, error) a medida que terminan:
+    primero los que ya están en caché, luego los que el pool va renderizando en paralelo.
+    `altas` debe traer parto__madre y autorizado_por con select_related y las madres descifradas.
+    """
+    global _pool_pdf
+    version = version_plantilla('alta_medica.html')
+    pendientes = []
+    for alta in altas:
+        if alta.parto is None:
+            yield alta.id, None, "El alta no tiene parto asociado"
+            continue
+        datos = datos_alta(alta)
+        clave = cache_altas.clave(version, datos)
+        pdf = cache_altas.get(alta.id, clave) if cache_altas.activa else None
+        if pdf is not None:
+            yield alta.id, pdf, None
+        else:
+            pendientes.append((alta.id, clave, datos))
+
+    if len(pendientes) <= 1:
+        resultados = ((alta_id, clave, lambda d=datos: renderizar_alta(d)) for alta_id, clave, datos in pendientes)
+    else:
+        futuros = _enviar_al_pool(pendientes)
+        if futuros is None:
+            resultados = ((alta_id, clave, _pool_caido) for alta_id, clave, _ in pendientes)
+        else:
+            resultados = ((*futuros[f], f.result) for f in as_completed(futuros))
+
+    for alta_id, clave, obtener in resultados:
+        try:
+            pdf = obtener()
+        except BrokenProcessPool:
+            _pool_pdf = None  # Un worker murió: el próximo lote arma un pool nuevo
+            yield alta_id, None, "El proceso que generaba el PDF se detuvo"
+            continue
+        except Exception as e:
+            yield alta_id, None, str(e) or e.__class__.__name__
+            continue
+        if cache_altas.activa:
+            cache_altas.set(alta_id, clave, pdf)
+        yield alta_id, pdf, None
+
+
+class _BufferZip:
+    """Destino de zipfile sin seek: acumula lo escrito para ir enviándolo por partes."""
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+def zip_en_streaming(archivos):
+    """(nombre, bytes) -> trozos de un .zip, emitidos apenas se agrega cada archivo."""
+    buffer = _BufferZip()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for nombre, contenido in archivos:
+            zf.writestr(nombre, contenido)
+            yield buffer.vaciar()
+    yield buffer.vaciar()  # Directorio central al cerrar
+
+
+# --- FILTROS DE AUDITORÍA (los mismos en /api/logs/ y en el PDF) ---
+# Parámetro -> campo de LogAudit. Igualdad exacta para que usen los índices compuestos
+FILTROS_LOG = {'usuario': 'usuario', 'rol': 'rol', 'accion': 'accion', 'modelo': 'modelo', 'ip': 'ip_address'}
+AUDITORIA_PDF_MAX = 5000
+
+def filtrar_logs(queryset, filtros):
+    """
+    Aplica usuario/rol/accion/modelo/ip y el rango desde/hasta ('AAAA-MM-DD', hasta inclusive).
+    Una fecha inválida lanza ValueError con el nombre del parámetro.
+    """
+    for param, campo in FILTROS_LOG.items():
+        if filtros.get(param):
+            queryset = queryset.filter(**{campo: filtros[param]})
+    for param, lookup, dias in (('desde', 'fecha__gte', 0), ('hasta', 'fecha__lt', 1)):
+        if not filtros.get(param):
+            continue
+        fecha = parse_date(str(filtros[param]))
+        if fecha is None:
+            raise ValueError(param)
+        limite = timezone.make_aware(datetime.combine(fecha + timedelta(days=dias), time.min))
+        queryset = queryset.filter(**{lookup: limite})
+    return queryset
+
+
+@metricas.cronometrar('auditoria')
+def generar_auditoria_pdf(destino, solicitante=None, limite=100, **filtros):
+    # `solicitante` y no `usuario`: ese nombre es uno de los filtros
+    # 1. Registros más recientes que cumplen los filtros (sin filtros: los últimos 100, como antes)
+    limite = max(1, min(int(limite), AUDITORIA_PDF_MAX))
+    logs = list(filtrar_logs(LogAudit.objects.all(), filtros).order_by('-fecha', '-id')[:limite])
+    # 2. Contexto para el HTML
+    context = {
+        'logs': logs,
+        'fecha_generacion': timezone.now(),
+        'solicitante': solicitante.username if solicitante else "Sistema",
+        'total_registros': len(logs),
+        'filtros': {k: v for k, v in filtros.items() if v},
+    }
+    # 3. Generar PDF usando plantilla
+    _renderizar_pdf('auditoria_pdf.html', context, destino)
+
+
+XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+PDF = 'application/pdf'
+
+# Tipo de trabajo -> cómo se genera, nombre de descarga, parámetros obligatorios y opcionales
+REPORTES = {
+    'excel_partos': {'funcion': generar_excel_partos, 'archivo': 'Reporte_Gestion_Partos.xlsx', 'content_type': XLSX, 'parametros': []},
+    'rem': {'funcion': generar_rem_pdf, 'archivo': 'Informe_REM_Gestion.pdf', 'content_type': PDF, 'parametros': []},
+    'auditoria': {'funcion': generar_auditoria_pdf, 'archivo': 'Auditoria_Forense_Sistema.pdf', 'content_type': PDF, 'parametros': [],
+                  'opcionales': [*FILTROS_LOG, 'desde', 'hasta', 'limite']},
+    'alta_pdf': {'funcion': generar_alta_pdf, 'archivo': 'Alta_{alta_id}.pdf', 'content_type': PDF, 'parametros': ['alta_id']},
+}
@@ -1,8 +1,11 @@
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth.models import User
-from .models import Madre, Perfil, Parto, Alta, LogAudit, RecienNacido
-from core.encryption import crypto_manager 
+from django.db import models
+from .models import Madre, Perfil, Parto, Alta, LogAudit, RecienNacido, ReporteJob, TIPOS_PARTO, normalizar_tipo_parto
+from .reportes import REPORTES, filtrar_logs
+from core.fields import descifrar_en_lote
+from core.hashing import blind_indexer
 
 # ==========================================
 # 1. LOGIN (JWT + Roles)
@@ -12,6 +15,11 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     def get_token(cls, user):
         token = super().get_token(user)
         token['username'] = user.username
+        # iat va truncado al segundo; para compararlo con una revocación hace falta la fracción
+        token['emitido'] = token.current_time.timestamp()
+        # Con estos claims JWTSinConsultas arma el usuario sin ir a la BD
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
         if hasattr(user, 'perfil'):
             token['rol'] = user.perfil.rol
         return token
@@ -26,73 +34,54 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         return data
 
 # ==========================================
-# 2. MADRE (CORRECCIÓN: Desencriptar TODO al leer)
+# 2. DESCIFRADO EN LOTE (Una llamada por página)
 # ==========================================
-import hashlib
-from rest_framework import serializers
-from .models import Madre
-from core.encryption import crypto_manager
+class DescifradoEnLoteListSerializer(serializers.ListSerializer):
+    """
+    Antes de serializar la página, descifra con una sola llamada a decrypt_many
+    los campos cifrados de todas las filas. El hijo define instancias_cifradas(obj)
+    y, si quiere limitar qué campos descifrar, CAMPOS_CIFRADOS.
+    """
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        filas = list(iterable)
+
+        instancias = [inst for obj in filas for inst in self.child.instancias_cifradas(obj)]
+        descifrar_en_lote(instancias, getattr(self.child, 'CAMPOS_CIFRADOS', None))
+        return super().to_representation(filas)
 
+# ==========================================
+# 3. MADRE (El modelo cifra/descifra solo: EncryptedBinaryField)
+# ==========================================
 class MadreSerializer(serializers.ModelSerializer):
+    # Columnas binarias cifradas: para la API siguen siendo texto
+    rut = serializers.CharField(max_length=500)
+    nombre_completo = serializers.CharField(max_length=500)
+    direccion = serializers.CharField(max_length=500, required=False, allow_null=True, allow_blank=True)
+    telefono = serializers.CharField(max_length=500, required=False, allow_null=True, allow_blank=True)
+    email = serializers.CharField(max_length=500, required=False, allow_null=True, allow_blank=True)
+
     class Meta:
         model = Madre
         fields = '__all__'
+        list_serializer_class = DescifradoEnLoteListSerializer
 
-    # --- 1. CREAR (POST) ---
-    def create(self, validated_data):
-        # A. Generar Hash del RUT (Para búsquedas rápidas)
-        if 'rut' in validated_data:
-            rut_limpio = validated_data['rut']
-            validated_data['rut_hash'] = hashlib.sha256(rut_limpio.encode()).hexdigest()
-
-        # B. Encriptar datos sensibles
-        self._encrypt_sensitive_data(validated_data)
-        
-        return super().create(validated_data)
-
-    def update(self, instance, validated_data):
-        # A. Si cambian el RUT, actualizamos el Hash
-        if 'rut' in validated_data:
-            rut_limpio = validated_data['rut']
-            validated_data['rut_hash'] = hashlib.sha256(rut_limpio.encode()).hexdigest()
-
-        # B. Encriptar los datos nuevos (Dirección, Teléfono, etc.)
-        self._encrypt_sensitive_data(validated_data)
-
-        return super().update(instance, validated_data)
-
-    # --- 3. FUNCIÓN AUXILIAR (Para no repetir código) ---
-    def _encrypt_sensitive_data(self, data):
-        # Lista de campos que SIEMPRE deben ser cifrados
-        campos_sensibles = ['rut', 'nombre_completo', 'direccion', 'telefono', 'email']
-        
-        for campo in campos_sensibles:
-            if campo in data:
-                valor_real = data[campo]
-                if valor_real: # Solo encriptamos si escribieron algo
-                    try:
-                        data[campo] = crypto_manager.encrypt(valor_real)
-                    except Exception:
-                        # Si falla, lanzamos error para no guardar basura
-                        raise serializers.ValidationError({campo: "Error cifrando datos."})
-
-    # --- 4. LEER (GET) ---
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        
-        # Desencriptar para mostrar al usuario
-        campos_sensibles = ['rut', 'nombre_completo', 'direccion', 'telefono', 'email']
-
-        for campo in campos_sensibles:
-            val = getattr(instance, campo, None)
-            if val:
-                try:
-                    decrypted = crypto_manager.decrypt(val)
-                    if decrypted and decrypted != "ERROR_DECRYPT":
-                        representation[campo] = decrypted
-                except Exception:
-                    pass 
-        return representation
+    def instancias_cifradas(self, instance):
+        return [instance]
+
+    # --- 0. RUT ÚNICO (se compara el índice ciego: '12.345.678-k' = '12345678K') ---
+    def validate_rut(self, value):
+        rut_hash = blind_indexer.rut(value)
+        if rut_hash is None:
+            raise serializers.ValidationError("RUT inválido.")
+        existentes = Madre.objects.filter(rut_hash=rut_hash)
+        if self.instance is not None:
+            existentes = existentes.exclude(pk=self.instance.pk)
+        if existentes.exists():
+            raise serializers.ValidationError("Ya existe una paciente registrada con este RUT.")
+        return value
+
+    # rut_hash y los tokens del nombre los mantiene Madre.save()
 
 class PerfilSerializer(serializers.ModelSerializer):
     class Meta:
@@ -106,11 +95,22 @@ class RecienNacidoSerializer(serializers.ModelSerializer):
 
 class PartoSerializer(serializers.ModelSerializer):
     recien_nacidos = RecienNacidoSerializer(many=True, read_only=True)
+    # Acepta el código o el texto que mandaban los clientes antiguos ('CESAREA URGENCIA', 'Normal'...)
+    tipo_parto = serializers.CharField(max_length=50)
+    tipo_parto_display = serializers.CharField(source='get_tipo_parto_display', read_only=True)
     class Meta:
         model = Parto
         fields = '__all__'
 
+    def validate_tipo_parto(self, valor):
+        codigo = normalizar_tipo_parto(valor)
+        if codigo is None:
+            raise serializers.ValidationError(f"Tipo de parto inválido. Opciones: {', '.join(c for c, _ in TIPOS_PARTO)}")
+        return codigo
+
 class AltaSerializer(serializers.ModelSerializer):
+    CAMPOS_CIFRADOS = ['rut', 'nombre_completo']
+
     # 1. Campos calculados (usando tus métodos para desencriptar)
     madre_nombre = serializers.SerializerMethodField()
     madre_rut = serializers.SerializerMethodField()
@@ -118,28 +118,29 @@ class AltaSerializer(serializers.ModelSerializer):
     # 2. Campos directos (si NO están encriptados en el modelo Madre, usa 'source')
     # source='parto.madre.prevision' navega por las relaciones automáticamente
     prevision = serializers.CharField(source='parto.madre.prevision', default="Sin información", read_only=True)
-    fecha_ingreso = serializers.DateTimeField(source='parto.fecha_ingreso', read_only=True)
+    fecha_ingreso = serializers.DateTimeField(source='parto.fecha', read_only=True)
 
     class Meta:
         model = Alta
         # Asegúrate de que los campos del modelo Alta estén aquí. 
         # Al usar __all__, Django incluirá los del modelo + los que definimos arriba manualmente.
         fields = '__all__'
+        list_serializer_class = DescifradoEnLoteListSerializer
+
+    def instancias_cifradas(self, obj):
+        return [obj.parto.madre] if obj.parto else []
 
     # Tu método existente
     def get_madre_nombre(self, obj):
         try:
-            nombre_encriptado = obj.parto.madre.nombre_completo
-            return crypto_manager.decrypt(nombre_encriptado)
+            return obj.parto.madre.nombre_completo
         except:
             return "Desconocida"
 
     # Nuevo método para el RUT (asumiendo que también lo guardas encriptado)
     def get_madre_rut(self, obj):
         try:
-            # Ajusta 'rut' al nombre real del campo en tu modelo Madre
-            rut_encriptado = obj.parto.madre.rut 
-            return crypto_manager.decrypt(rut_encriptado)
+            return obj.parto.madre.rut
         except:
             return "S/R"
 
@@ -192,4 +193,48 @@ class UserSerializer(serializers.ModelSerializer):
         return 'Sin Asignar'
 
     def get_role(self, obj):
-        return self.get_rol(obj)
\ No newline at end of file
+        return self.get_rol(obj)
+# ==========================================
+# 4. COLA DE REPORTES
+# ==========================================
+class ReporteJobSerializer(serializers.ModelSerializer):
+    descarga = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReporteJob
+        fields = ['id', 'tipo', 'parametros', 'estado', 'error', 'nombre_archivo',
+                  'creado', 'iniciado', 'terminado', 'expira', 'descarga']
+        read_only_fields = ['estado', 'error', 'nombre_archivo', 'creado', 'iniciado', 'terminado', 'expira']
+
+    def get_descarga(self, obj):
+        if obj.estado != 'LISTO':
+            return None
+        return f"/api/reportes/jobs/{obj.id}/descargar/"
+
+    def validate(self, attrs):
+        definicion = REPORTES.get(attrs['tipo'])
+        if definicion is None:
+            raise serializers.ValidationError({'tipo': f"Tipo desconocido. Opciones: {', '.join(REPORTES)}"})
+        parametros = attrs.get('parametros') or {}
+        if not isinstance(parametros, dict):
+            raise serializers.ValidationError({'parametros': "Debe ser un objeto JSON."})
+        faltantes = [p for p in definicion['parametros'] if p not in parametros]
+        if faltantes:
+            raise serializers.ValidationError({'parametros': f"Faltan: {', '.join(faltantes)}"})
+        # Solo se guardan los parámetros que el generador conoce
+        conocidos = definicion['parametros'] + definicion.get('opcionales', [])
+        attrs['parametros'] = {p: parametros[p] for p in conocidos if p in parametros}
+        if attrs['tipo'] == 'auditoria':
+            try:
+                filtrar_logs(LogAudit.objects.none(), attrs['parametros'])
+                int(attrs['parametros'].get('limite', 100))
+            except (TypeError, ValueError) as e:
+                raise serializers.ValidationError({'parametros': f"Valor inválido: {e}"})
+        if 'alta_id' in attrs['parametros']:
+            try:
+                attrs['parametros']['alta_id'] = int(attrs['parametros']['alta_id'])
+            except (TypeError, ValueError):
+                raise serializers.ValidationError({'parametros': "alta_id debe ser un número."})
+            if not Alta.objects.filter(pk=attrs['parametros']['alta_id']).exists():
+                raise serializers.ValidationError({'parametros': "El alta no existe."})
+        return attrs
@@ -0,0 +1,134 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import User
+from .models import Madre, Parto, RecienNacido, Alta, Perfil
+from .autenticacion import revocaciones
+from .cache_pdf import cache_altas
+from .estadisticas import contribuciones_parto, contribuciones_rn, aplicar
+
+
+# --- INVALIDACIÓN DE LA CACHÉ DE PDF DE ALTAS ---
+# La llave ya cambia si cambian los datos; esto además libera el disco de inmediato.
+@receiver([post_save, post_delete], sender=Alta)
+def invalidar_pdf_alta(sender, instance, **kwargs):
+    cache_altas.invalidar(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Parto)
+def invalidar_pdf_parto(sender, instance, **kwargs):
+    if kwargs.get('created'):
+        return  # Un parto nuevo todavía no tiene altas
+    for alta_id in Alta.objects.filter(parto_id=instance.pk).values_list('id', flat=True):
+        cache_altas.invalidar(alta_id)
+
+
+@receiver(post_save, sender=Madre)
+def invalidar_pdf_madre(sender, instance, created, **kwargs):
+    if created:
+        return
+    for alta_id in Alta.objects.filter(parto__madre_id=instance.pk).values_list('id', flat=True):
+        cache_altas.invalidar(alta_id)
+
+
+# --- ROLLUP DE ESTADÍSTICAS (REM) ---
+# pre_save guarda cómo contaba la fila antes del cambio; post_save aplica solo la diferencia.
+@receiver(pre_save, sender=Parto)
+def parto_antes_de_guardar(sender, instance, **kwargs):
+    instance._estadistica_anterior = None
+    if instance.pk:
+        instance._estadistica_anterior = (
+            Parto.objects.filter(pk=instance.pk).values_list('fecha', 'tipo_parto', 'edad_gestacional').first()
+        )
+
+
+@receiver(post_save, sender=Parto)
+def parto_guardado(sender, instance, **kwargs):
+    anterior = getattr(instance, '_estadistica_anterior', None)
+    sumar = contribuciones_parto(instance.fecha, instance.tipo_parto, instance.edad_gestacional)
+    restar = contribuciones_parto(*anterior) if anterior else []
+
+    # Si cambió el día del parto, sus RN también se mueven de día
+    if anterior and anterior[0] != instance.fecha:
+        for sexo, peso in instance.recien_nacidos.values_list('sexo', 'peso_gramos'):
+            sumar += contribuciones_rn(instance.fecha, sexo, peso)
+            restar += contribuciones_rn(anterior[0], sexo, peso)
+    aplicar(sumar, restar)
+
+
+@receiver(pre_delete, sender=Parto)
+def parto_eliminado(sender, instance, **kwargs):
+    # Los RN que caen en cascada restan por su cuenta (su pre_delete corre antes de borrar nada)
+    aplicar(restar=contribuciones_parto(instance.fecha, instance.tipo_parto, instance.edad_gestacional))
+
+
+def _fecha_parto(parto_id):
+    return Parto.objects.filter(pk=parto_id).values_list('fecha', flat=True).first()
+
+
+@receiver(pre_save, sender=RecienNacido)
+def rn_antes_de_guardar(sender, instance, **kwargs):
+    instance._estadistica_anterior = None
+    if instance.pk:
+        instance._estadistica_anterior = (
+            RecienNacido.objects.filter(pk=instance.pk).values_list('parto__fecha', 'sexo', 'peso_gramos').first()
+        )
+
+
+@receiver(post_save, sender=RecienNacido)
+def rn_guardado(sender, instance, **kwargs):
+    anterior = getattr(instance, '_estadistica_anterior', None)
+    aplicar(
+        sumar=contribuciones_rn(_fecha_parto(instance.parto_id), instance.sexo, instance.peso_gramos),
+        restar=contribuciones_rn(*anterior) if anterior else [],
+    )
+
+
+@receiver(pre_delete, sender=RecienNacido)
+def rn_eliminado(sender, instance, **kwargs):
+    fecha = _fecha_parto(instance.parto_id)
+    if fecha is not None:
+        aplicar(restar=contribuciones_rn(fecha, instance.sexo, instance.peso_gramos))
+
+
+# --- REVOCACIÓN DE JWT ---
+# Los claims del token (rol, staff, activo) se copian al emitirlo; si cambian, el token viejo no vale.
+CAMPOS_EN_TOKEN = ('is_active', 'is_staff', 'is_superuser', 'password')
+
+@receiver(pre_save, sender=User)
+def usuario_antes_de_guardar(sender, instance, update_fields=None, **kwargs):
+    instance._revocar_tokens = False
+    if not instance.pk or (update_fields and set(update_fields) <= {'last_login'}):
+        return  # Usuario nuevo o el login actualizando last_login
+    anterior = User.objects.filter(pk=instance.pk).values(*CAMPOS_EN_TOKEN).first()
+    if not anterior:
+        return
+    cambios = {c for c in CAMPOS_EN_TOKEN if anterior[c] != getattr(instance, c)}
+    if cambios == {'password'} and _misma_clave(instance, anterior['password'], update_fields):
+        return
+    instance._revocar_tokens = bool(cambios)
+
+
+def _misma_clave(instance, hash_anterior, update_fields):
+    """Cambió el hash pero no la contraseña: rehash al subir iteraciones o re-guardar la misma."""
+    if instance._password is None:
+        # User.check_password() al actualizar el hasher deja _password en None y guarda solo el hash
+        return set(update_fields or ()) == {'password'}
+    return check_password(instance._password, hash_anterior)
+
+
+@receiver(post_save, sender=User)
+def usuario_guardado(sender, instance, **kwargs):
+    if getattr(instance, '_revocar_tokens', False):
+        revocaciones.revocar(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def usuario_borrado(sender, instance, **kwargs):
+    revocaciones.revocar(instance.pk)
+
+
+@receiver(post_save, sender=Perfil)
+def perfil_guardado(sender, instance, created, **kwargs):
+    if not created:
+        revocaciones.revocar(instance.usuario_id)  # Cambio de rol
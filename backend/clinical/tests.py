@@ -1,3 +1,1644 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+from concurrent.futures.process import BrokenProcessPool
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from django.core.management import call_command, CommandError
+from django.utils import timezone
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.models import User
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import QuerySet
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from .models import (
+    Madre, Parto, RecienNacido, Alta, LogAudit, Perfil, ReporteJob, EstadisticaDiaria, ArchivoAuditoria, RevocacionToken,
+    MadreNombreToken, normalizar_tipo_parto,
+)
+from .cola_reportes import purgar_vencidos
+from .pagination import CursorPaginacion
+from .cache_pdf import cache_altas
+from .estadisticas import reconstruir, totales_rem
+from .auditoria import BufferAuditoria
+from . import archivo_auditoria, reportes
+from .archivo_auditoria import (
+    convertir_a_particionada, crear_particiones, esta_particionada, inicio_mes, mes_siguiente, nombre_particion,
+)
+from core.metricas import metricas
+from core.encryption import crypto_manager
+from core.hashing import blind_indexer
+from core.fields import BytesCifrados, TokenCifrado
+from .autenticacion import revocaciones
+from .permissions import matriz_permisos, TODOS
+from .urls import router
+from core.replica import estado_replica, revisar_cache_compartida
+from core.db.sqlite3.base import cola_para
+from core.db.sqlite3.pragmas import PRAGMAS_PRODUCCION
+from core.management.commands.benchmark_sqlite import registrar_alias, quitar_alias
 
-# Create your tests here.
+
+def crear_usuario(username, rol):
+    """Usuario con perfil: los endpoints exigen un rol de settings.PERMISOS_ROLES."""
+    usuario = User.objects.create_user(username, password='x')
+    Perfil.objects.create(usuario=usuario, rol=rol)
+    return usuario
+
+
+def directorio_temporal(caso, *ajustes, **extra):
+    """
+    Carpeta temporal que se borra al terminar el test (o la clase, si `caso` es la clase).
+    Los settings nombrados en `ajustes` apuntan a ella; `extra` se aplica tal cual.
+    """
+    directorio = tempfile.mkdtemp()
+    limpiar = caso.addClassCleanup if isinstance(caso, type) else caso.addCleanup
+    limpiar(shutil.rmtree, directorio, ignore_errors=True)
+    if ajustes or extra:
+        cambio = override_settings(**{nombre: directorio for nombre in ajustes}, **extra)
+        cambio.enable()
+        limpiar(cambio.disable)
+    return directorio
+
+
+@override_settings(AUDITORIA_MODO='sincrono')  # El hilo del buffer no ve la transacción del test
+class TestCaseClinico(TestCase):
+    """Base de los tests con BD: la auditoría se escribe dentro de la transacción del test."""
+
+
+# ==========================================
+# PRESUPUESTO DE CONSULTAS (Anti N+1)
+# ==========================================
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    ALTA_PDF_CACHE_DIR=os.path.join(tempfile.gettempdir(), 'test_cache_altas_pdf'),
+)
+class PresupuestoConsultasTest(TestCaseClinico):
+    """
+    Cada endpoint debe hacer una cantidad fija de consultas SQL sin importar
+    cuántas filas haya: se mide con pocos datos, se agregan más y se vuelve a medir.
+    Si alguien agrega un N+1, la segunda medición sube y el test falla.
+    """
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('ti', password='x', is_staff=True, is_superuser=True)
+        Perfil.objects.create(usuario=self.usuario, rol='TI')
+        self.client = APIClient()
+        self.total = 0
+
+    def crear_datos(self, cantidad):
+        for _ in range(cantidad):
+            i = self.total = self.total + 1
+            madre = Madre.objects.create(
+                rut=f"{10000000 + i}-{i % 10}",
+                nombre_completo=f"Madre {i}",
+                fecha_nacimiento=date(1990, 1, 1),
+                comuna="Test",
+            )
+            parto = Parto.objects.create(madre=madre, tipo_parto='EUTOCICO', edad_gestacional=39)
+            RecienNacido.objects.create(parto=parto, sexo='F', peso_gramos=3200, talla_cm=50, apgar_1=9, apgar_5=10)
+            RecienNacido.objects.create(parto=parto, sexo='M', peso_gramos=3100, talla_cm=49, apgar_1=9, apgar_5=10)
+            Alta.objects.create(parto=parto, autorizado_por=self.usuario)
+            LogAudit.objects.create(usuario='ti', rol='TI', accion='CREAR', modelo='Madre', detalles=f"ID: {madre.id}")
+            User.objects.create_user(f'usuario{i}', password='x')
+
+    def contar_consultas(self, url):
+        # Usuario recién leído: así la caché de request.user.perfil no esconde consultas
+        self.client.force_authenticate(User.objects.get(pk=self.usuario.pk))
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200, url)
+        # Los SAVEPOINT salen de la transacción que abre el TestCase; en autocommit no existen
+        return len([c for c in consultas if 'SAVEPOINT' not in c['sql']])
+
+    def assertPresupuesto(self, url, maximo):
+        self.crear_datos(2)
+        pocas = self.contar_consultas(url)
+        self.crear_datos(8)
+        muchas = self.contar_consultas(url)
+        self.assertEqual(pocas, muchas, f"{url}: las consultas crecen con las filas ({pocas} -> {muchas})")
+        self.assertLessEqual(muchas, maximo, f"{url}: {muchas} consultas, presupuesto {maximo}")
+
+    def test_madres(self):
+        self.assertPresupuesto('/api/madres/', 1)
+
+    def test_madres_paginado(self):
+        self.assertPresupuesto('/api/madres/?page_size=5', 1)
+
+    def test_partos(self):
+        self.assertPresupuesto('/api/partos/', 2)
+
+    def test_recien_nacidos(self):
+        self.assertPresupuesto('/api/recien-nacidos/', 1)
+
+    def test_altas(self):
+        self.assertPresupuesto('/api/altas/', 1)
+
+    def test_logs(self):
+        self.assertPresupuesto('/api/logs/', 1)
+
+    def test_usuarios(self):
+        self.assertPresupuesto('/api/users/', 1)
+
+    def test_reporte_excel(self):
+        self.assertPresupuesto('/api/reportes/excel/', 4)
+
+    def test_reporte_rem(self):
+        self.assertPresupuesto('/api/reportes/rem/', 5)
+
+    def test_estadisticas(self):
+        self.assertPresupuesto('/api/estadisticas/partos/?agrupar=mes', 1)
+
+    def test_reporte_auditoria(self):
+        self.assertPresupuesto('/api/reportes/auditoria/', 3)
+
+    def test_alta_pdf(self):
+        self.crear_datos(1)
+        alta_id = Alta.objects.first().id
+        self.assertPresupuesto(f'/api/altas/{alta_id}/pdf/', 3)
+
+    def test_altas_filtradas(self):
+        self.assertPresupuesto('/api/altas/?estado=PENDIENTE&tipo=MEDICA&desde=2020-01-01', 1)
+
+    def test_altas_resumen(self):
+        self.assertPresupuesto('/api/altas/resumen/', 1)
+
+
+# ==========================================
+# RUT: ÍNDICE CIEGO Y UNICIDAD
+# ==========================================
+class RutIndiceCiegoTest(TestCaseClinico):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(crear_usuario('admision', 'ADMISION'))
+        self.datos = {'rut': '12.345.678-k', 'nombre_completo': 'Ana Pérez', 'fecha_nacimiento': '1990-01-01', 'comuna': 'Test'}
+        self.madre = self.client.post('/api/madres/', self.datos, format='json').json()
+
+    def test_busqueda_normaliza_el_rut(self):
+        for rut in ('12.345.678-k', '12345678-K', '12345678k', ' 12.345.678-K '):
+            with self.subTest(rut=rut):
+                datos = self.client.get('/api/madres/', {'rut': rut}).json()
+                self.assertEqual([m['id'] for m in datos], [self.madre['id']])
+        self.assertEqual(self.client.get('/api/madres/', {'rut': '12345678-9'}).json(), [])
+
+    def test_rut_repetido_con_otro_formato_es_400(self):
+        respuesta = self.client.post('/api/madres/', {**self.datos, 'rut': '12345678K'}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('rut', respuesta.json())
+        self.assertEqual(Madre.objects.count(), 1)
+
+    def test_actualizar_con_su_propio_rut_o_uno_ajeno(self):
+        url = f"/api/madres/{self.madre['id']}/"
+        self.assertEqual(self.client.put(url, {**self.datos, 'rut': '12345678-K'}, format='json').status_code, 200)
+
+        otra = self.client.post('/api/madres/', {**self.datos, 'rut': '11.111.111-1'}, format='json').json()
+        respuesta = self.client.patch(f"/api/madres/{otra['id']}/", {'rut': '12345678-k'}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_la_bd_rechaza_el_hash_duplicado(self):
+        from django.db import IntegrityError
+        hash_existente = Madre.objects.get(pk=self.madre['id']).rut_hash
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Madre.objects.create(rut='12345678-K', rut_hash=hash_existente, nombre_completo='Copia',
+                                 fecha_nacimiento=date(1990, 1, 1), comuna='Test')
+
+
+# Índices ciegos mantenidos por Madre.save(): también para el admin, el shell y los fixtures
+class IndicesCiegosModeloTest(TestCaseClinico):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(crear_usuario('admision', 'ADMISION'))
+        self.admin = Client()
+        self.admin.force_login(User.objects.create_superuser('ti', password='x'))
+        self.madre = Madre.objects.create(rut='12.345.678-k', nombre_completo='Ñusta Quispe',
+                                          fecha_nacimiento=date(1990, 1, 1), comuna='Test')
+
+    def api(self, **params):
+        return [m['id'] for m in self.client.get('/api/madres/', params).json()]
+
+    def en_admin(self, busqueda):
+        respuesta = self.admin.get('/admin/clinical/madre/', {'q': busqueda})
+        self.assertEqual(respuesta.status_code, 200)
+        return [m.id for m in respuesta.context['cl'].result_list]
+
+    def test_creada_por_orm_se_encuentra(self):
+        self.assertEqual(self.api(rut='12345678K'), [self.madre.id])
+        self.assertEqual(self.api(nombre='nusta'), [self.madre.id])
+        self.assertEqual(self.en_admin('12345678-k'), [self.madre.id])
+        self.assertEqual(self.en_admin('quispe'), [self.madre.id])
+        # La unicidad también la ve la API
+        datos = {'rut': '12345678-K', 'nombre_completo': 'Copia', 'fecha_nacimiento': '1990-01-01', 'comuna': 'Test'}
+        self.assertEqual(self.client.post('/api/madres/', datos, format='json').status_code, 400)
+
+    def test_editada_en_el_admin_se_encuentra_con_los_datos_nuevos(self):
+        url = f'/admin/clinical/madre/{self.madre.id}/change/'
+        formulario = self.admin.get(url).context['adminform'].form
+        datos = {nombre: valor for nombre, valor in formulario.initial.items() if valor is not None}
+        datos.update({'rut': '11.111.111-1', 'nombre_completo': 'Berta Soto', 'fecha_nacimiento': '1990-01-01'})
+        for nombre in ('pueblo_originario', 'es_migrante', 'tiene_plan_parto', 'realizo_visita_guiada', 'tiene_acompanante'):
+            if not datos.get(nombre):
+                datos.pop(nombre, None)  # Un checkbox desmarcado no se envía
+        self.assertEqual(self.admin.post(url, datos).status_code, 302)
+
+        self.assertEqual(self.en_admin('berta'), [self.madre.id])
+        self.assertEqual(self.en_admin('quispe'), [])
+        self.assertEqual(self.api(rut='11111111-1'), [self.madre.id])
+        self.assertEqual(self.api(rut='12345678-k'), [])
+
+    def test_guardar_sin_tocar_los_cifrados_no_reindexa(self):
+        madre = Madre.objects.get(pk=self.madre.pk)
+        madre.comuna = 'Otra'
+        with CaptureQueriesContext(connection) as consultas:
+            madre.save()
+        self.assertFalse(any('clinical_madrenombretoken' in c['sql'] for c in consultas))
+        self.assertEqual(self.api(nombre='nusta quispe'), [self.madre.id])
+
+        madre.nombre_completo = 'Ñusta Quispe Mamani'
+        madre.save(update_fields=['nombre_completo'])
+        self.assertEqual(self.api(nombre='mamani'), [self.madre.id])
+
+
+# ==========================================
+# CAMPOS CIFRADOS PEREZOSOS
+# ==========================================
+class DescifradoPerezosoTest(TestCaseClinico):
+
+    def setUp(self):
+        self.id = Madre.objects.create(rut="11111111-1", nombre_completo="Ana", fecha_nacimiento=date(1990, 1, 1), comuna="Test").id
+
+    def guardado(self):
+        return bytes(Madre.objects.filter(pk=self.id).values_list('nombre_completo', flat=True).get())
+
+    def test_no_descifra_al_cargar_ni_recifra_al_guardar(self):
+        antes = self.guardado()
+        madre = Madre.objects.get(pk=self.id)
+        self.assertIsInstance(madre.__dict__['nombre_completo'], BytesCifrados)
+
+        with mock.patch.object(crypto_manager, 'encrypt_bytes', wraps=crypto_manager.encrypt_bytes) as cifrar, \
+                mock.patch.object(crypto_manager, 'decrypt', wraps=crypto_manager.decrypt) as descifrar:
+            madre.comuna = 'Otra'
+            madre.save()
+            self.assertEqual(descifrar.call_count, 0)
+
+            self.assertEqual(madre.nombre_completo, "Ana")  # Se descifra recién aquí
+            madre.save()
+            self.assertEqual(descifrar.call_count, 1)
+            cifrar.assert_not_called()
+        self.assertEqual(self.guardado(), antes)
+
+    def test_valor_cambiado_se_cifra_de_nuevo(self):
+        antes = self.guardado()
+        madre = Madre.objects.get(pk=self.id)
+        madre.nombre_completo = "Berta"
+        madre.save()
+        self.assertNotEqual(self.guardado(), antes)
+        self.assertEqual(Madre.objects.get(pk=self.id).nombre_completo, "Berta")
+
+
+# ==========================================
+# ROTACIÓN DE LLAVES (rotar_llaves)
+# ==========================================
+# TransactionTestCase: el comando hace sus propios atomic() por lote y cierra conexiones
+class RotarLlavesTest(TransactionTestCase):
+
+    def setUp(self):
+        self.ids = [
+            Madre.objects.create(rut=f"1111111{i}-1", nombre_completo=f"Madre {i}",
+                                 fecha_nacimiento=date(1990, 1, 1), comuna="Test").id
+            for i in range(3)
+        ]
+        self.directorio = directorio_temporal(self)
+        # Llave nueva '2' como principal, igual que tras fijar ENCRYPTION_KEY_ID y reiniciar
+        nueva = ChaCha20Poly1305(os.urandom(32))
+        for atributo, valor in (('aeads', {**crypto_manager.aeads, '2': nueva}), ('key_id', '2'), ('aead', nueva)):
+            parche = mock.patch.object(crypto_manager, atributo, valor)
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def llaves(self):
+        filas = Madre.objects.order_by('id').values_list('rut', 'nombre_completo')
+        return [[crypto_manager.key_id_de(token) for token in fila] for fila in filas]
+
+    def rotar(self):
+        salida = io.StringIO()
+        call_command('rotar_llaves', '--workers', '1', '--batch-size', '1', '--checkpoint-dir', self.directorio, stdout=salida)
+        return salida.getvalue()
+
+    def test_reanuda_desde_el_checkpoint(self):
+        original = QuerySet.bulk_update
+        lotes = []
+
+        def se_corta_en_el_segundo_lote(queryset, objetos, campos, *args, **kwargs):
+            lotes.append([o.pk for o in objetos])
+            if len(lotes) == 2:
+                raise RuntimeError("corte de luz")
+            return original(queryset, objetos, campos, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'bulk_update', se_corta_en_el_segundo_lote), self.assertRaises(RuntimeError):
+            self.rotar()
+        self.assertEqual(self.llaves(), [['2', '2'], ['1', '1'], ['1', '1']])
+        with open(os.path.join(self.directorio, '2', 'clinical.Madre-0.json')) as f:
+            self.assertEqual(json.load(f)['ultimo'], self.ids[0])
+
+        with mock.patch.object(QuerySet, 'bulk_update', autospec=True, side_effect=original) as guardar:
+            salida = self.rotar()
+        self.assertIn("Reanudando plan existente", salida)
+        self.assertIn("rotadas 3", salida)
+        # Solo se re-cifran las filas que faltaban, una por lote
+        self.assertEqual([[o.pk for o in llamada.args[1]] for llamada in guardar.call_args_list], [[self.ids[1]], [self.ids[2]]])
+        self.assertEqual(self.llaves(), [['2', '2']] * 3)
+        self.assertEqual([m.nombre_completo for m in Madre.objects.order_by('id')], ["Madre 0", "Madre 1", "Madre 2"])
+
+    def test_no_sobrescribe_filas_ilegibles(self):
+        Madre.objects.filter(pk=self.ids[0]).update(nombre_completo=BytesCifrados(b'\x011' + b'x' * 40))
+        with self.assertRaises(CommandError):
+            self.rotar()
+        self.assertEqual(self.llaves(), [['1', '1'], ['2', '2'], ['2', '2']])
+
+
+# ==========================================
+# MIGRACIÓN A FORMATO BINARIO (0008)
+# ==========================================
+# unittest.TestCase: se migra una BD SQLite aparte, paso a paso, sin tocar la de los tests
+class MigracionBinariaTest(unittest.TestCase):
+    alias = 'migracion_binaria'
+
+    def setUp(self):
+        directorio = directorio_temporal(self)
+        registrar_alias(self.alias, os.path.join(directorio, 'migracion.sqlite3'), 'django.db.backends.sqlite3', {})
+        self.addCleanup(quitar_alias, self.alias)
+        self.addCleanup(connections[self.alias].close)
+
+    def migrar(self, destino):
+        """Migra hasta `destino` y devuelve el modelo Madre tal como era en ese punto."""
+        call_command('migrate', 'clinical', destino, database=self.alias, verbosity=0)
+        estado = MigrationExecutor(connections[self.alias]).loader.project_state(('clinical', destino))
+        return estado.apps.get_model('clinical', 'Madre')
+
+    def test_texto_base64_pasa_a_bytes_sin_descifrar(self):
+        Madre = self.migrar('0007_madre_encrypted_fields')
+        sin_prefijo = crypto_manager.encrypt("Berta").split(':', 1)[1]
+        nuevas = [
+            Madre.objects.using(self.alias).create(rut="11111111-1", nombre_completo="Ana", direccion="Calle 1",
+                                                   telefono='', fecha_nacimiento=date(1990, 1, 1), comuna="Test"),
+            # Token antiguo sin prefijo de llave, guardado tal cual
+            Madre.objects.using(self.alias).create(rut="22222222-2", nombre_completo=TokenCifrado(sin_prefijo),
+                                                   fecha_nacimiento=date(1990, 1, 1), comuna="Test"),
+        ]
+
+        Madre = self.migrar('0008_madre_binary_ciphertext')
+        ana, berta = (Madre.objects.using(self.alias).get(pk=m.pk) for m in nuevas)
+        self.assertIsInstance(ana.__dict__['rut'], BytesCifrados)
+        self.assertEqual((ana.rut, ana.nombre_completo, ana.direccion, ana.telefono, ana.email),
+                         ("11111111-1", "Ana", "Calle 1", '', None))
+        self.assertEqual(crypto_manager.key_id_de(berta.__dict__['nombre_completo']), crypto_manager.legacy_key_id)
+        self.assertEqual(berta.nombre_completo, "Berta")
+
+        # Y de vuelta: 0007 vuelve a leer los mismos tokens como texto
+        Madre = self.migrar('0007_madre_encrypted_fields')
+        ana, berta = (Madre.objects.using(self.alias).get(pk=m.pk) for m in nuevas)
+        self.assertIsInstance(ana.__dict__['rut'], TokenCifrado)
+        self.assertEqual((ana.rut, ana.nombre_completo, ana.direccion, ana.telefono, ana.email),
+                         ("11111111-1", "Ana", "Calle 1", '', None))
+        self.assertEqual(berta.nombre_completo, "Berta")
+
+    def test_benchmark_mide_tabla_e_indices(self):
+        salida = io.StringIO()
+        call_command('benchmark_formato_cifrado', filas=200, database=self.alias, stdout=salida)
+        for fila in ('Tabla (MB)', 'Índices (MB)', 'Total (MB)'):
+            self.assertIn(fila, salida.getvalue())
+        with connections[self.alias].cursor() as cursor:  # Las tablas temporales no quedan
+            cursor.execute("SELECT COUNT(*) FROM sqlite_temp_master WHERE name LIKE 'bench_cifrado_%%'")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+# ==========================================
+# BÚSQUEDA POR NOMBRE (índice ciego de trigramas)
+# ==========================================
+class BusquedaNombreTest(TestCaseClinico):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(crear_usuario('admision', 'ADMISION'))
+        self.ids = {}
+        for i, nombre in enumerate(("María José Pérez Soto", "Mariana Pereira", "José Soto")):
+            datos = {'rut': f"1111111{i}-1", 'nombre_completo': nombre, 'fecha_nacimiento': '1990-01-01', 'comuna': 'Test'}
+            self.ids[nombre] = self.client.post('/api/madres/', datos, format='json').json()['id']
+
+    def buscar(self, texto):
+        respuesta = self.client.get('/api/madres/', {'nombre': texto})
+        self.assertEqual(respuesta.status_code, 200, texto)
+        return sorted(m['nombre_completo'] for m in respuesta.json())
+
+    def test_sin_tildes_ni_mayusculas_y_varias_palabras(self):
+        self.assertEqual(self.buscar("maria perez"), ["María José Pérez Soto"])
+        self.assertEqual(self.buscar("SOTO maría"), ["María José Pérez Soto"])  # El orden no importa
+        self.assertEqual(self.buscar("jose soto"), ["José Soto", "María José Pérez Soto"])
+        self.assertEqual(self.buscar("pér"), ["Mariana Pereira", "María José Pérez Soto"])
+        # Los trigramas de 'mariana' incluyen los de 'maria', pero no la palabra 'perez'
+        self.assertEqual(self.buscar("mari pereira"), ["Mariana Pereira"])
+        self.assertEqual(self.buscar("pérez mariana"), [])
+
+    def test_consulta_corta_es_400(self):
+        for texto in ("a", "a b", " - "):
+            with self.subTest(texto=texto):
+                self.assertEqual(self.client.get('/api/madres/', {'nombre': texto}).status_code, 400)
+
+    def test_reindexar_nombres(self):
+        sin_indice = Madre.objects.create(rut="22222222-2", nombre_completo="Ñusta Quispe",
+                                          fecha_nacimiento=date(1990, 1, 1), comuna="Test")
+        sin_indice.tokens_nombre.all().delete()  # Fila de antes del índice de nombres
+        self.assertEqual(self.buscar("nusta"), [])
+
+        call_command('reindexar_nombres', '--batch-size', '2', stdout=io.StringIO())
+        self.assertEqual(self.buscar("nusta quis"), ["Ñusta Quispe"])
+        self.assertEqual(self.buscar("maria perez"), ["María José Pérez Soto"])
+        # En la tabla solo hay HMAC, nunca el trigrama en claro
+        tokens = set(MadreNombreToken.objects.filter(madre=sin_indice).values_list('token', flat=True))
+        self.assertTrue(tokens)
+        self.assertFalse(tokens & {' nu', 'nus', 'qui'})
+
+
+# ==========================================
+# PAGINACIÓN POR CURSOR
+# ==========================================
+class CursorPaginacionTest(TestCaseClinico):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(crear_usuario('supervisor', 'SUPERVISOR'))
+        for i in range(7):
+            Madre.objects.create(rut=f"1111111{i}-1", nombre_completo=f"Paciente {i}",
+                                 fecha_nacimiento=date(1990, 1, 1), comuna="Test")
+        # Misma fecha para todos: el id tiene que desempatar sin repetir ni saltar filas
+        fecha = timezone.now()
+        LogAudit.objects.bulk_create(
+            [LogAudit(usuario='supervisor', accion='VER', modelo='Madre', detalles=str(i), fecha=fecha) for i in range(7)]
+        )
+
+    def recorrer(self, url, sin_offset=True):
+        ids, paginas = [], 0
+        while url:
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = self.client.get(url)
+            self.assertEqual(respuesta.status_code, 200)
+            datos = respuesta.json()
+            self.assertLessEqual(len(datos['results']), 3)
+            ids += [fila['id'] for fila in datos['results']]
+            sql = ' '.join(c['sql'].upper() for c in consultas)
+            self.assertNotIn('COUNT(', sql)
+            if sin_offset:
+                self.assertNotIn('OFFSET', sql)
+            url, paginas = datos['next'], paginas + 1
+        return ids, paginas
+
+    def test_recorre_madres_en_orden_sin_repetir(self):
+        esperado = list(Madre.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        ids, paginas = self.recorrer('/api/madres/?page_size=3')
+        self.assertEqual(ids, esperado)
+        self.assertEqual(paginas, 3)
+
+    def test_recorre_logs_con_fechas_empatadas(self):
+        esperado = list(LogAudit.objects.order_by('-fecha', '-id').values_list('id', flat=True))
+        # DRF desempata con un OFFSET acotado a las filas con la misma fecha
+        ids, _ = self.recorrer('/api/logs/?page_size=3', sin_offset=False)
+        self.assertEqual(ids, esperado)
+
+    def test_fila_nueva_no_desplaza_las_paginas_siguientes(self):
+        primera = self.client.get('/api/madres/?page_size=3').json()
+        Madre.objects.create(rut="22222222-2", nombre_completo="Nueva", fecha_nacimiento=date(1990, 1, 1), comuna="Test")
+        resto, _ = self.recorrer(primera['next'])
+        vistos = [m['id'] for m in primera['results']] + resto
+        self.assertEqual(len(vistos), 7)
+        self.assertEqual(len(set(vistos)), 7)
+
+    def test_sin_cursor_ni_page_size_devuelve_la_lista_completa(self):
+        datos = self.client.get('/api/madres/').json()
+        self.assertIsInstance(datos, list)
+        self.assertEqual(len(datos), 7)
+
+    @override_settings(API_PAGINACION_LEGACY=False)
+    def test_sin_modo_legacy_pagina_siempre(self):
+        datos = self.client.get('/api/madres/').json()
+        self.assertEqual(len(datos['results']), 7)  # page_size por defecto (50)
+        self.assertIsNone(datos['next'])
+
+    def test_page_size_tiene_tope(self):
+        request = Request(APIRequestFactory().get('/api/madres/', {'page_size': 100000}))
+        self.assertEqual(CursorPaginacion().get_page_size(request), 500)
+
+
+# ==========================================
+# FILTROS DE ALTAS
+# ==========================================
+class AltaFiltrosTest(TestCaseClinico):
+
+    def setUp(self):
+        self.usuario = crear_usuario('matrona', 'MATRONA')
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        madre = Madre.objects.create(rut="11111111-1", nombre_completo="Ana", fecha_nacimiento=date(1990, 1, 1), comuna="Test")
+        parto = Parto.objects.create(madre=madre, tipo_parto='EUTOCICO', edad_gestacional=39)
+        Alta.objects.create(parto=parto, tipo='MEDICA')
+        Alta.objects.create(parto=parto, tipo='CLINICA', estado='AUTORIZADA')
+        Alta.objects.create(parto=parto, tipo='MEDICA', estado='RECHAZADA')
+
+    def test_filtro_estado_y_tipo(self):
+        datos = self.client.get('/api/altas/?estado=pendiente').json()
+        self.assertEqual([a['estado'] for a in datos], ['PENDIENTE'])
+        datos = self.client.get('/api/altas/?tipo=MEDICA').json()
+        self.assertEqual(len(datos), 2)
+
+    def test_filtro_fechas(self):
+        hoy = date.today().isoformat()
+        self.assertEqual(len(self.client.get(f'/api/altas/?desde={hoy}&hasta={hoy}').json()), 3)
+        self.assertEqual(len(self.client.get('/api/altas/?hasta=2000-01-01').json()), 0)
+        self.assertEqual(self.client.get('/api/altas/?desde=ayer').status_code, 400)
+
+    def test_resumen(self):
+        datos = self.client.get('/api/altas/resumen/?tipo=MEDICA').json()
+        self.assertEqual(datos['pendientes'], 1)
+        self.assertEqual(datos['total'], 2)
+        self.assertEqual(datos['por_estado'], {'PENDIENTE': 1, 'RECHAZADA': 1})
+
+
+# ==========================================
+# EXPORTACIONES CSV / JSONL
+# ==========================================
+class ExportacionTest(TestCaseClinico):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(crear_usuario('bi', 'SUPERVISOR'))
+        for i in range(3):
+            Madre.objects.create(rut=f"1111111{i}-1", nombre_completo=f"Ana {i}", fecha_nacimiento=date(1990, 1, 1), comuna="Test")
+
+    def leer(self, url):
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200, url)
+        return b''.join(respuesta.streaming_content).decode().splitlines()
+
+    @override_settings(REPORTES_CHUNK_SIZE=2)
+    def test_csv_descifra_por_bloques(self):
+        lineas = self.leer('/api/exportar/madres/?formato=csv&columnas=id,nombre_completo')
+        self.assertEqual(lineas[0], 'id,nombre_completo')
+        self.assertEqual([l.split(',')[1] for l in lineas[1:]], ['Ana 0', 'Ana 1', 'Ana 2'])
+
+    def test_jsonl_y_rango_fechas(self):
+        lineas = self.leer('/api/exportar/madres/?formato=jsonl&columnas=rut')
+        self.assertEqual(json.loads(lineas[0]), {'rut': '11111110-1'})
+        self.assertEqual(self.leer('/api/exportar/madres/?formato=jsonl&hasta=2000-01-01'), [])
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get('/api/exportar/madres/?columnas=rut_hash').status_code, 400)
+        self.assertEqual(self.client.get('/api/exportar/madres/?formato=xml').status_code, 400)
+        self.assertEqual(self.client.get('/api/exportar/usuarios/').status_code, 404)
+
+
+# ==========================================
+# COLA DE REPORTES
+# ==========================================
+class ColaReportesTest(TestCaseClinico):
+
+    def setUp(self):
+        self.directorio = directorio_temporal(self, 'REPORTES_DIR')
+
+        self.usuario = crear_usuario('matrona', 'MATRONA')
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def test_flujo_completo(self):
+        respuesta = self.client.post('/api/reportes/jobs/', {'tipo': 'excel_partos'}, format='json')
+        self.assertEqual(respuesta.status_code, 202)
+        job_id = respuesta.json()['id']
+        self.assertEqual(self.client.get(f'/api/reportes/jobs/{job_id}/descargar/').status_code, 409)
+
+        call_command('procesar_reportes', una_vez=True, workers=1, stdout=io.StringIO())
+
+        self.assertEqual(self.client.get(f'/api/reportes/jobs/{job_id}/').json()['estado'], 'LISTO')
+        descarga = self.client.get(f'/api/reportes/jobs/{job_id}/descargar/')
+        self.assertEqual(descarga.status_code, 200)
+        self.assertTrue(b''.join(descarga.streaming_content).startswith(b'PK'))  # xlsx = zip
+
+    def test_vencidos_se_borran(self):
+        job = ReporteJob.objects.create(tipo='rem', solicitado_por=self.usuario, estado='LISTO',
+                                        archivo='viejo.pdf', expira=timezone.now())
+        open(os.path.join(self.directorio, 'viejo.pdf'), 'wb').close()
+
+        self.assertEqual(purgar_vencidos(), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.directorio, 'viejo.pdf')))
+        self.assertEqual(self.client.get(f'/api/reportes/jobs/{job.id}/descargar/').status_code, 410)
+
+    def test_solo_ve_sus_reportes(self):
+        otro = User.objects.create_user('otro', password='x')
+        job = ReporteJob.objects.create(tipo='rem', solicitado_por=otro)
+        self.assertEqual(self.client.get(f'/api/reportes/jobs/{job.id}/').status_code, 404)
+
+    def test_parametros_obligatorios(self):
+        respuesta = self.client.post('/api/reportes/jobs/', {'tipo': 'alta_pdf'}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+
+
+# ==========================================
+# CACHÉ DE PDF DE ALTAS
+# ==========================================
+class CachePDFAltasTest(TestCaseClinico):
+
+    def setUp(self):
+        self.directorio = directorio_temporal(self, 'ALTA_PDF_CACHE_DIR', ALTA_PDF_CACHE_MAX_MB=1)
+
+        self.client = APIClient()
+        self.client.force_authenticate(crear_usuario('matrona', 'MATRONA'))
+        self.madre = Madre.objects.create(rut="11111111-1", nombre_completo="Ana", fecha_nacimiento=date(1990, 1, 1), comuna="Test")
+        parto = Parto.objects.create(madre=self.madre, tipo_parto='EUTOCICO', edad_gestacional=39)
+        self.alta = Alta.objects.create(parto=parto)
+
+    def descargar(self):
+        respuesta = self.client.get(f'/api/altas/{self.alta.id}/pdf/')
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.content
+
+    def test_segunda_descarga_sale_de_cache_y_se_audita(self):
+        primera = self.descargar()
+        segunda = self.descargar()
+        self.assertEqual(primera, segunda)
+        detalles = list(LogAudit.objects.order_by('id').values_list('detalles', flat=True))
+        self.assertEqual(detalles, [f"Alta {self.alta.id} (HTML)", f"Alta {self.alta.id} (Caché)"])
+
+    def test_guardar_madre_invalida(self):
+        self.descargar()
+        self.assertEqual(len(os.listdir(self.directorio)), 1)
+        self.madre.nombre_completo = "Ana María"
+        self.madre.save()
+        self.assertEqual(os.listdir(self.directorio), [])
+
+    def test_desalojo_lru_por_tamano(self):
+        medio_mega = b'x' * (600 * 1024)
+        cache_altas.set(1, 'a', medio_mega)
+        os.utime(os.path.join(self.directorio, 'alta_1_a.pdf'), (1, 1))  # El menos usado
+        cache_altas.set(2, 'b', medio_mega)
+        self.assertIsNone(cache_altas.get(1, 'a'))
+        self.assertEqual(cache_altas.get(2, 'b'), medio_mega)
+
+    def test_en_disco_queda_cifrado_y_vence(self):
+        pdf = self.descargar()
+        ruta = os.path.join(self.directorio, os.listdir(self.directorio)[0])
+        with open(ruta, 'rb') as f:
+            en_disco = f.read()
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertNotIn(b'%PDF', en_disco)
+
+        clave = os.path.basename(ruta)[:-4].split('_', 2)[2]
+        with mock.patch('clinical.cache_pdf.time.time', return_value=time.time() + 25 * 3600):
+            self.assertIsNone(cache_altas.get(self.alta.id, clave))
+        self.assertEqual(os.listdir(self.directorio), [])
+
+    def test_nombre_del_archivo_es_un_hmac(self):
+        datos = {'rut': '11111111-1', 'nombre': 'Ana'}
+        clave = cache_altas.clave('v1', datos)
+        contenido = json.dumps(datos, sort_keys=True)
+        self.assertNotEqual(clave, hashlib.sha256(f"v1:{contenido}".encode('utf-8')).hexdigest())
+        self.assertEqual(clave, blind_indexer.digest(f"v1:{contenido}", 'pdf_alta'))
+
+    def test_archivo_ilegible_es_un_fallo_de_cache(self):
+        with open(os.path.join(self.directorio, 'alta_1_a.pdf'), 'wb') as f:
+            f.write(b'%PDF-1.4 sin cifrar')  # Copia de antes del cifrado
+        self.assertIsNone(cache_altas.get(1, 'a'))
+        self.assertEqual(os.listdir(self.directorio), [])
+
+    def test_lote_zip_con_un_log_por_documento(self):
+        otra = Alta.objects.create(parto=self.alta.parto)
+        sin_parto = Alta.objects.create(parto=None)
+
+        respuesta = self.client.post('/api/altas/pdf-lote/', {'ids': [self.alta.id, otra.id, sin_parto.id]}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        zip_altas = zipfile.ZipFile(io.BytesIO(b''.join(respuesta.streaming_content)))
+        self.assertEqual(
+            sorted(zip_altas.namelist()),
+            sorted([f"Alta_{self.alta.id}.pdf", f"Alta_{otra.id}.pdf", "errores.txt"]),
+        )
+        self.assertTrue(zip_altas.read(f"Alta_{otra.id}.pdf").startswith(b'%PDF'))
+        # Solo los documentos entregados: el alta sin parto va en errores.txt
+        self.assertEqual(
+            sorted(LogAudit.objects.filter(detalles__endswith='(Lote)').values_list('detalles', flat=True)),
+            sorted([f"Alta {self.alta.id} (Lote)", f"Alta {otra.id} (Lote)"]),
+        )
+
+    def test_lote_con_pool_roto_arma_uno_nuevo(self):
+        otra = Alta.objects.create(parto=self.alta.parto)
+        roto = mock.Mock()
+        roto.submit.side_effect = BrokenProcessPool()  # Un worker murió después del lote anterior
+        reportes._pool_pdf = roto
+
+        respuesta = self.client.post('/api/altas/pdf-lote/', {'ids': [self.alta.id, otra.id]}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        zip_altas = zipfile.ZipFile(io.BytesIO(b''.join(respuesta.streaming_content)))
+        self.assertEqual(sorted(zip_altas.namelist()), sorted([f"Alta_{self.alta.id}.pdf", f"Alta_{otra.id}.pdf"]))
+        self.assertIsNot(reportes._pool_pdf, roto)
+
+    def test_lote_cortado_solo_audita_lo_enviado(self):
+        otra = Alta.objects.create(parto=self.alta.parto)
+
+        respuesta = self.client.post('/api/altas/pdf-lote/', {'ids': [self.alta.id, otra.id]}, format='json')
+        next(iter(respuesta.streaming_content))  # El cliente recibe el primer PDF y corta
+        respuesta.close()
+        self.assertEqual(LogAudit.objects.filter(detalles__endswith='(Lote)').count(), 1)
+
+
+# ==========================================
+# ROLLUP DE ESTADÍSTICAS (REM)
+# ==========================================
+class EstadisticasTest(TestCaseClinico):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(crear_usuario('matrona', 'MATRONA'))
+        self.madre = Madre.objects.create(rut="11111111-1", nombre_completo="Ana", fecha_nacimiento=date(1990, 1, 1), comuna="Test")
+
+    def rollup(self):
+        return {(e.fecha, e.dimension, e.valor): e.total for e in EstadisticaDiaria.objects.all() if e.total}
+
+    def test_senales_coinciden_con_reconstruccion(self):
+        parto = Parto.objects.create(madre=self.madre, tipo_parto='EUTOCICO', edad_gestacional=39)
+        rn = RecienNacido.objects.create(parto=parto, sexo='F', peso_gramos=3200, talla_cm=50, apgar_1=9, apgar_5=10)
+        RecienNacido.objects.create(parto=parto, sexo='M', peso_gramos=2100, talla_cm=45, apgar_1=8, apgar_5=9)
+        cesarea = Parto.objects.create(madre=self.madre, tipo_parto='CESAREA', edad_gestacional=35)
+        RecienNacido.objects.create(parto=cesarea, sexo='F', peso_gramos=1400, talla_cm=40, apgar_1=7, apgar_5=9)
+
+        parto.tipo_parto = 'CESAREA'
+        parto.save()
+        rn.peso_gramos = 4200
+        rn.save()
+        cesarea.delete()
+
+        incremental = self.rollup()
+        reconstruir(Parto, RecienNacido, EstadisticaDiaria)
+        self.assertEqual(incremental, self.rollup())
+
+    def test_api_y_rem(self):
+        parto = Parto.objects.create(madre=self.madre, tipo_parto='CESAREA', edad_gestacional=30)
+        RecienNacido.objects.create(parto=parto, sexo='F', peso_gramos=1200, talla_cm=40, apgar_1=7, apgar_5=9)
+        Parto.objects.create(madre=self.madre, tipo_parto='EUTOCICO', edad_gestacional=40)
+
+        datos = self.client.get('/api/estadisticas/partos/').json()['estadisticas']
+        self.assertEqual(datos['partos'], {'total': 2})
+        self.assertEqual(datos['parto_tipo'], {'CESAREA': 1, 'EUTOCICO': 1})
+        self.assertEqual(datos['parto_edad_gestacional'], {'28-31': 1, '37-41': 1})
+        self.assertEqual(datos['rn_peso'], {'1000-1499': 1})
+
+        mes = timezone.localdate().strftime('%Y-%m')
+        por_mes = self.client.get('/api/estadisticas/partos/?agrupar=mes').json()['estadisticas']
+        self.assertEqual(por_mes[mes]['rn_sexo'], {'F': 1})
+        self.assertEqual(self.client.get('/api/estadisticas/partos/?hasta=2000-01-01').json()['estadisticas'], {})
+
+
+# ==========================================
+# BUFFER DE AUDITORÍA
+# ==========================================
+@override_settings(AUDITORIA_MODO='buffer')
+class BufferAuditoriaTest(TestCase):
+
+    def crear_buffer(self, **ajustes):
+        # Sin hilo: el test decide cuándo se escribe
+        with override_settings(AUDITORIA_BUFFER_MAX=5, AUDITORIA_FLUSH_TAMANO=3, AUDITORIA_ESPERA_MAX=0.01, **ajustes):
+            return BufferAuditoria(iniciar_hilo=False)
+
+    def entrada(self, detalle):
+        return LogAudit(usuario='ti', rol='TI', accion='CREAR', modelo='Madre', detalles=detalle, fecha=timezone.now())
+
+    def test_acumula_y_escribe_en_lote_con_la_hora_del_evento(self):
+        buffer = self.crear_buffer()
+        entrada = self.entrada('uno')
+        buffer.encolar([entrada, self.entrada('dos')])
+        self.assertEqual(LogAudit.objects.count(), 0)
+
+        buffer.flush()
+        self.assertEqual(LogAudit.objects.count(), 2)
+        self.assertEqual(LogAudit.objects.get(detalles='uno').fecha, entrada.fecha)
+
+    def test_cola_llena_escribe_en_el_request(self):
+        for politica in ('bloquear', 'sincrono'):
+            LogAudit.objects.all().delete()
+            buffer = self.crear_buffer(AUDITORIA_POLITICA_LLENO=politica)
+            buffer.encolar([self.entrada(str(i)) for i in range(4)])
+            buffer.encolar([self.entrada('5'), self.entrada('6')])  # Supera el tope de 5
+            self.assertEqual(LogAudit.objects.count(), 6, politica)
+            self.assertEqual(buffer.pendientes(), 0)
+
+    def test_inmediato(self):
+        buffer = self.crear_buffer()
+        buffer.encolar([self.entrada('alta autorizada')], inmediato=True)
+        self.assertEqual(LogAudit.objects.count(), 1)
+
+    def test_lote_fallido_se_reintenta_fila_por_fila(self):
+        buffer = self.crear_buffer()
+        mala = self.entrada(None)  # detalles es NOT NULL: tumba el bulk_create
+        with self.assertLogs('clinical.auditoria', 'ERROR') as logs:
+            buffer.encolar([self.entrada('uno'), mala, self.entrada('dos')], inmediato=True)
+
+        self.assertEqual(sorted(LogAudit.objects.values_list('detalles', flat=True)), ['dos', 'uno'])
+        self.assertEqual((buffer.escritas, buffer.perdidas), (2, 1))
+        self.assertIn('NO guardada', logs.output[-1])
+        self.assertIn('accion=CREAR modelo=Madre', logs.output[-1])
+
+
+# ==========================================
+# FILTROS DE AUDITORÍA (/api/logs/ y PDF)
+# ==========================================
+class LogAuditFiltrosTest(TestCaseClinico):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('ti', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+        semana_pasada = timezone.now() - timedelta(days=7)
+        LogAudit.objects.create(usuario='matrona', rol='MATRONA', accion='ACTUALIZAR', modelo='Madre', detalles='a', ip_address='10.0.0.1', fecha=semana_pasada)
+        LogAudit.objects.create(usuario='matrona', rol='MATRONA', accion='CREAR', modelo='Parto', detalles='b', ip_address='10.0.0.1')
+        LogAudit.objects.create(usuario='medico', rol='MEDICO', accion='ACTUALIZAR', modelo='Madre', detalles='c', ip_address='10.0.0.2')
+
+    def detalles(self, **params):
+        respuesta = self.client.get('/api/logs/', {'page_size': 10, **params})
+        self.assertEqual(respuesta.status_code, 200)
+        return [l['detalles'] for l in respuesta.json()['results']]
+
+    def test_filtros_del_listado(self):
+        self.assertEqual(self.detalles(usuario='matrona', modelo='Madre'), ['a'])
+        self.assertEqual(self.detalles(modelo='Madre', accion='ACTUALIZAR'), ['c', 'a'])
+        self.assertEqual(self.detalles(rol='MEDICO'), ['c'])
+        self.assertEqual(self.detalles(ip='10.0.0.1'), ['b', 'a'])
+        hoy = f"{timezone.localdate():%Y-%m-%d}"
+        self.assertEqual(self.detalles(usuario='matrona', desde=hoy, hasta=hoy), ['b'])
+
+        self.assertEqual(self.client.get('/api/logs/', {'desde': '31-12-2025'}).status_code, 400)
+
+    def test_pdf_con_filtros(self):
+        respuesta = self.client.get('/api/reportes/auditoria/', {'usuario': 'medico'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        self.assertEqual(self.client.get('/api/reportes/auditoria/', {'limite': 'todos'}).status_code, 400)
+
+    def test_job_guarda_los_filtros(self):
+        respuesta = self.client.post('/api/reportes/jobs/', {
+            'tipo': 'auditoria', 'parametros': {'usuario': 'medico', 'desde': '2025-01-01', 'otro': 1},
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertEqual(ReporteJob.objects.get().parametros, {'usuario': 'medico', 'desde': '2025-01-01'})
+
+        invalido = self.client.post('/api/reportes/jobs/', {'tipo': 'auditoria', 'parametros': {'hasta': 'ayer'}}, format='json')
+        self.assertEqual(invalido.status_code, 400)
+
+
+# ==========================================
+# ARCHIVO DE AUDITORÍA (meses cerrados en .jsonl.gz)
+# ==========================================
+class ArchivoAuditoriaTest(TestCaseClinico):
+
+    def setUp(self):
+        self.directorio = directorio_temporal(self, 'AUDITORIA_ARCHIVO_DIR')
+
+        self.usuario = User.objects.create_superuser('ti', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+        # Dos logs de hace un año y uno de hoy
+        self.antiguo = inicio_mes(timezone.localdate() - timedelta(days=365)) + timedelta(days=2)
+        for accion in ('CREAR', 'EXPORTAR'):
+            LogAudit.objects.create(usuario='matrona', accion=accion, modelo='Madre', detalles='viejo', fecha=self.antiguo)
+        LogAudit.objects.create(usuario='matrona', accion='CREAR', modelo='Madre', detalles='nuevo')
+
+    def test_archiva_mes_cerrado_con_checksum(self):
+        call_command('archivar_auditoria', meses_calientes=3, stdout=io.StringIO())
+
+        archivo = ArchivoAuditoria.objects.get()
+        self.assertEqual((archivo.mes, archivo.filas), (f"{self.antiguo:%Y-%m}", 2))
+        self.assertEqual(list(LogAudit.objects.values_list('detalles', flat=True)), ['nuevo'])
+        with open(os.path.join(self.directorio, 'manifest.json')) as f:
+            self.assertEqual(json.load(f)[0]['sha256'], archivo.sha256)
+
+        # Volver a correrlo no duplica nada
+        call_command('archivar_auditoria', meses_calientes=3, stdout=io.StringIO())
+        self.assertEqual(ArchivoAuditoria.objects.count(), 1)
+
+    def test_historico_lee_tabla_y_archivo(self):
+        call_command('archivar_auditoria', meses_calientes=3, stdout=io.StringIO())
+        params = {'desde': f"{self.antiguo:%Y-%m-%d}", 'hasta': f"{timezone.localdate():%Y-%m-%d}"}
+
+        datos = self.client.get('/api/logs/historico/', params).json()
+        self.assertEqual([l['detalles'] for l in datos['results']], ['nuevo', 'viejo', 'viejo'])
+        self.assertEqual(datos['meses_archivados'], [f"{self.antiguo:%Y-%m}"])
+
+        filtrado = self.client.get('/api/logs/historico/', {**params, 'accion': 'EXPORTAR'}).json()
+        self.assertEqual([l['accion'] for l in filtrado['results']], ['EXPORTAR'])
+
+        self.assertEqual(self.client.get('/api/logs/historico/', {'desde': params['desde']}).status_code, 400)
+
+    def test_consulta_acotada_y_checksum_una_vez(self):
+        call_command('archivar_auditoria', meses_calientes=3, stdout=io.StringIO())
+        desde, hasta = self.antiguo - timedelta(days=1), timezone.now() + timedelta(days=1)
+
+        with mock.patch('clinical.archivo_auditoria.sha256_archivo', wraps=archivo_auditoria.sha256_archivo) as sha256:
+            logs, meses = archivo_auditoria.consultar(desde, hasta, limite=2)
+            self.assertEqual([l.detalles for l in logs], ['nuevo', 'viejo'])
+            self.assertEqual(meses, [f"{self.antiguo:%Y-%m}"])
+            archivo_auditoria.consultar(desde, hasta, limite=2)
+        self.assertEqual(sha256.call_count, 1)
+
+        # Con el tope cubierto por la tabla caliente, el mes archivado ni se abre
+        logs, meses = archivo_auditoria.consultar(desde, hasta, limite=1)
+        self.assertEqual(([l.detalles for l in logs], meses), (['nuevo'], []))
+
+    def test_archivo_alterado_no_se_lee(self):
+        call_command('archivar_auditoria', meses_calientes=3, stdout=io.StringIO())
+        ruta = os.path.join(self.directorio, ArchivoAuditoria.objects.get().archivo)
+        with open(ruta, 'ab') as f:
+            f.write(b'x')
+
+        respuesta = self.client.get('/api/logs/historico/', {'desde': f"{self.antiguo:%Y-%m-%d}", 'hasta': f"{self.antiguo:%Y-%m-%d}"})
+        self.assertEqual(respuesta.status_code, 500)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "Solo aplica con PostgreSQL")
+class ParticionAuditoriaTest(TestCaseClinico):
+
+    def test_convertir_conserva_datos_e_indices(self):
+        LogAudit.objects.create(usuario='matrona', accion='CREAR', modelo='Madre', detalles='antes')
+        convertir_a_particionada()
+        self.assertTrue(esta_particionada())
+        siguiente = mes_siguiente(inicio_mes(timezone.localdate()))
+        self.assertEqual(crear_particiones(2), [nombre_particion(siguiente), nombre_particion(mes_siguiente(siguiente))])
+        LogAudit.objects.create(usuario='matrona', accion='CREAR', modelo='Madre', detalles='despues')
+        self.assertEqual(list(LogAudit.objects.order_by('id').values_list('detalles', flat=True)), ['antes', 'despues'])
+
+        with connection.cursor() as cursor:
+            for indice in LogAudit._meta.indexes:
+                # El índice está en la tabla madre y tiene adjunto el de la tabla antigua
+                cursor.execute("SELECT tablename FROM pg_indexes WHERE indexname = %s", [indice.name])
+                self.assertEqual(cursor.fetchone()[0], LogAudit._meta.db_table)
+                cursor.execute(
+                    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                    "WHERE i.inhparent = %s::regclass", [indice.name]
+                )
+                self.assertIn(f"{indice.name}_legado", {fila[0] for fila in cursor.fetchall()})
+
+
+# ==========================================
+# MÉTRICAS (/api/metrics)
+# ==========================================
+class MetricasTest(TestCaseClinico):
+
+    def setUp(self):
+        metricas.reiniciar()
+        self.addCleanup(metricas.reiniciar)
+        self.staff = User.objects.create_superuser('ti', password='x')
+        self.client = APIClient()
+        Madre.objects.create(rut='11111111-1', nombre_completo='Ana', fecha_nacimiento=date(1990, 1, 1), comuna='Test')
+
+    def lineas(self):
+        self.client.force_authenticate(self.staff)
+        respuesta = self.client.get('/api/metrics')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta['Content-Type'].startswith('text/plain'))
+        return respuesta.content.decode().splitlines()
+
+    def valor(self, lineas, prefijo):
+        return next(float(l.rsplit(' ', 1)[1]) for l in lineas if l.startswith(prefijo))
+
+    def test_registra_latencia_sql_y_cifrado_por_ruta(self):
+        self.client.force_authenticate(self.staff)
+        self.client.get('/api/madres/')
+        crypto_manager.decrypt(b'\x011' + b'x' * 40)  # Token ilegible fuera de un request
+
+        lineas = self.lineas()
+        self.assertEqual(self.valor(lineas, 'http_requests_total{estado="2xx",metodo="GET",ruta="madre-list"}'), 1)
+        self.assertEqual(self.valor(lineas, 'http_duracion_segundos_count{metodo="GET",ruta="madre-list"}'), 1)
+        self.assertEqual(self.valor(lineas, 'http_duracion_segundos_bucket{metodo="GET",ruta="madre-list",le="+Inf"}'), 1)
+        self.assertGreaterEqual(self.valor(lineas, 'sql_consultas_total{ruta="madre-list"}'), 1)
+        self.assertGreaterEqual(self.valor(lineas, 'cifrado_operaciones_total{operacion="decrypt",ruta="madre-list"}'), 2)
+        self.assertEqual(self.valor(lineas, 'cifrado_errores_descifrado_total{ruta="(fuera_de_request)"}'), 1)
+
+    def test_streaming_se_registra_al_cerrar(self):
+        self.client.force_authenticate(self.staff)
+        respuesta = self.client.get('/api/exportar/madres/?formato=csv&columnas=nombre_completo')
+        self.assertFalse(any('ruta="exportar_dataset"' in l for l in metricas.prometheus().splitlines()))
+
+        self.assertEqual(b''.join(respuesta.streaming_content).decode().splitlines(), ['nombre_completo', 'Ana'])
+        respuesta.close()
+        lineas = self.lineas()
+        self.assertEqual(self.valor(lineas, 'http_requests_total{estado="2xx",metodo="GET",ruta="exportar_dataset"}'), 1)
+        # El descifrado y las consultas ocurren al enviar, fuera de la vista
+        self.assertGreaterEqual(self.valor(lineas, 'cifrado_operaciones_total{operacion="decrypt",ruta="exportar_dataset"}'), 1)
+        self.assertGreaterEqual(self.valor(lineas, 'sql_consultas_total{ruta="exportar_dataset"}'), 1)
+
+    def test_solo_staff(self):
+        self.client.force_authenticate(User.objects.create_user('matrona', password='x'))
+        self.assertEqual(self.client.get('/api/metrics').status_code, 403)
+
+
+# ==========================================
+# AUTENTICACIÓN JWT SIN CONSULTAS
+# ==========================================
+class PBKDF2Liviano(PBKDF2PasswordHasher):
+    iterations = 1000
+
+
+class PBKDF2Subido(PBKDF2PasswordHasher):
+    iterations = 2000
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class JWTSinConsultasTest(TestCaseClinico):
+
+    def setUp(self):
+        revocaciones.invalidar()
+        self.addCleanup(revocaciones.invalidar)
+        self.ti = User.objects.create_user('ti', password='x', is_staff=True)
+        Perfil.objects.create(usuario=self.ti, rol='TI')
+        self.matrona = User.objects.create_user('matrona', password='x')
+        Perfil.objects.create(usuario=self.matrona, rol='MATRONA')
+
+    def login(self, username):
+        datos = self.client.post('/api/token/', {'username': username, 'password': 'x'}).json()
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {datos['access']}")
+        return cliente, datos['refresh']
+
+    def test_request_autenticado_sin_consultas_de_usuario(self):
+        cliente, _ = self.login('matrona')
+        cliente.get('/api/altas/resumen/')  # Primera carga de la tabla de revocaciones
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = cliente.get('/api/altas/resumen/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse([q['sql'] for q in consultas if 'auth_user' in q['sql'] or 'clinical_perfil' in q['sql']])
+
+        # El log toma el rol del claim
+        cliente.get('/api/reportes/excel/')
+        self.assertEqual(LogAudit.objects.filter(usuario='matrona').values_list('rol', flat=True).last(), 'MATRONA')
+
+        ti, _ = self.login('ti')
+        self.assertEqual(ti.get('/api/metrics').status_code, 200)  # is_staff viene en el token
+        self.assertEqual(cliente.get('/api/metrics').status_code, 403)
+
+    def test_bloquear_usuario_revoca_sus_tokens(self):
+        cliente, refresh = self.login('matrona')
+        ti, _ = self.login('ti')
+        self.assertEqual(cliente.get('/api/altas/resumen/').status_code, 200)
+
+        self.assertEqual(ti.post(f'/api/users/{self.matrona.id}/toggle_estado/').status_code, 200)
+        self.assertEqual(cliente.get('/api/altas/resumen/').status_code, 401)
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': refresh}).status_code, 401)
+
+    def test_cambio_de_rol_revoca_y_otros_procesos_lo_ven_al_recargar(self):
+        cliente, _ = self.login('matrona')
+        perfil = self.matrona.perfil
+        perfil.rol = 'MEDICO'
+        perfil.save()
+        self.assertEqual(cliente.get('/api/altas/resumen/').status_code, 401)
+
+        # Revocación hecha por otro proceso: solo está en la BD
+        ti, _ = self.login('ti')
+        self.assertEqual(ti.get('/api/users/').status_code, 200)
+        RevocacionToken.objects.create(usuario_id=self.ti.id, desde=timezone.now())
+        revocaciones.invalidar()  # Equivale a que pasen JWT_REVOCACION_REFRESCO segundos
+        self.assertEqual(ti.get('/api/users/').status_code, 401)
+
+    def test_rehash_al_subir_iteraciones_no_revoca(self):
+        with override_settings(PASSWORD_HASHERS=['clinical.tests.PBKDF2Liviano']):
+            usuario = User.objects.create_user('partera', password='x')
+        Perfil.objects.create(usuario=usuario, rol='MATRONA')
+
+        with override_settings(PASSWORD_HASHERS=['clinical.tests.PBKDF2Subido']):
+            cliente, refresh = self.login('partera')  # check_password re-guarda el hash
+            usuario.refresh_from_db()
+            self.assertTrue(usuario.password.startswith('pbkdf2_sha256$2000$'))
+            self.assertFalse(RevocacionToken.objects.filter(usuario_id=usuario.id).exists())
+            self.assertEqual(cliente.get('/api/altas/resumen/').status_code, 200)
+            self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': refresh}).status_code, 200)
+
+    def test_cambio_de_clave_revoca_y_el_login_del_mismo_segundo_vale(self):
+        cliente, _ = self.login('matrona')
+        self.matrona.set_password('x')  # La misma clave con otro salt no es un cambio
+        self.matrona.save()
+        self.assertEqual(cliente.get('/api/altas/resumen/').status_code, 200)
+
+        self.matrona.set_password('nueva')
+        self.matrona.save()
+        self.assertEqual(cliente.get('/api/altas/resumen/').status_code, 401)
+
+        self.matrona.set_password('x')
+        self.matrona.save()
+        nuevo, _ = self.login('matrona')  # Casi siempre dentro del mismo segundo de la revocación
+        self.assertEqual(nuevo.get('/api/altas/resumen/').status_code, 200)
+
+
+# ==========================================
+# MATRIZ DE PERMISOS POR ROL (tests generados)
+# ==========================================
+ROLES = [codigo for codigo, _ in Perfil._meta.get_field('rol').choices]
+NO_EXISTE = 999999  # Con permiso se llega a la vista (404/400); sin permiso, 403 antes
+
+def _crud(base):
+    detalle = f"{base}{NO_EXISTE}/"
+    return {
+        'list': ('get', base), 'retrieve': ('get', detalle), 'create': ('post', base),
+        'update': ('put', detalle), 'partial_update': ('patch', detalle), 'destroy': ('delete', detalle),
+    }
+
+# (recurso, acción) de PERMISOS_ROLES -> cómo se llama por HTTP
+ENDPOINTS = {
+    **{('madres', a): v for a, v in _crud('/api/madres/').items()},
+    **{('partos', a): v for a, v in _crud('/api/partos/').items()},
+    **{('recien-nacidos', a): v for a, v in _crud('/api/recien-nacidos/').items()},
+    **{('altas', a): v for a, v in _crud('/api/altas/').items()},
+    ('altas', 'resumen'): ('get', '/api/altas/resumen/'),
+    ('altas', 'gestionar'): ('patch', f'/api/altas/{NO_EXISTE}/gestionar/'),
+    ('altas', 'pdf_lote'): ('post', '/api/altas/pdf-lote/'),
+    **{('users', a): v for a, v in _crud('/api/users/').items()},
+    ('users', 'toggle_estado'): ('post', f'/api/users/{NO_EXISTE}/toggle_estado/'),
+    ('logs', 'list'): ('get', '/api/logs/'),
+    ('logs', 'retrieve'): ('get', f'/api/logs/{NO_EXISTE}/'),
+    ('logs', 'historico'): ('get', '/api/logs/historico/'),
+    ('reportes-jobs', 'list'): ('get', '/api/reportes/jobs/'),
+    ('reportes-jobs', 'retrieve'): ('get', f'/api/reportes/jobs/{NO_EXISTE}/'),
+    ('reportes-jobs', 'create'): ('post', '/api/reportes/jobs/'),
+    ('reportes-jobs', 'descargar'): ('get', f'/api/reportes/jobs/{NO_EXISTE}/descargar/'),
+    ('reportes', 'excel_partos'): ('get', '/api/reportes/excel/'),
+    ('reportes', 'rem'): ('get', '/api/reportes/rem/'),
+    ('reportes', 'estadisticas'): ('get', '/api/estadisticas/partos/?agrupar=x'),
+    ('reportes', 'alta_pdf'): ('get', f'/api/altas/{NO_EXISTE}/pdf/'),
+    ('reportes', 'auditoria'): ('get', '/api/reportes/auditoria/?limite=x'),
+    ('reportes', 'exportar'): ('get', '/api/exportar/nada/'),
+}
+
+
+class MatrizPermisosTest(TestCaseClinico):
+    """Un test por cada rol x recurso x acción: 403 si la matriz no lo permite, otra cosa si sí."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = {rol: crear_usuario(rol.lower(), rol) for rol in ROLES}
+        madre = Madre.objects.create(rut="11111111-1", nombre_completo="Ana", fecha_nacimiento=date(1990, 1, 1), comuna="Test")
+        cls.alta = Alta.objects.create(parto=Parto.objects.create(madre=madre, tipo_parto='EUTOCICO', edad_gestacional=39))
+
+    def setUp(self):
+        self.client = APIClient()
+        directorio_temporal(self, 'REPORTES_DIR')
+
+    def esperado(self, rol, recurso, accion):
+        roles = matriz_permisos.roles_permitidos(recurso, accion)
+        return TODOS in roles or rol in roles
+
+    def test_cada_accion_de_la_matriz_tiene_endpoint(self):
+        self.assertEqual(set(matriz_permisos.matriz), set(ENDPOINTS))
+
+    def test_viewsets_sin_acciones_fuera_de_la_matriz(self):
+        estandar = ['list', 'retrieve', 'create', 'update', 'partial_update', 'destroy']
+        for _, viewset, _ in router.registry:
+            acciones = [a for a in estandar if hasattr(viewset, a)] + [a.__name__ for a in viewset.get_extra_actions()]
+            for accion in acciones:
+                self.assertIn((viewset.recurso_permisos, accion), matriz_permisos.matriz, viewset.__name__)
+
+    def test_superusuario_puede_todo(self):
+        self.client.force_authenticate(User.objects.create_superuser('root', password='x'))
+        self.assertEqual(self.client.delete(f'/api/altas/{NO_EXISTE}/').status_code, 404)
+
+    def test_rol_invalido_en_settings_detiene_el_arranque(self):
+        from django.core.exceptions import ImproperlyConfigured
+        with self.assertRaises(ImproperlyConfigured):
+            matriz_permisos.compilar({'madres': {'list': ['MATRONAS']}})
+        matriz_permisos.compilar()
+
+
+def _test_endpoint(recurso, accion, rol):
+    def test(self):
+        metodo, url = ENDPOINTS[(recurso, accion)]
+        self.client.force_authenticate(self.usuarios[rol])
+        estado = getattr(self.client, metodo)(url, {}, format='json').status_code
+        if self.esperado(rol, recurso, accion):
+            self.assertNotEqual(estado, 403, f"{rol} debería poder {recurso}.{accion}")
+        else:
+            self.assertEqual(estado, 403, f"{rol} no debería poder {recurso}.{accion}")
+    return test
+
+
+def _test_tipo_de_reporte(tipo, rol):
+    # La cola revisa el tipo de trabajo contra el recurso 'reportes'
+    def test(self):
+        self.client.force_authenticate(self.usuarios[rol])
+        parametros = {'alta_id': self.alta.id} if tipo == 'alta_pdf' else {}
+        estado = self.client.post('/api/reportes/jobs/', {'tipo': tipo, 'parametros': parametros}, format='json').status_code
+        self.assertEqual(estado, 202 if self.esperado(rol, 'reportes', tipo) else 403, f"{rol} / job {tipo}")
+    return test
+
+
+for (_recurso, _accion) in ENDPOINTS:
+    for _rol in ROLES:
+        setattr(MatrizPermisosTest, f"test_{_recurso}_{_accion}_{_rol}".replace('-', '_').lower(),
+                _test_endpoint(_recurso, _accion, _rol))
+for _tipo in ('excel_partos', 'rem', 'alta_pdf', 'auditoria'):
+    for _rol in ROLES:
+        setattr(MatrizPermisosTest, f"test_job_{_tipo}_{_rol}".lower(), _test_tipo_de_reporte(_tipo, _rol))
+
+
+class PaginasFrontendTest(TestCaseClinico):
+    """
+    Cada página de React con los roles que App.tsx le manda, haciendo las mismas llamadas
+    que hace la página: si la matriz de permisos deja a un rol fuera de su propia pantalla, falla.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        directorio_temporal(self, 'REPORTES_DIR')
+        self.madre = Madre.objects.create(rut="11111111-1", nombre_completo="Ana", fecha_nacimiento=date(1990, 1, 1), comuna="Test")
+        self.parto = Parto.objects.create(madre=self.madre, tipo_parto='EUTOCICO', edad_gestacional=39)
+
+    def llamar(self, metodo, url, datos=None):
+        respuesta = getattr(self.client, metodo)(url, datos, format='json')
+        self.assertLess(respuesta.status_code, 400, f"{metodo.upper()} {url}: {respuesta.status_code}")
+        return respuesta
+
+    def como(self, rol):
+        self.client.force_authenticate(crear_usuario(f"{rol.lower()}{User.objects.count()}", rol))
+
+    # --- LLAMADAS DE CADA PÁGINA (frontend/src/pages) ---
+    def enfermera(self):
+        # BuscarPaciente + handleSubmit de EnfermeraPage
+        self.llamar('get', '/api/madres/', {'rut': '11111111-1'})
+        self.llamar('patch', f'/api/madres/{self.madre.id}/', {'grupo_sanguineo': 'O', 'gestas': 2, 'vih_positivo': 'NO'})
+        parto = self.llamar('post', '/api/partos/', {
+            'madre': self.madre.id, 'tipo_parto': 'EUTOCICO', 'edad_gestacional': 39, 'profesional_acargo': 'Dra. X',
+        }).json()
+        self.llamar('post', '/api/recien-nacidos/', {
+            'parto': parto['id'], 'sexo': 'F', 'peso_gramos': 3200, 'talla_cm': 50, 'apgar_1': 9, 'apgar_5': 10,
+        })
+
+    def especialista(self):
+        for url in ('/api/partos/', '/api/logs/', '/api/madres/'):
+            self.llamar('get', url)
+        self.llamar('get', '/api/altas/', {'estado': 'PENDIENTE'})
+        # Informes: se encolan y se consulta el trabajo (reportesApi.generarYDescargar)
+        for tipo in ('excel_partos', 'rem', 'auditoria'):
+            trabajo = self.llamar('post', '/api/reportes/jobs/', {'tipo': tipo, 'parametros': {}}).json()
+            self.llamar('get', f"/api/reportes/jobs/{trabajo['id']}/")
+        # Autorizaciones: altasApi.autorizar / altasApi.rechazar
+        for estado in ('AUTORIZADA', 'RECHAZADA'):
+            alta = Alta.objects.create(parto=self.parto)
+            self.llamar('patch', f'/api/altas/{alta.id}/', {'estado': estado, 'observaciones': ''})
+
+    def test_pagina_enfermera(self):
+        for rol in ('ENFERMERA', 'TECNICO'):
+            with self.subTest(rol=rol):
+                self.como(rol)
+                self.enfermera()
+
+    def test_pagina_matrona(self):
+        # MatronaPage muestra EnfermeraPage y EspecialistaPage además del aviso de altas pendientes
+        self.como('MATRONA')
+        self.llamar('get', '/api/altas/resumen/')
+        self.enfermera()
+        self.especialista()
+
+    def test_pagina_especialista(self):
+        for rol in ('MEDICO', 'SUPERVISOR'):
+            with self.subTest(rol=rol):
+                self.como(rol)
+                self.especialista()
+
+    def test_pagina_administrativo(self):
+        self.como('ADMISION')
+        self.llamar('get', '/api/madres/', {'rut': '22222222-2'})
+        datos = {'rut': '22222222-2', 'nombre_completo': "Berta Soto", 'fecha_nacimiento': '1992-05-01', 'comuna': 'Test'}
+        nueva = self.llamar('post', '/api/madres/', datos).json()
+        self.llamar('put', f"/api/madres/{nueva['id']}/", {**datos, 'telefono': '912345678'})
+
+    def test_pagina_admin_ti(self):
+        otro = crear_usuario('admision', 'ADMISION')
+        self.como('TI')
+        self.llamar('get', '/api/users/')
+        self.llamar('post', f"/api/users/{otro.id}/toggle_estado/")
+
+
+# ==========================================
+# SQLITE EN PRODUCCIÓN (PRAGMAS + COLA DE ESCRITURA)
+# ==========================================
+# unittest.TestCase: las BD temporales se crean al vuelo y el TestCase de Django solo deja
+# conectarse a los alias declarados en `databases`
+@unittest.skipUnless(connection.vendor == 'sqlite', "Solo aplica con SQLite")
+class SQLiteProduccionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = directorio_temporal(self)
+
+    def conexion_con_cola(self, alias, espera=5, **pragmas):
+        registrar_alias(alias, os.path.join(self.directorio, 'cola.sqlite3'), 'core.db.sqlite3', {
+            'transaction_mode': 'IMMEDIATE', 'pragmas': {**PRAGMAS_PRODUCCION, **pragmas},
+            'cola_escritura': True, 'cola_espera': espera,
+        })
+        self.addCleanup(quitar_alias, alias)
+        with connections[alias].cursor() as cursor:
+            cursor.execute("CREATE TABLE IF NOT EXISTS t (id INTEGER PRIMARY KEY, valor TEXT)")
+        connections[alias].close()
+
+    def en_hilo(self, alias, funcion):
+        """Corre funcion(conexion) en otro hilo (cada hilo tiene su propia conexión)."""
+        resultado = {}
+
+        def correr():
+            try:
+                resultado['valor'] = funcion(connections[alias])
+            finally:
+                connections[alias].close()
+        hilo = threading.Thread(target=correr)
+        hilo.start()
+        return hilo, resultado
+
+    def test_pragmas_en_cada_conexion(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], settings.DATABASES['default']['OPTIONS']['pragmas']['busy_timeout'])
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+        registrar_alias('sqlite_wal', os.path.join(self.directorio, 'wal.sqlite3'), 'core.db.sqlite3',
+                        {'pragmas': PRAGMAS_PRODUCCION})
+        self.addCleanup(quitar_alias, 'sqlite_wal')
+        self.addCleanup(connections['sqlite_wal'].close)
+        with connections['sqlite_wal'].cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+    def test_cola_serializa_escrituras_y_no_bloquea_lecturas(self):
+        self.conexion_con_cola('sqlite_cola')
+        dentro, seguir = threading.Event(), threading.Event()
+        orden = []
+
+        def transaccion_larga(conexion):
+            with transaction.atomic(using='sqlite_cola'), conexion.cursor() as cursor:
+                cursor.execute("INSERT INTO t (valor) VALUES ('larga')")
+                dentro.set()
+                seguir.wait(5)
+                orden.append('larga')
+
+        def escritura(conexion):
+            with conexion.cursor() as cursor:
+                cursor.execute("INSERT INTO t (valor) VALUES ('suelta')")
+            orden.append('suelta')
+
+        def lectura(conexion):
+            with conexion.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM t")
+                return cursor.fetchone()[0]
+
+        larga, _ = self.en_hilo('sqlite_cola', transaccion_larga)
+        self.assertTrue(dentro.wait(5))
+
+        # La lectura no espera la cola; la escritura suelta queda detrás de la transacción
+        hilo_lectura, leido = self.en_hilo('sqlite_cola', lectura)
+        hilo_lectura.join(5)
+        self.assertEqual(leido.get('valor'), 0)
+        suelta, _ = self.en_hilo('sqlite_cola', escritura)
+        suelta.join(0.2)
+        self.assertTrue(suelta.is_alive())
+
+        seguir.set()
+        larga.join(5)
+        suelta.join(5)
+        self.assertEqual(orden, ['larga', 'suelta'])
+        self.assertFalse(cola_para(connections['sqlite_cola'].settings_dict['NAME']).locked())
+
+    def test_sin_turno_tras_la_espera_falla_como_lock(self):
+        self.conexion_con_cola('sqlite_cola_corta', espera=0.1)
+        cola = cola_para(connections['sqlite_cola_corta'].settings_dict['NAME'])
+        cola.acquire()
+        self.addCleanup(cola.release)
+        with self.assertRaisesRegex(OperationalError, 'database is locked'):
+            with connections['sqlite_cola_corta'].cursor() as cursor:
+                cursor.execute("INSERT INTO t (valor) VALUES ('x')")
+        connections['sqlite_cola_corta'].close()
+
+    def test_begin_fallido_devuelve_el_turno(self):
+        self.conexion_con_cola('sqlite_cola_begin', espera=1, busy_timeout=50)
+        # Otro proceso tiene el lock de escritura de SQLite más allá de busy_timeout
+        otro_proceso = sqlite3.connect(connections['sqlite_cola_begin'].settings_dict['NAME'], isolation_level=None)
+        self.addCleanup(otro_proceso.close)
+        otro_proceso.execute("BEGIN IMMEDIATE")
+
+        # En este hilo y sin cerrar la conexión, como un worker con CONN_MAX_AGE
+        self.addCleanup(connections['sqlite_cola_begin'].close)
+        with self.assertRaisesRegex(OperationalError, 'database is locked'):
+            with transaction.atomic(using='sqlite_cola_begin'):
+                pass
+        otro_proceso.execute("COMMIT")
+
+        def escritura(conexion):
+            with transaction.atomic(using='sqlite_cola_begin'), conexion.cursor() as cursor:
+                cursor.execute("INSERT INTO t (valor) VALUES ('despues')")
+            return True
+        hilo, escrito = self.en_hilo('sqlite_cola_begin', escritura)
+        hilo.join(5)
+        self.assertTrue(escrito.get('valor'))
+        self.assertFalse(cola_para(connections['sqlite_cola_begin'].settings_dict['NAME']).locked())
+
+    def test_benchmark(self):
+        salida = io.StringIO()
+        call_command('benchmark_sqlite', hilos=2, segundos=0.1, filas=50, stdout=salida)
+        for nombre in ('Django por defecto', 'WAL + pragmas', 'WAL + pragmas + cola'):
+            self.assertIn(nombre, salida.getvalue())
+
+
+# ==========================================
+# RÉPLICA DE LECTURA
+# ==========================================
+@override_settings(REPLICA_ALIAS='replica_test', REPLICA_LAG_REFRESCO=60)
+class ReplicaLecturaTest(TestCaseClinico):
+    """La réplica es un segundo SQLite con datos distintos: así se ve de dónde leyó cada request."""
+
+    @classmethod
+    def setUpClass(cls):
+        # El alias se crea aquí y no en settings: el runner no debe crearle una BD de test
+        cls.directorio = directorio_temporal(cls)
+        cls.databases = {'default', 'replica_test'}
+        registrar_alias('replica_test', os.path.join(cls.directorio, 'replica.sqlite3'), 'django.db.backends.sqlite3', {})
+        with connections['replica_test'].schema_editor() as editor:
+            for modelo in apps.get_models():
+                editor.create_model(modelo)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica_test'].close()
+        quitar_alias('replica_test')
+
+    def setUp(self):
+        cache.clear()
+        estado_replica.invalidar()
+        self.addCleanup(estado_replica.invalidar)
+        self.client = APIClient()
+        self.matrona = crear_usuario('matrona', 'MATRONA')
+        self.client.force_authenticate(self.matrona)
+        Madre.objects.create(rut='11111111-1', nombre_completo='Primaria', fecha_nacimiento=date(1990, 1, 1), comuna='Test')
+        Madre.objects.using('replica_test').create(
+            rut='22222222-2', nombre_completo='Replica', fecha_nacimiento=date(1990, 1, 1), comuna='Test',
+        )
+
+    def nombres(self):
+        respuesta = self.client.get('/api/madres/')
+        self.assertEqual(respuesta.status_code, 200)
+        return [m['nombre_completo'] for m in respuesta.data]  # Paginación legacy: lista plana
+
+    def test_metricas_cuentan_las_consultas_de_la_replica(self):
+        metricas.reiniciar()
+        self.addCleanup(metricas.reiniciar)
+        with CaptureQueriesContext(connection) as primaria, CaptureQueriesContext(connections['replica_test']) as replica:
+            self.nombres()
+        self.assertGreater(len(replica), 0)
+        self.assertEqual(metricas.contadores[('sql_consultas_total', (('ruta', 'madre-list'),))], len(primaria) + len(replica))
+
+    def test_listado_lee_de_replica_y_escribe_en_primaria(self):
+        self.assertEqual(self.nombres(), ['Replica'])
+        self.assertEqual(self.client.get(f'/api/madres/{Madre.objects.get().id}/').data['nombre_completo'], 'Primaria')
+
+    def test_lee_lo_que_acaba_de_escribir(self):
+        respuesta = self.client.post('/api/madres/', {
+            'rut': '33333333-3', 'nombre_completo': 'Nueva', 'fecha_nacimiento': '1995-05-05', 'comuna': 'Test',
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertFalse(Madre.objects.using('replica_test').filter(pk=respuesta.data['id']).exists())
+        self.assertEqual(sorted(self.nombres()), ['Nueva', 'Primaria'])
+
+        # Otro usuario no escribió: sigue en la réplica
+        self.client.force_authenticate(crear_usuario('otra', 'MATRONA'))
+        self.assertEqual(self.nombres(), ['Replica'])
+
+    @override_settings(REPLICA_LAG_MAX=-1)
+    def test_replica_atrasada_vuelve_a_primaria(self):
+        self.assertEqual(self.nombres(), ['Primaria'])
+
+    def test_replica_caida_se_loguea(self):
+        # close() se neutraliza: la conexión de la réplica es de toda la clase (ver setUpClass)
+        with mock.patch.object(estado_replica, 'medir_lag', side_effect=OperationalError('sin conexión')), \
+                mock.patch.object(connections['replica_test'], 'close'):
+            with self.assertLogs('core.replica', 'WARNING') as logs:
+                self.assertEqual(self.nombres(), ['Primaria'])
+        self.assertIn('no responde', logs.output[0])
+
+    def test_aviso_si_la_cache_no_es_compartida(self):
+        self.assertEqual([a.id for a in revisar_cache_compartida(None)], ['core.W001'])  # LocMem por defecto
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost'}}
+        with override_settings(CACHES=redis):
+            self.assertEqual(revisar_cache_compartida(None), [])
+        with override_settings(REPLICA_ALIAS='no_existe'):
+            self.assertEqual(revisar_cache_compartida(None), [])
+
+    def test_sin_replica_configurada(self):
+        with override_settings(REPLICA_ALIAS='no_existe'):
+            self.assertEqual(self.nombres(), ['Primaria'])
+
+    def test_reportes_y_exportacion_en_streaming(self):
+        self.client.force_authenticate(crear_usuario('bi', 'SUPERVISOR'))
+        with CaptureQueriesContext(connections['replica_test']) as replica:
+            self.assertEqual(self.client.get('/api/reportes/excel/').status_code, 200)
+        self.assertTrue(any('clinical_parto' in q['sql'] for q in replica.captured_queries))
+
+        respuesta = self.client.get('/api/exportar/madres/?formato=csv&columnas=nombre_completo')
+        self.assertEqual(b''.join(respuesta.streaming_content).decode().splitlines(), ['nombre_completo', 'Replica'])
+        self.assertEqual(LogAudit.objects.filter(accion='EXPORTAR').count(), 2)
+        self.assertFalse(LogAudit.objects.using('replica_test').exists())
+
+
+# ==========================================
+# TIPO DE PARTO (CÓDIGO) E ÍNDICES
+# ==========================================
+class TipoPartoTest(TestCaseClinico):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(crear_usuario('matrona', 'MATRONA'))
+        self.madre = Madre.objects.create(rut='11111111-1', nombre_completo='Ana', fecha_nacimiento=date(1990, 1, 1), comuna='Test')
+
+    def test_normaliza_texto_libre(self):
+        casos = {
+            'CESAREA URGENCIA': 'CESAREA_URGENCIA', 'Cesárea electiva': 'CESAREA_ELECTIVA', 'cesarea': 'CESAREA',
+            'NORMAL': 'EUTOCICO', 'Vaginal': 'EUTOCICO', 'fórceps': 'FORCEPS', 'VACUUM': 'VACUUM', 'otro': 'OTRO',
+            'xyz': None, '': None,
+        }
+        for texto, codigo in casos.items():
+            self.assertEqual(normalizar_tipo_parto(texto), codigo, texto)
+
+    def test_api_guarda_el_codigo(self):
+        respuesta = self.client.post('/api/partos/', {
+            'madre': self.madre.id, 'tipo_parto': 'CESAREA URGENCIA', 'edad_gestacional': 38,
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.data['tipo_parto'], 'CESAREA_URGENCIA')
+        self.assertEqual(respuesta.data['tipo_parto_display'], 'Cesárea urgencia')
+        self.assertEqual(Parto.objects.get().tipo_parto, 'CESAREA_URGENCIA')
+
+        respuesta = self.client.post('/api/partos/', {
+            'madre': self.madre.id, 'tipo_parto': 'desconocido', 'edad_gestacional': 38,
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('tipo_parto', respuesta.data)
+
+    def test_rem_cuenta_cesareas_por_codigo(self):
+        for tipo in ('CESAREA_URGENCIA', 'CESAREA_ELECTIVA', 'CESAREA', 'EUTOCICO', 'FORCEPS'):
+            Parto.objects.create(madre=self.madre, tipo_parto=tipo, edad_gestacional=39)
+        self.assertEqual(totales_rem(), (5, 3))
+
+
+# unittest.TestCase: se migra una BD SQLite aparte (ver MigracionBinariaTest)
+class MigracionTipoPartoTest(unittest.TestCase):
+    alias = 'migracion_tipo_parto'
+
+    def setUp(self):
+        directorio = directorio_temporal(self)
+        registrar_alias(self.alias, os.path.join(directorio, 'migracion.sqlite3'), 'django.db.backends.sqlite3', {})
+        self.addCleanup(quitar_alias, self.alias)
+        self.addCleanup(connections[self.alias].close)
+
+    def test_texto_libre_pasa_a_codigo_y_se_recalcula_el_rollup(self):
+        call_command('migrate', 'clinical', '0017_revocacion_token', database=self.alias, verbosity=0)
+        apps_0017 = MigrationExecutor(connections[self.alias]).loader.project_state(('clinical', '0017_revocacion_token')).apps
+        madre = apps_0017.get_model('clinical', 'Madre').objects.using(self.alias).create(
+            rut="11111111-1", nombre_completo="Ana", fecha_nacimiento=date(1990, 1, 1), comuna="Test",
+        )
+        Parto = apps_0017.get_model('clinical', 'Parto')
+        for tipo in ('Cesárea urgencia', 'NORMAL', 'ventosa', 'xyz'):
+            Parto.objects.using(self.alias).create(madre_id=madre.id, tipo_parto=tipo, edad_gestacional=39)
+
+        call_command('migrate', 'clinical', '0018_indices_clinicos', database=self.alias, verbosity=0)
+        self.assertEqual(
+            sorted(Parto.objects.using(self.alias).values_list('tipo_parto', flat=True)),
+            ['CESAREA_URGENCIA', 'EUTOCICO', 'OTRO', 'VACUUM'],
+        )
+        tipos = EstadisticaDiaria.objects.using(self.alias).filter(dimension='parto_tipo')
+        self.assertEqual(sorted(tipos.values_list('valor', flat=True)), ['CESAREA_URGENCIA', 'EUTOCICO', 'OTRO', 'VACUUM'])
+
+
+# unittest.TestCase: el benchmark arma su propia BD temporal (ver SQLiteProduccionTest)
+class BenchmarkIndicesTest(unittest.TestCase):
+
+    def test_explain_sin_y_con_indices(self):
+        salida = io.StringIO()
+        call_command('benchmark_indices', partos=200, repeticiones=1, stdout=salida)
+        texto = salida.getvalue()
+        self.assertIn('sin índices', texto)
+        for indice in ('parto_fecha_idx', 'parto_tipo_fecha_idx', 'rn_parto_sexo_peso_idx', 'alta_estado_fecha_idx'):
+            self.assertIn(indice, texto)
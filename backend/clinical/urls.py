@@ -9,10 +9,13 @@ from .views import (
     AltaViewSet,
     LogAuditViewSet,
     UserViewSet,
+    ReporteJobViewSet,
     reporte_excel_completo,
     alta_medica_pdf,
     reporte_auditoria_pdf,
     reporte_pdf_rem,
+    exportar_dataset,
+    estadisticas_partos,
 )
 
 router = DefaultRouter()
@@ -22,6 +25,7 @@ router.register(r'recien-nacidos', RecienNacidoViewSet)
 router.register(r'altas', AltaViewSet)
 router.register(r'logs', LogAuditViewSet)
 router.register(r'users', UserViewSet) 
+router.register(r'reportes/jobs', ReporteJobViewSet, basename='reporte-job')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -33,5 +37,7 @@ urlpatterns = [
     path('reportes/auditoria/', reporte_auditoria_pdf, name='reporte_auditoria_alt'),
     path('reportes/logs/', reporte_auditoria_pdf, name='reporte_auditoria_logs'),
     path('reportes/rem/', reporte_pdf_rem, name='reporte_rem'),
+    path('estadisticas/partos/', estadisticas_partos, name='estadisticas_partos'),
     path('altas/<int:pk>/pdf/', alta_medica_pdf, name='alta_pdf'),
+    path('exportar/<str:dataset>/', exportar_dataset, name='exportar_dataset'),
 ]
\ No newline at end of file
@@ -1,52 +1,106 @@
-from rest_framework import viewsets, status
+from rest_framework import viewsets, status, mixins
 from rest_framework.response import Response
 from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError, PermissionDenied
 from rest_framework_simplejwt.views import TokenObtainPairView
-from django.shortcuts import get_object_or_404
-from django.http import HttpResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa
+from django.db.models import Count
+from django.utils.dateparse import parse_date
+from datetime import datetime, time, timedelta
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse, Http404
+from django.conf import settings
 from django.utils import timezone
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 import io
+import tempfile
 
 # Modelos y Serializers
-from .models import Madre, Parto, RecienNacido, LogAudit, Alta, Perfil
+from .models import Madre, Parto, RecienNacido, LogAudit, Alta, Perfil, ReporteJob
 from django.contrib.auth.models import User
-from core.encryption import crypto_manager
+from core.hashing import blind_indexer
+from core.fields import descifrar_en_lote
+from core.replica import LecturaReplicaMixin, lectura_en_replica
 from .serializers import *
+from .busqueda import buscar_por_nombre
+from .pagination import CursorPaginacion
+from .reportes import (
+    XLSX, FILTROS_LOG, ErrorReporte, filtrar_logs, generar_excel_partos, generar_rem_pdf, generar_alta_pdf, generar_auditoria_pdf,
+    pdfs_altas, zip_en_streaming,
+)
+from .cola_reportes import encolar, ruta_archivo
+from .auditoria import buffer_auditoria
+from .autenticacion import revocaciones, rol_de
+from .permissions import PermisoPorRol, matriz_permisos
+from .estadisticas import resumen as resumen_estadisticas
+from .archivo_auditoria import consultar as consultar_auditoria
+from .exportacion import (
+    DATASETS, FORMATOS, columnas_disponibles, columnas_cifradas, filas_descifradas, generar_exportacion,
+)
 
 # --- HELPER LOGS ---
-def registrar_log(request, accion, modulo, descripcion):
+def _rol_de(request):
+    # El rol viaja en el JWT (MyTokenObtainPairSerializer): así no se consulta perfil en cada log
+    token = getattr(request, 'auth', None)
+    if token is not None and hasattr(token, 'get') and token.get('rol'):
+        return token.get('rol')
+    if request.user.is_authenticated:
+        return rol_de(request.user) or 'Desconocido'
+    return 'Desconocido'
+
+def _entrada_log(request, accion, modulo, descripcion):
+    return LogAudit(
+        usuario=request.user.username if request.user.is_authenticated else 'Sistema',
+        rol=_rol_de(request),
+        accion=accion,
+        modelo=modulo,
+        detalles=descripcion,
+        ip_address=request.META.get('REMOTE_ADDR'),
+        fecha=timezone.now(),  # Hora del evento, no la del flush
+    )
+
+def registrar_log(request, accion, modulo, descripcion, inmediato=False):
+    """
+    Deja la entrada en el buffer de auditoría (se escribe en lote fuera del request).
+    inmediato=True la escribe antes de responder, para acciones que deben quedar sí o sí.
+    """
     try:
-        rol = 'Desconocido'
-        if request.user.is_authenticated and hasattr(request.user, 'perfil'):
-            rol = request.user.perfil.rol
-        
-        LogAudit.objects.create(
-            usuario=request.user.username if request.user.is_authenticated else 'Sistema',
-            rol=rol,
-            accion=accion,
-            modelo=modulo,
-            detalles=descripcion,
-            ip_address=request.META.get('REMOTE_ADDR')
-        )
+        buffer_auditoria.encolar([_entrada_log(request, accion, modulo, descripcion)], inmediato=inmediato)
     except Exception as e:
         # Si falla el log, lo imprimimos en la consola negra para enterarnos
         print(f"❌ Error guardando LOG: {e}")
 
+def registrar_logs_lote(request, accion, modulo, descripciones, inmediato=False):
+    """Igual que registrar_log pero para muchas entradas: un solo INSERT (bulk_create)."""
+    try:
+        base = _entrada_log(request, accion, modulo, '')
+        buffer_auditoria.encolar([
+            LogAudit(usuario=base.usuario, rol=base.rol, accion=accion, modelo=modulo,
+                     detalles=d, ip_address=base.ip_address, fecha=base.fecha)
+            for d in descripciones
+        ], inmediato=inmediato)
+    except Exception as e:
+        print(f"❌ Error guardando LOG: {e}")
+
+# --- HELPER FECHAS (Filtros ?desde=&hasta=) ---
+def _parsear_fecha(valor, nombre):
+    """'YYYY-MM-DD' -> datetime aware a las 00:00 (zona horaria del servidor)."""
+    if not valor:
+        return None
+    fecha = parse_date(valor)
+    if fecha is None:
+        raise ValidationError({nombre: "Formato de fecha inválido, use AAAA-MM-DD."})
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
 # --- VIEWSETS (Lógica API) ---
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
 
 
-class MadreViewSet(viewsets.ModelViewSet):
-    queryset = Madre.objects.all().order_by('-created_at')
+class MadreViewSet(LecturaReplicaMixin, viewsets.ModelViewSet):
+    queryset = Madre.objects.all().order_by('-created_at', '-id')
     serializer_class = MadreSerializer
-    permission_classes = [IsAuthenticated]
-    pagination_class = None
+    permission_classes = [PermisoPorRol]
+    recurso_permisos = 'madres'  # settings.PERMISOS_ROLES
+    pagination_class = CursorPaginacion
+    orden_cursor = ('-created_at', '-id')
     # LOGICA DE GUARDADO
     def perform_create(self, serializer):
         ins = serializer.save()
@@ -56,27 +110,29 @@ class MadreViewSet(viewsets.ModelViewSet):
         rut_buscado = request.query_params.get('rut', None)
         # 1. SI ESTÁN BUSCANDO UN RUT ESPECÍFICO...
         if rut_buscado:
-            input_limpio = rut_buscado.replace('.', '').replace('-', '').strip().upper()
-            # Buscamos una por una desencriptando
-            for madre in Madre.objects.all():
-                try:
-                    rut_real = crypto_manager.decrypt(madre.rut)
-                    if rut_real:
-                        rut_bd_limpio = rut_real.replace('.', '').replace('-', '').strip().upper()
-                        
-                        if input_limpio == rut_bd_limpio:
-                            serializer = self.get_serializer(madre)
-                            return Response([serializer.data])
-                except:
-                    continue
-            return Response([]) 
+            # Una sola consulta por índice ciego (HMAC del RUT normalizado)
+            madre = Madre.objects.filter(rut_hash=blind_indexer.rut(rut_buscado)).first()
+            if madre is None:
+                return Response([])
+            serializer = self.get_serializer(madre)
+            return Response([serializer.data])
+
+        # 2. BÚSQUEDA PARCIAL POR NOMBRE (índice ciego de trigramas)
+        nombre_buscado = request.query_params.get('nombre', None)
+        if nombre_buscado:
+            madres = buscar_por_nombre(self.get_queryset(), nombre_buscado)
+            if madres is None:
+                return Response({'error': 'Ingresa al menos 2 letras del nombre'}, status=400)
+            serializer = self.get_serializer(madres, many=True)
+            return Response(serializer.data)
         
         return super().list(request, *args, **kwargs)
 
-class PartoViewSet(viewsets.ModelViewSet):
-    queryset = Parto.objects.all().order_by('-fecha')
+class PartoViewSet(LecturaReplicaMixin, viewsets.ModelViewSet):
+    queryset = Parto.objects.prefetch_related('recien_nacidos').order_by('-fecha')
     serializer_class = PartoSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [PermisoPorRol]
+    recurso_permisos = 'partos'  # settings.PERMISOS_ROLES
     def perform_create(self, serializer):
         ins = serializer.save()
         registrar_log(self.request, 'CREAR', 'Parto', f"ID: {ins.id}")
@@ -84,32 +140,151 @@ class PartoViewSet(viewsets.ModelViewSet):
 class RecienNacidoViewSet(viewsets.ModelViewSet):
     queryset = RecienNacido.objects.all()
     serializer_class = RecienNacidoSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [PermisoPorRol]
+    recurso_permisos = 'recien-nacidos'  # settings.PERMISOS_ROLES
 
-class AltaViewSet(viewsets.ModelViewSet):
-    queryset = Alta.objects.all().order_by('-fecha_solicitud')
+class AltaViewSet(LecturaReplicaMixin, viewsets.ModelViewSet):
+    queryset = Alta.objects.select_related('parto__madre').order_by('-fecha_solicitud')
     serializer_class = AltaSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [PermisoPorRol]
+    recurso_permisos = 'altas'  # settings.PERMISOS_ROLES
+    acciones_replica = ('list', 'resumen')  # core.replica
+
+    # FILTROS EN SERVIDOR: ?estado=PENDIENTE&tipo=MEDICA&desde=2025-01-01&hasta=2025-01-31
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'resumen', 'pdf_lote'):
+            queryset = self._filtrar(queryset, self.request.query_params)
+        return queryset
+
+    def _filtrar(self, queryset, params):
+        if params.get('estado') and self.action != 'resumen':
+            queryset = queryset.filter(estado=params['estado'].upper())
+        if params.get('tipo'):
+            queryset = queryset.filter(tipo=params['tipo'].upper())
+        # Rangos como datetime (no __date) para que use el índice de fecha_solicitud
+        desde = _parsear_fecha(params.get('desde'), 'desde')
+        hasta = _parsear_fecha(params.get('hasta'), 'hasta')
+        if desde:
+            queryset = queryset.filter(fecha_solicitud__gte=desde)
+        if hasta:
+            queryset = queryset.filter(fecha_solicitud__lt=hasta + timedelta(days=1))
+        return queryset
+
+    # GET /api/altas/resumen/ -> conteo por estado en UNA consulta agregada, sin serializar filas
+    @action(detail=False, methods=['get'])
+    def resumen(self, request):
+        conteos = (
+            self.get_queryset().order_by()
+            .values('estado')
+            .annotate(total=Count('id'))
+        )
+        por_estado = {fila['estado']: fila['total'] for fila in conteos}
+        return Response({
+            'por_estado': por_estado,
+            'pendientes': por_estado.get('PENDIENTE', 0),
+            'total': sum(por_estado.values()),
+        })
+
+    # POST /api/altas/pdf-lote/ {"ids": [1, 2]} y/o ?estado=AUTORIZADA&desde=... -> ZIP con un PDF por alta
+    @action(detail=False, methods=['post'], url_path='pdf-lote')
+    def pdf_lote(self, request):
+        queryset = self.get_queryset().select_related('autorizado_por')
+        ids = request.data.get('ids')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(str(i).isdigit() for i in ids):
+                return Response({'error': 'ids debe ser una lista de números'}, status=400)
+            queryset = queryset.filter(pk__in=ids)
+
+        maximo = getattr(settings, 'ALTAS_PDF_LOTE_MAX', 500)
+        altas = list(queryset[:maximo + 1])
+        if not altas:
+            return Response({'error': 'No hay altas que coincidan'}, status=404)
+        if len(altas) > maximo:
+            return Response({'error': f'Máximo {maximo} altas por lote, acota el filtro'}, status=400)
+        descifrar_en_lote([a.parto.madre for a in altas if a.parto], ['rut', 'nombre_completo'])
+
+        def archivos():
+            errores, enviadas = [], []
+            try:
+                for alta_id, pdf, error in pdfs_altas(altas):
+                    if error:
+                        errores.append(f"Alta {alta_id}: {error}")
+                    else:
+                        enviadas.append(alta_id)
+                        yield f"Alta_{alta_id}.pdf", pdf
+                if errores:
+                    yield "errores.txt", "\n".join(errores).encode('utf-8')
+            finally:
+                # Una entrada de auditoría por documento entregado (los fallidos van en errores.txt),
+                # en un solo INSERT; también si el cliente corta la descarga a medias
+                if enviadas:
+                    registrar_logs_lote(request, 'EXPORTAR', 'PDF', [f"Alta {i} (Lote)" for i in enviadas])
+
+        response = StreamingHttpResponse(zip_en_streaming(archivos()), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="Altas_{timezone.localdate():%Y%m%d}.zip"'
+        return response
+
     def perform_create(self, serializer):
         serializer.save() 
         registrar_log(self.request, 'CREAR', 'Alta', "Solicitud")
     @action(detail=True, methods=['patch'])
     def gestionar(self, request, pk=None):
-        alta = self.get_object(); alta.estado = request.data.get('estado'); alta.autorizado_por = request.user; alta.save()
-        registrar_log(request, 'ACTUALIZAR', 'Alta', f"Estado: {alta.estado}")
+        alta = self.get_object(); alta.estado = request.data.get('estado'); alta.autorizado_por_id = request.user.id; alta.save()
+        registrar_log(request, 'ACTUALIZAR', 'Alta', f"Estado: {alta.estado}", inmediato=True)
         return Response({'status': 'ok'})
 
-class LogAuditViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = LogAudit.objects.all().order_by('-fecha')
+class LogAuditViewSet(LecturaReplicaMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = LogAudit.objects.all().order_by('-fecha', '-id')
     serializer_class = LogAuditSerializer
-    permission_classes = [IsAuthenticated]
-    pagination_class = None
+    permission_classes = [PermisoPorRol]
+    recurso_permisos = 'logs'  # settings.PERMISOS_ROLES
+    acciones_replica = ('list', 'historico')  # core.replica
+    pagination_class = CursorPaginacion
+    orden_cursor = ('-fecha', '-id')
+
+    # GET /api/logs/?usuario=&rol=&accion=&modelo=&ip=&desde=AAAA-MM-DD&hasta=AAAA-MM-DD
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+        try:
+            return filtrar_logs(queryset, self.request.query_params)
+        except ValueError as e:
+            raise ValidationError({str(e): "Formato de fecha inválido, use AAAA-MM-DD."})
+
+    # GET /api/logs/historico/?desde=AAAA-MM-DD&hasta=AAAA-MM-DD[&usuario=&accion=&modelo=&limite=]
+    # Lee la tabla y los meses ya archivados (.jsonl.gz) como si fueran uno solo
+    @action(detail=False, methods=['get'])
+    def historico(self, request):
+        desde = _parsear_fecha(request.query_params.get('desde'), 'desde')
+        hasta = _parsear_fecha(request.query_params.get('hasta'), 'hasta')
+        if not desde or not hasta:
+            return Response({'error': 'Debe indicar desde y hasta (AAAA-MM-DD).'}, status=400)
+        try:
+            limite = min(int(request.query_params.get('limite', 1000)), 5000)
+        except ValueError:
+            return Response({'error': 'limite debe ser un número.'}, status=400)
+
+        filtros = {c: request.query_params[c] for c in ('usuario', 'accion', 'modelo') if request.query_params.get(c)}
+        try:
+            logs, meses_archivados = consultar_auditoria(desde, hasta + timedelta(days=1), filtros, limite)
+        except (RuntimeError, FileNotFoundError) as e:
+            return Response({'error': f'Archivo de auditoría dañado o faltante: {e}'}, status=500)
+
+        registrar_log(request, 'CONSULTAR', 'Auditoria', f"Histórico {desde:%Y-%m-%d} a {hasta:%Y-%m-%d}")
+        return Response({
+            'meses_archivados': meses_archivados,
+            'results': self.get_serializer(logs, many=True).data,
+        })
 
 class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all().order_by('id')
+    queryset = User.objects.select_related('perfil').order_by('id')
     serializer_class = UserSerializer
-    permission_classes = [IsAuthenticated]
-    pagination_class = None
+    permission_classes = [PermisoPorRol]
+    recurso_permisos = 'users'  # settings.PERMISOS_ROLES
+    pagination_class = CursorPaginacion
+    orden_cursor = ('id',)
 
     @action(detail=True, methods=['post'])
     def toggle_estado(self, request, pk=None):
@@ -120,11 +295,14 @@ class UserViewSet(viewsets.ModelViewSet):
 
         usuario.is_active = not usuario.is_active
         usuario.save()
+        if not usuario.is_active:
+            # Sus JWT dejan de valer ya (la autenticación no consulta la BD)
+            revocaciones.revocar(usuario.id)
         
         estado_texto = "Activo" if usuario.is_active else "Bloqueado"
         
         try:
-            registrar_log(request, 'ACTUALIZAR', 'Usuario', f"Cambió estado a {estado_texto} - UserID: {usuario.id}")
+            registrar_log(request, 'ACTUALIZAR', 'Usuario', f"Cambió estado a {estado_texto} - UserID: {usuario.id}", inmediato=True)
         except:
             pass # Si falla el log, que no se caiga la app
             
@@ -133,242 +311,195 @@ class UserViewSet(viewsets.ModelViewSet):
             'is_active': usuario.is_active
         })
 
+# --- COLA DE REPORTES ---
+# POST /api/reportes/jobs/ {"tipo": "rem"} -> el worker lo genera fuera del request
+# GET  /api/reportes/jobs/<id>/ (estado) y /api/reportes/jobs/<id>/descargar/ (archivo)
+class ReporteJobViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                        mixins.ListModelMixin, viewsets.GenericViewSet):
+    serializer_class = ReporteJobSerializer
+    permission_classes = [PermisoPorRol]
+    recurso_permisos = 'reportes-jobs'  # settings.PERMISOS_ROLES
+    pagination_class = CursorPaginacion
+    orden_cursor = ('-creado', '-id')
+
+    def get_queryset(self):
+        queryset = ReporteJob.objects.order_by('-creado', '-id')
+        # Cada usuario ve solo sus reportes; TI/superusuario ven todos
+        if not (self.request.user.is_superuser or self.request.user.is_staff):
+            queryset = queryset.filter(solicitado_por_id=self.request.user.id)
+        return queryset
+
+    def perform_create(self, serializer):
+        if not matriz_permisos.permitido(self.request.user, 'reportes', serializer.validated_data['tipo']):
+            raise PermissionDenied("Su rol no puede generar este reporte.")
+        parametros = serializer.validated_data['parametros']
+        if serializer.validated_data['tipo'] == 'alta_pdf':
+            parametros['ip'] = self.request.META.get('REMOTE_ADDR')
+        serializer.instance = encolar(serializer.validated_data['tipo'], self.request.user, parametros)
+        registrar_log(self.request, 'SOLICITAR', 'Reporte', f"{serializer.instance.tipo} (Job {serializer.instance.id})")
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED  # Aceptado, aún no generado
+        return response
+
+    @action(detail=True, methods=['get'])
+    def descargar(self, request, pk=None):
+        job = self.get_object()
+        if job.estado == 'VENCIDO':
+            return Response({'error': 'El reporte expiró, solicítalo de nuevo'}, status=status.HTTP_410_GONE)
+        if job.estado == 'ERROR':
+            return Response({'error': f'El reporte falló: {job.error}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if job.estado != 'LISTO':
+            return Response({'error': 'El reporte aún no está listo', 'estado': job.estado}, status=status.HTTP_409_CONFLICT)
+        try:
+            archivo = open(ruta_archivo(job), 'rb')
+        except FileNotFoundError:
+            return Response({'error': 'El reporte expiró, solicítalo de nuevo'}, status=status.HTTP_410_GONE)
+
+        registrar_log(request, 'EXPORTAR', 'Reporte', f"{job.tipo} (Job {job.id})")
+        return FileResponse(archivo, as_attachment=True, filename=job.nombre_archivo, content_type=job.content_type)
+
     # --- REPORTES ---
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@permission_classes([PermisoPorRol.para('reportes', 'excel_partos')])
+@lectura_en_replica
 def reporte_excel_completo(request):
     registrar_log(request, 'EXPORTAR', 'Excel', "Listado Partos Estilizado")
-    
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="Reporte_Gestion_Partos.xlsx"'
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Registro Clínico"
-
-    header_font = Font(name='Calibri', size=11, bold=True, color='FFFFFF')
-    header_fill = PatternFill(start_color='003366', end_color='003366', fill_type='solid')
-    centered_alignment = Alignment(horizontal='center', vertical='center')
-    left_alignment = Alignment(horizontal='left', vertical='center')
-    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), 
-                         top=Side(style='thin'), bottom=Side(style='thin'))
-
-    # --- 2. ENCABEZADOS ---
-    headers = ['ID', 'Fecha Ingreso', 'Nombre Paciente', 'RUT', 'Tipo Parto', 'Sexo RN', 'Peso (gr)']
-    ws.append(headers)
-    
-    # Aplicar estilo a la fila de encabezados
-    for cell in ws[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = centered_alignment
-        cell.border = thin_border
-
-    # --- 3. DATOS (Con Desencriptación) ---
-    for p in Parto.objects.all().order_by('-fecha'):
-        # Desencriptar
-        rut_visible = "Sin Dato"
-        try:
-            rut_visible = crypto_manager.decrypt(p.madre.rut) if p.madre.rut else ""
-        except: rut_visible = "Error Cifrado"
 
-        nombre_visible = "Sin Nombre"
-        try:
-            if p.madre.nombre_completo:
-                decrypted = crypto_manager.decrypt(p.madre.nombre_completo)
-                nombre_visible = decrypted if decrypted != "ERROR_DECRYPT" else p.madre.nombre_completo
-            else:
-                nombre_visible = p.madre.nombre_completo
-        except: nombre_visible = p.madre.nombre_completo
-
-        rn = p.recien_nacidos.first()
-        sexo = rn.sexo if rn else "-"
-        peso = rn.peso_gramos if rn else 0
-
-        row = [
-            p.id,
-            str(p.fecha)[:16],
-            nombre_visible,
-            rut_visible,
-            p.tipo_parto,
-            sexo,
-            peso
-        ]
-        ws.append(row)
-
-    column_widths = [5, 20, 35, 15, 15, 10, 10]
-    
-    for i, column_width in enumerate(column_widths, 1):
-        col_letter = openpyxl.utils.get_column_letter(i)
-        ws.column_dimensions[col_letter].width = column_width
-    for row in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=1, max_col=7):
-        for cell in row:
-            cell.border = thin_border
-            if cell.column == 3: 
-                cell.alignment = left_alignment
-            else:
-                cell.alignment = centered_alignment
-
-    wb.save(response)
+    # Se arma en un archivo temporal (disco, no RAM) y se envía por partes.
+    # Para no ocupar el worker web con años de datos, usar la cola: POST /api/reportes/jobs/
+    archivo = tempfile.TemporaryFile()
+    generar_excel_partos(archivo, request.user)
+    archivo.seek(0)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename="Reporte_Gestion_Partos.xlsx",
+        content_type=XLSX,
+    )
+
+@api_view(['GET'])
+@permission_classes([PermisoPorRol.para('reportes', 'exportar')])
+@lectura_en_replica
+def exportar_dataset(request, dataset):
+    """
+    GET /api/exportar/<dataset>/?formato=csv|jsonl&columnas=id,rut&desde=AAAA-MM-DD&hasta=AAAA-MM-DD
+    Exportación plana para BI: se envía fila a fila mientras se lee la BD por bloques.
+    """
+    if dataset not in DATASETS:
+        return Response({'error': f"Dataset desconocido. Opciones: {', '.join(DATASETS)}"}, status=404)
+    modelo, campo_fecha = DATASETS[dataset]
+
+    formato = request.query_params.get('formato', 'csv').lower()
+    if formato not in FORMATOS:
+        return Response({'error': f"Formato inválido. Opciones: {', '.join(FORMATOS)}"}, status=400)
+
+    disponibles = columnas_disponibles(modelo)
+    columnas = disponibles
+    if request.query_params.get('columnas'):
+        columnas = [c.strip() for c in request.query_params['columnas'].split(',') if c.strip()]
+        desconocidas = [c for c in columnas if c not in disponibles]
+        if desconocidas:
+            return Response({'error': f"Columnas desconocidas: {', '.join(desconocidas)}"}, status=400)
+
+    queryset = modelo.objects.order_by('pk')
+    desde = _parsear_fecha(request.query_params.get('desde'), 'desde')
+    hasta = _parsear_fecha(request.query_params.get('hasta'), 'hasta')
+    if desde:
+        queryset = queryset.filter(**{f'{campo_fecha}__gte': desde})
+    if hasta:
+        queryset = queryset.filter(**{f'{campo_fecha}__lt': hasta + timedelta(days=1)})
+
+    registrar_log(request, 'EXPORTAR', dataset, f"{formato.upper()} ({len(columnas)} columnas)")
+
+    filas = filas_descifradas(
+        queryset, columnas, columnas_cifradas(modelo, columnas),
+        getattr(settings, 'REPORTES_CHUNK_SIZE', 2000),
+    )
+    response = StreamingHttpResponse(generar_exportacion(formato, columnas, filas), content_type=FORMATOS[formato])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{formato}"'
     return response
 
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def reporte_pdf_rem(request):
-    # 1. Estadísticas Generales
-    total = Parto.objects.count()
-    cesareas = Parto.objects.filter(tipo_parto__icontains='CESAREA').count()
-    normales = total - cesareas
-    
-    # 2. PROCESAMIENTO DE DATOS (Limpieza forense)
-    partos_db = Parto.objects.all().order_by('-fecha')[:50]
-    lista_partos_limpia = []
-
-    for p in partos_db:
-        # A. Desencriptamos RUT
-        rut_visible = "Error"
-        try:
-            if p.madre.rut:
-                rut_visible = crypto_manager.decrypt(p.madre.rut)
-        except:
-            rut_visible = "RUT Ilegible"
+@permission_classes([PermisoPorRol.para('reportes', 'estadisticas')])
+def estadisticas_partos(request):
+    """
+    GET /api/estadisticas/partos/?desde=AAAA-MM-DD&hasta=AAAA-MM-DD&agrupar=total|mes
+    Conteos REM por tipo de parto, edad gestacional, sexo y peso del RN.
+    Lee solo el rollup diario: el costo depende de los días pedidos, no de la cantidad de partos.
+    """
+    agrupar = request.query_params.get('agrupar', 'total')
+    if agrupar not in ('total', 'mes'):
+        return Response({'error': "agrupar debe ser 'total' o 'mes'"}, status=400)
+    desde = _parsear_fecha(request.query_params.get('desde'), 'desde')
+    hasta = _parsear_fecha(request.query_params.get('hasta'), 'hasta')
 
-        # B. Desencriptamos NOMBRE (¡ESTO FALTABA!)
-        nombre_visible = "Desconocido"
-        try:
-            if p.madre.nombre_completo:
-                decrypted_name = crypto_manager.decrypt(p.madre.nombre_completo)
-                # Si desencripta bien, usamos ese. Si no (porque era texto plano antiguo), usamos el original.
-                if decrypted_name and decrypted_name != "ERROR_DECRYPT":
-                    nombre_visible = decrypted_name
-                else:
-                    nombre_visible = p.madre.nombre_completo
-        except:
-            # Si falla, mostramos el original (aunque esté feo, mejor que nada)
-            nombre_visible = p.madre.nombre_completo
-
-        # C. Datos del Bebé
-        rn = p.recien_nacidos.first()
-        sexo_rn = rn.sexo if rn else "S/I"
-        peso_rn = f"{rn.peso_gramos} gr" if rn else "0 gr"
-
-        # D. Armamos la fila limpia
-        lista_partos_limpia.append({
-            'fecha': p.fecha,
-            'tipo': p.tipo_parto,
-            'profesional': "Matrona Turno",
-            'rut_madre': rut_visible,       # <--- Limpio
-            'nombre_madre': nombre_visible, # <--- ¡AHORA SÍ LIMPIO!
-            'sexo': sexo_rn,
-            'peso': peso_rn
-        })
-    
-    # 3. Contexto
-    context = {
-        'lista_partos': lista_partos_limpia,
-        'total_partos': total,
-        'total_cesareas': cesareas,
-        'total_normales': normales,
-        'fecha_generacion': timezone.now(),
-        'generado_por': request.user.username
-    }
-    
-    # 4. Generar PDF
-    template_path = 'reporte_pdf.html'
+    return Response({
+        'desde': desde.date() if desde else None,
+        'hasta': hasta.date() if hasta else None,
+        'estadisticas': resumen_estadisticas(
+            desde.date() if desde else None,
+            hasta.date() if hasta else None,
+            por_mes=(agrupar == 'mes'),
+        ),
+    })
+
+@api_view(['GET'])
+@permission_classes([PermisoPorRol.para('reportes', 'rem')])
+@lectura_en_replica
+def reporte_pdf_rem(request):
     response = HttpResponse(content_type='application/pdf')
     response['Content-Disposition'] = 'attachment; filename="Informe_REM_Gestion.pdf"'
-    
+
     try:
-        template = get_template(template_path)
-        html = template.render(context)
-        pisa_status = pisa.CreatePDF(html, dest=response)
-        if pisa_status.err:
-            return HttpResponse('Error creando PDF', status=500)
+        generar_rem_pdf(response, request.user)
+    except ErrorReporte:
+        return HttpResponse('Error creando PDF', status=500)
     except Exception as e:
         return HttpResponse(f'Error en plantilla: {e}', status=500)
-        
+
     registrar_log(request, 'EXPORTAR', 'PDF', "Reporte REM (Limpio)")
     return response
 
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@permission_classes([PermisoPorRol.para('reportes', 'alta_pdf')])
 def alta_medica_pdf(request, pk):
-    alta = get_object_or_404(Alta, pk=pk)
-    
-    # 1. Preparar datos desencriptados por defecto
-    rut_visible = "RUT No Disponible"
-    paciente_nombre = "Nombre No Disponible"
-    
-    # 2. Intentar desencriptar RUT
-    if alta.parto.madre.rut:
-        try:
-            rut_visible = crypto_manager.decrypt(alta.parto.madre.rut)
-        except:
-            rut_visible = "Error Desencriptado"
-
-    # 3. Intentar desencriptar Nombre (si tu modelo lo guarda encriptado)
-    if alta.parto.madre.nombre_completo:
-        try:
-            # Intentamos desencriptar
-            decrypted_name = crypto_manager.decrypt(alta.parto.madre.nombre_completo)
-            if decrypted_name and decrypted_name != "ERROR_DECRYPT":
-                paciente_nombre = decrypted_name
-            else:
-                # Si no era encriptado, usamos el original
-                paciente_nombre = alta.parto.madre.nombre_completo
-        except:
-            paciente_nombre = alta.parto.madre.nombre_completo
-    # 4. Contexto que recibe el HTML
-    context = {
-        'tipo_alta': alta.tipo,
-        'paciente_nombre': paciente_nombre,  # <--- VARIABLE LIMPIA
-        'rut_visible': rut_visible,          # <--- VARIABLE LIMPIA
-        'fecha_ingreso': alta.parto.fecha,
-        'responsable': alta.autorizado_por.username if alta.autorizado_por else "Sin Firma",
-        'fecha_generacion': timezone.now(),
-        'ip': request.META.get('REMOTE_ADDR')
-    }
-    # 5. Generar PDF
-    template_path = 'alta_medica.html'
     response = HttpResponse(content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="Alta_{pk}.pdf"'
-    
-    template = get_template(template_path)
-    html = template.render(context)
-    
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    
-    if pisa_status.err:
+
+    try:
+        desde_cache = generar_alta_pdf(response, request.user, alta_id=pk, ip=request.META.get('REMOTE_ADDR'))
+    except Alta.DoesNotExist:
+        raise Http404
+    except ErrorReporte:
         return HttpResponse('Error generando PDF')
-        
-    registrar_log(request, 'EXPORTAR', 'PDF', f"Alta {pk} (HTML)")
+
+    # Toda descarga queda auditada, también las servidas desde la caché
+    registrar_log(request, 'EXPORTAR', 'PDF', f"Alta {pk} ({'Caché' if desde_cache else 'HTML'})")
     return response
 
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@permission_classes([PermisoPorRol.para('reportes', 'auditoria')])
+@lectura_en_replica
 def reporte_auditoria_pdf(request):
-    # 1. Obtenemos los últimos 100 registros de actividad
-    logs = LogAudit.objects.all().order_by('-fecha')[:100]
-    # 2. Contexto para el HTML
-    context = {
-        'logs': logs,
-        'fecha_generacion': timezone.now(),
-        'solicitante': request.user.username,
-        'total_registros': logs.count()
-    }
-    # 3. Generar PDF usando plantilla
-    template_path = 'auditoria_pdf.html'
+    # Acepta los mismos filtros que /api/logs/ y ?limite= (100 por defecto)
+    filtros = {p: request.GET[p] for p in [*FILTROS_LOG, 'desde', 'hasta'] if request.GET.get(p)}
+    try:
+        limite = int(request.GET.get('limite', 100))
+        filtrar_logs(LogAudit.objects.none(), filtros)
+    except ValueError:
+        return Response({'error': 'Filtros inválidos: fechas AAAA-MM-DD y limite numérico.'}, status=400)
+
     response = HttpResponse(content_type='application/pdf')
     response['Content-Disposition'] = 'attachment; filename="Auditoria_Forense_Sistema.pdf"'
-    
+
     try:
-        template = get_template(template_path)
-        html = template.render(context)
-        pisa_status = pisa.CreatePDF(html, dest=response)
-        if pisa_status.err:
-            return HttpResponse('Error creando PDF', status=500)
+        generar_auditoria_pdf(response, request.user, limite=limite, **filtros)
+    except ErrorReporte:
+        return HttpResponse('Error creando PDF', status=500)
     except Exception as e:
         return HttpResponse(f'Error buscando plantilla: {e}', status=500)
-        
-    registrar_log(request, 'EXPORTAR', 'PDF', "Auditoria de Seguridad")
-    return response
\ No newline at end of file
+
+    registrar_log(request, 'EXPORTAR', 'PDF', f"Auditoria de Seguridad {filtros or ''}".strip())
+    return response
@@ -0,0 +1,15 @@
+"""
+Funciones que ejecutan los procesos del pool de PDF (spawn).
+Este módulo no importa modelos al cargarse: el proceso hijo lo importa para
+deserializar la tarea antes de que Django esté configurado.
+"""
+
+
+def iniciar():
+    import django
+    django.setup()
+
+
+def renderizar_alta(datos):
+    from .reportes import renderizar_alta as renderizar
+    return renderizar(datos)
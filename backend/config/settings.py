@@ -12,7 +12,10 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import base64
+import hashlib
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +52,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     # CORS Middleware: Debe ir antes que CommonMiddleware
     'corsheaders.middleware.CorsMiddleware',
+    # Latencia, SQL y cifrado por ruta para /api/metrics (METRICAS_ACTIVAS=False lo apaga)
+    'core.metricas.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,6 +61,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Tras un POST/PUT/PATCH/DELETE propio, el usuario lee de la primaria (core.replica)
+    'core.replica.ReplicaMiddleware',
 ]
 
 # Orígenes permitidos para CORS (tu frontend de React)
@@ -94,6 +101,41 @@ DATABASES = {
     )
 }
 
+# --- SQLITE EN PRODUCCIÓN ---
+# Sitios chicos corren con el sqlite por defecto: se usa el backend propio (core/db/sqlite3) que
+# aplica los PRAGMA de producción (WAL, synchronous=NORMAL, mmap, caché, busy_timeout) y puede
+# serializar las escrituras del proceso en una cola. BEGIN IMMEDIATE toma el lock de escritura
+# al entrar al atomic(), así una transacción no falla a medio camino al pasar de leer a escribir.
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    from core.db.sqlite3.pragmas import PRAGMAS_PRODUCCION
+    DATABASES['default']['ENGINE'] = 'core.db.sqlite3'
+    DATABASES['default']['OPTIONS'] = {
+        'transaction_mode': 'IMMEDIATE',
+        'pragmas': {
+            **PRAGMAS_PRODUCCION,
+            'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+            'mmap_size': int(os.environ.get('SQLITE_MMAP_MB', 128)) * 1024 * 1024,
+            'cache_size': -int(os.environ.get('SQLITE_CACHE_MB', 20)) * 1024,
+        },
+        'cola_escritura': os.environ.get('SQLITE_COLA_ESCRITURA', 'False') == 'True',
+        'cola_espera': float(os.environ.get('SQLITE_COLA_ESPERA', 30)),
+        **DATABASES['default'].get('OPTIONS', {}),
+    }
+
+# --- RÉPLICA DE LECTURA ---
+# Con DATABASE_REPLICA_URL, los reportes y listados marcados (core.replica) leen de esa BD.
+# Si va atrasada más de REPLICA_LAG_MAX segundos o no responde, se vuelve a la primaria, y un
+# usuario que acaba de escribir lee de la primaria durante REPLICA_PEGAJOSO_SEGUNDOS.
+# Para probar en local basta otra BD: sqlite:////ruta/replica.sqlite3 o un PostgreSQL standby.
+REPLICA_ALIAS = 'replica'
+if os.environ.get('DATABASE_REPLICA_URL'):
+    DATABASES[REPLICA_ALIAS] = dj_database_url.parse(os.environ['DATABASE_REPLICA_URL'], conn_max_age=600)
+    DATABASES[REPLICA_ALIAS]['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['core.replica.RouterReplica']
+REPLICA_LAG_MAX = float(os.environ.get('REPLICA_LAG_MAX', 5))
+REPLICA_LAG_REFRESCO = float(os.environ.get('REPLICA_LAG_REFRESCO', 2))
+REPLICA_PEGAJOSO_SEGUNDOS = int(os.environ.get('REPLICA_PEGAJOSO_SEGUNDOS', 10))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -138,22 +180,162 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 ENCRYPTION_KEY = 'GRYNo5yHtCspWaC-DCO92wCxpl2rZNLryXBhVSmntWc='
 
+# Llavero para rotación: id -> llave. Los tokens nuevos se guardan como "<id>:<base64>".
+# Llaves extra por entorno: ENCRYPTION_EXTRA_KEYS="2=<base64>,3=<base64>"
+ENCRYPTION_KEYS = {'1': ENCRYPTION_KEY}
+for _par in os.environ.get('ENCRYPTION_EXTRA_KEYS', '').split(','):
+    if '=' in _par:
+        _kid, _llave = _par.split('=', 1)
+        ENCRYPTION_KEYS[_kid.strip()] = _llave.strip()
+ENCRYPTION_KEY_ID = os.environ.get('ENCRYPTION_KEY_ID', '1')  # Llave con la que se cifra
+ENCRYPTION_LEGACY_KEY_ID = '1'  # Llave de los tokens antiguos sin prefijo
+
+# Descifrado en lote (decrypt_many/encrypt_many): filas por trozo y cantidad de hilos
+ENCRYPTION_BATCH_CHUNK_SIZE = int(os.environ.get('ENCRYPTION_BATCH_CHUNK_SIZE', 256))
+ENCRYPTION_BATCH_MAX_WORKERS = int(os.environ.get('ENCRYPTION_BATCH_MAX_WORKERS', 0)) or None
+
+# Caché LRU de textos descifrados (apagada por defecto: guarda PHI en RAM)
+ENCRYPTION_CACHE_ENABLED = os.environ.get('ENCRYPTION_CACHE_ENABLED', 'False') == 'True'
+ENCRYPTION_CACHE_MAX_ENTRIES = int(os.environ.get('ENCRYPTION_CACHE_MAX_ENTRIES', 10000))
+ENCRYPTION_CACHE_MAX_BYTES = int(os.environ.get('ENCRYPTION_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+ENCRYPTION_CACHE_TTL = int(os.environ.get('ENCRYPTION_CACHE_TTL', 300))  # segundos
+
+# Llave HMAC para índices ciegos (búsqueda por RUT y nombre sin desencriptar).
+# Fuera de DEBUG es obligatoria en el entorno (32 bytes en base64 url-safe).
+BLIND_INDEX_KEY = os.environ.get('BLIND_INDEX_KEY')
+if not BLIND_INDEX_KEY:
+    if not DEBUG:
+        raise ImproperlyConfigured("Falta BLIND_INDEX_KEY en el entorno (ver README: Credenciales).")
+    # Solo desarrollo: se deriva de SECRET_KEY. Si cambia, correr reindexar_rut y reindexar_nombres
+    BLIND_INDEX_KEY = base64.urlsafe_b64encode(hashlib.sha256(f"indice-ciego:{SECRET_KEY}".encode()).digest()).decode()
+
 # Configuración de DRF (Django REST Framework)
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Arma el usuario con los claims del JWT (id, username, rol, staff): sin consultas por request
+        'clinical.autenticacion.JWTSinConsultas',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated', # Por defecto, todo cerrado
     ),
 }
 
+# PERMISOS POR ROL: recurso -> "acciones separadas por espacio" -> roles ('*' = cualquier autenticado).
+# Se compila al arrancar (clinical.permissions.matriz_permisos). Superusuario puede todo; staff cuenta como TI.
+# Lo que no aparece aquí queda prohibido. Cada rol debe poder usar la página a la que lo manda
+# frontend/src/App.tsx (MatronaPage incluye EnfermeraPage y EspecialistaPage): ver PaginasFrontendTest.
+_CLINICOS = ['MATRONA', 'ENFERMERA', 'MEDICO', 'TECNICO']
+PERMISOS_ROLES = {
+    'madres': {
+        'list retrieve': ['ADMISION', *_CLINICOS, 'SUPERVISOR'],
+        'create update partial_update': ['ADMISION', 'MATRONA', 'ENFERMERA', 'TECNICO'],
+        'destroy': ['ADMISION'],
+    },
+    'partos': {
+        'list retrieve': [*_CLINICOS, 'SUPERVISOR'],
+        'create update partial_update': _CLINICOS,  # EnfermeraPage (ENFERMERA y TECNICO) registra parto y RN
+        'destroy': ['MATRONA', 'MEDICO'],
+    },
+    'recien-nacidos': {
+        'list retrieve': [*_CLINICOS, 'SUPERVISOR'],
+        'create update partial_update': _CLINICOS,  # EnfermeraPage (ENFERMERA y TECNICO) registra parto y RN
+        'destroy': ['MATRONA', 'MEDICO'],
+    },
+    'altas': {
+        'list retrieve resumen': ['MATRONA', 'ENFERMERA', 'MEDICO', 'SUPERVISOR'],
+        'create': ['MATRONA', 'MEDICO'],
+        'update partial_update gestionar': ['MATRONA', 'MEDICO', 'SUPERVISOR'],  # Autorizar / rechazar
+        'pdf_lote': ['ADMISION', 'MATRONA', 'MEDICO', 'SUPERVISOR'],
+        'destroy': [],
+    },
+    'users': {
+        'list retrieve create update partial_update destroy toggle_estado': ['TI'],
+    },
+    'logs': {
+        'list retrieve historico': ['TI', 'SUPERVISOR', 'MATRONA', 'MEDICO'],
+    },
+    # Cada quien ve sus trabajos; al crear se revisa el tipo contra 'reportes'
+    'reportes-jobs': {
+        'list retrieve create descargar': ['*'],
+    },
+    # Endpoints de reportes y tipos de trabajo de la cola
+    'reportes': {
+        'excel_partos rem estadisticas': ['MATRONA', 'MEDICO', 'SUPERVISOR'],
+        'alta_pdf': ['ADMISION', 'MATRONA', 'MEDICO', 'SUPERVISOR'],
+        'auditoria': ['TI', 'SUPERVISOR', 'MATRONA', 'MEDICO'],
+        'exportar': ['TI', 'SUPERVISOR'],
+    },
+}
+
+# Tamaño de página de la paginación por cursor (?page_size= permite hasta 500)
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 50))
+
+# Compatibilidad: sin ?cursor= ni ?page_size= los listados devuelven la lista completa.
+# Poner en False cuando todos los clientes consuman la respuesta paginada.
+API_PAGINACION_LEGACY = os.environ.get('API_PAGINACION_LEGACY', 'True') == 'True'
+
+# REPORTES: filas leídas (y descifradas) por bloque al exportar; acota la memoria usada
+REPORTES_CHUNK_SIZE = int(os.environ.get('REPORTES_CHUNK_SIZE', 2000))
+
+# COLA DE REPORTES (python manage.py procesar_reportes): dónde quedan los archivos y cuánto duran
+REPORTES_DIR = os.environ.get('REPORTES_DIR', str(BASE_DIR / 'reportes_generados'))
+REPORTES_TTL_HORAS = int(os.environ.get('REPORTES_TTL_HORAS', 24))
+# Un trabajo EN_PROCESO más viejo que esto se da por muerto (worker caído) y se reintenta
+REPORTES_JOB_TIMEOUT = int(os.environ.get('REPORTES_JOB_TIMEOUT', 600))
+REPORTES_MAX_INTENTOS = int(os.environ.get('REPORTES_MAX_INTENTOS', 2))
+
+# CACHÉ DE PDF DE ALTAS (en disco, LRU por tamaño). 0 MB la desactiva.
+ALTA_PDF_CACHE_DIR = os.environ.get('ALTA_PDF_CACHE_DIR', str(BASE_DIR / 'cache_altas_pdf'))
+ALTA_PDF_CACHE_MAX_MB = int(os.environ.get('ALTA_PDF_CACHE_MAX_MB', 200))
+# Los PDF se guardan cifrados; una copia más vieja que esto se vuelve a generar
+ALTA_PDF_CACHE_MAX_HORAS = int(os.environ.get('ALTA_PDF_CACHE_MAX_HORAS', 24))
+
+# AUDITORÍA: por defecto cada LogAudit se escribe dentro del request ('sincrono').
+# 'buffer' los junta en memoria y un hilo los escribe en lote: es más rápido, pero lo que
+# esté en la cola se pierde si el proceso muere de golpe (kill -9, OOM), así que se activa a mano.
+AUDITORIA_MODO = os.environ.get('AUDITORIA_MODO', 'sincrono')
+AUDITORIA_BUFFER_MAX = int(os.environ.get('AUDITORIA_BUFFER_MAX', 10000))
+AUDITORIA_FLUSH_TAMANO = int(os.environ.get('AUDITORIA_FLUSH_TAMANO', 100))
+AUDITORIA_FLUSH_SEGUNDOS = float(os.environ.get('AUDITORIA_FLUSH_SEGUNDOS', 2))
+# Cola llena: 'bloquear' (esperar al hilo hasta AUDITORIA_ESPERA_MAX seg.) o 'sincrono' (escribir ya)
+AUDITORIA_POLITICA_LLENO = os.environ.get('AUDITORIA_POLITICA_LLENO', 'bloquear')
+AUDITORIA_ESPERA_MAX = float(os.environ.get('AUDITORIA_ESPERA_MAX', 1))
+# ARCHIVO DE AUDITORÍA (python manage.py archivar_auditoria): meses que quedan en la tabla
+# y carpeta donde van los meses cerrados comprimidos (.jsonl.gz + manifest.json)
+AUDITORIA_MESES_CALIENTES = int(os.environ.get('AUDITORIA_MESES_CALIENTES', 3))
+AUDITORIA_ARCHIVO_DIR = os.environ.get('AUDITORIA_ARCHIVO_DIR', str(BASE_DIR / 'archivo_auditoria'))
+
+# LOGS DE LA APLICACIÓN: avisos de 'clinical' y 'core' (p. ej. auditoría que no se pudo guardar,
+# réplica caída) a stderr
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'consola': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'clinical': {'handlers': ['consola'], 'level': os.environ.get('LOG_LEVEL', 'WARNING')},
+        'core': {'handlers': ['consola'], 'level': os.environ.get('LOG_LEVEL', 'WARNING')},
+    },
+}
+
+# MÉTRICAS (/api/metrics): en memoria por proceso, bajo costo; se pueden apagar
+METRICAS_ACTIVAS = os.environ.get('METRICAS_ACTIVAS', 'True') == 'True'
+
+# PDF DE ALTAS EN LOTE (/api/altas/pdf-lote/): procesos del pool (vacío = núcleos) y tope por pedido
+ALTAS_PDF_WORKERS = int(os.environ.get('ALTAS_PDF_WORKERS', 0)) or None
+ALTAS_PDF_LOTE_MAX = int(os.environ.get('ALTAS_PDF_LOTE_MAX', 500))
+
 # Configuración opcional de Simple JWT (para que los tokens duren un tiempo estimado)
 from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60), # La sesión dura 1 hora
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    # /api/token/refresh/ rechaza refresh emitidos antes de una revocación (bloqueo, cambio de rol)
+    'TOKEN_REFRESH_SERIALIZER': 'clinical.autenticacion.TokenRefreshConRevocacion',
 }
+# Cada cuántos segundos cada proceso relee la tabla de revocaciones (una consulta)
+JWT_REVOCACION_REFRESCO = int(os.environ.get('JWT_REVOCACION_REFRESCO', 5))
 
 # Configuración de CORS (Permitir conexión desde React)
 CORS_ALLOWED_ORIGINS = [
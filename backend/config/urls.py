@@ -3,6 +3,7 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenRefreshView
 from clinical.views import MyTokenObtainPairView 
+from core.views import metricas_prometheus
 
 
 urlpatterns = [
@@ -15,4 +16,7 @@ urlpatterns = [
     # Usamos TU vista que inyecta el ROL en el token
     path('api/token/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'), 
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+
+    # Métricas de rendimiento (Prometheus), solo staff
+    path('api/metrics', metricas_prometheus, name='metricas'),
 ]
\ No newline at end of file
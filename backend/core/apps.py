@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from .replica import revisar_cache_compartida
+        checks.register(revisar_cache_compartida, checks.Tags.caches)
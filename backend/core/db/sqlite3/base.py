@@ -0,0 +1,101 @@
+import threading
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+# Sentencias que necesitan el lock de escritura de SQLite
+ESCRITURAS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER', 'BEGIN')
+
+_colas = {}
+_colas_lock = threading.Lock()
+
+
+def cola_para(nombre):
+    """Un lock por archivo de BD, compartido por todas las conexiones (hilos) del proceso."""
+    with _colas_lock:
+        return _colas.setdefault(str(nombre), threading.Lock())
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Backend sqlite3 de Django con dos agregados, configurables en DATABASES['OPTIONS']:
+
+    - 'pragmas': dict aplicado en cada conexión nueva (ver pragmas.PRAGMAS_PRODUCCION).
+    - 'cola_escritura': serializa las escrituras del proceso en una cola (lock) propia, así los
+      hilos esperan su turno en Python en vez de chocar contra el lock de SQLite y reintentar.
+      Las lecturas fuera de transacción no pasan por la cola y siguen siendo concurrentes (WAL).
+      Un turno se toma con la primera escritura o el BEGIN de un atomic() y se suelta al
+      terminar la sentencia (autocommit) o en el commit/rollback. Entre procesos distintos
+      sigue mandando busy_timeout.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pragmas = {}
+        self.cola = None
+        self.cola_espera = 30
+        self.con_turno = False
+        self.execute_wrappers.append(self._turno_de_escritura)
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = kwargs.pop('pragmas', None) or {}
+        cola_escritura = kwargs.pop('cola_escritura', False)
+        self.cola_espera = kwargs.pop('cola_espera', 30)
+        self.cola = cola_para(self.settings_dict['NAME']) if cola_escritura else None
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conexion = super().get_new_connection(conn_params)
+        for nombre, valor in self.pragmas.items():
+            conexion.execute(f"PRAGMA {nombre} = {valor}")
+        return conexion
+
+    # --- COLA DE ESCRITURA ---
+    def _turno_de_escritura(self, execute, sql, params, many, context):
+        if self.cola is None or self.con_turno or not sql.lstrip()[:7].upper().startswith(ESCRITURAS):
+            return execute(sql, params, many, context)
+
+        self._tomar_turno()
+        es_begin = sql.lstrip()[:5].upper() == 'BEGIN'
+        try:
+            resultado = execute(sql, params, many, context)
+        except Exception:
+            # Un BEGIN fallido (p. ej. otro proceso con el lock más allá de busy_timeout) no abre
+            # transacción, así que no habrá commit/rollback que suelte el turno: se suelta aquí
+            if es_begin or (self.autocommit and not self.in_atomic_block):
+                self._soltar_turno()
+            raise
+        # El BEGIN de atomic() se ejecuta todavía en autocommit: el turno dura hasta el commit
+        if not es_begin and self.autocommit and not self.in_atomic_block:
+            self._soltar_turno()
+        return resultado
+
+    def _tomar_turno(self):
+        if not self.cola.acquire(timeout=self.cola_espera):
+            raise OperationalError(
+                f"database is locked (sin turno en la cola de escritura tras {self.cola_espera}s)"
+            )
+        self.con_turno = True
+
+    def _soltar_turno(self):
+        if self.con_turno:
+            self.con_turno = False
+            self.cola.release()
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self._soltar_turno()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self._soltar_turno()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self._soltar_turno()
@@ -0,0 +1,12 @@
+# Sin dependencias de Django: config/settings.py lo importa mientras se cargan los settings.
+
+# Valores de producción: WAL deja leer mientras otro escribe; NORMAL solo sincroniza al hacer
+# checkpoint (en WAL no se pierde consistencia, a lo más la última transacción si se corta la luz)
+PRAGMAS_PRODUCCION = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -20000,         # Negativo = KiB (~20 MB por conexión)
+    'busy_timeout': 5000,         # ms esperando el lock de escritura antes de "database is locked"
+    'temp_store': 'MEMORY',
+}
@@ -1,62 +1,305 @@
 import os
 import base64
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
 from django.conf import settings
+from core.metricas import metricas
+
+
+class DecryptCache:
+    """
+    Caché LRU en memoria de textos descifrados, indexada por el token cifrado.
+    Acotada por cantidad de entradas, por bytes y por TTL (segundos).
+    Ojo: mantiene datos sensibles (PHI) en RAM mientras vivan las entradas.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=8 * 1024 * 1024, ttl=300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._datos = OrderedDict()  # token -> (texto, expira_en, tamaño)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _tamano(token, texto):
+        return len(token) + len(texto.encode('utf-8'))
+
+    def get(self, token):
+        with self._lock:
+            entrada = self._datos.get(token)
+            if entrada is None:
+                self.misses += 1
+                return None
+            texto, expira_en, tamano = entrada
+            if expira_en < time.monotonic():
+                # Vencida: se elimina y cuenta como fallo
+                del self._datos[token]
+                self._bytes -= tamano
+                self.misses += 1
+                return None
+            self._datos.move_to_end(token)
+            self.hits += 1
+            return texto
+
+    def set(self, token, texto):
+        tamano = self._tamano(token, texto)
+        if tamano > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._datos.pop(token, None)
+            if anterior is not None:
+                self._bytes -= anterior[2]
+            self._datos[token] = (texto, time.monotonic() + self.ttl, tamano)
+            self._bytes += tamano
+            # Expulsar las menos usadas hasta volver a los límites
+            while len(self._datos) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, tamano_viejo) = self._datos.popitem(last=False)
+                self._bytes -= tamano_viejo
+
+    def purge(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._datos),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
 
 class CryptoManager:
     """
     Clase encargada de manejar el cifrado y descifrado usando ChaCha20-Poly1305.
+    Los tokens llevan el id de la llave como prefijo ("<id>:<base64>") para poder
+    rotar llaves; los tokens antiguos sin prefijo usan ENCRYPTION_LEGACY_KEY_ID.
     """
-    
+    SEPARADOR = ':'
+
     def __init__(self):
-        # La llave debe ser de 32 bytes para ChaCha20.
+        # Llavero: id -> llave base64. Si no hay llavero, ENCRYPTION_KEY es la llave "1".
         key_b64 = getattr(settings, 'ENCRYPTION_KEY', None)
-        if not key_b64:
+        llavero = getattr(settings, 'ENCRYPTION_KEYS', None) or ({'1': key_b64} if key_b64 else {})
+        if not llavero:
             raise ValueError("La llave de encriptación no está configurada en settings.")
-        
+
+        self.key_id = str(getattr(settings, 'ENCRYPTION_KEY_ID', '1'))
+        self.legacy_key_id = str(getattr(settings, 'ENCRYPTION_LEGACY_KEY_ID', self.key_id))
+
         try:
-            self.key = base64.urlsafe_b64decode(key_b64)
-            self.aead = ChaCha20Poly1305(self.key)
+            # La llave debe ser de 32 bytes para ChaCha20.
+            self.aeads = {}
+            for kid, llave in llavero.items():
+                kid = str(kid)
+                if self.SEPARADOR in kid:
+                    raise ValueError(f"El id de llave '{kid}' no puede contener '{self.SEPARADOR}'")
+                self.aeads[kid] = ChaCha20Poly1305(base64.urlsafe_b64decode(llave))
+            self.aead = self.aeads[self.key_id]
+        except KeyError:
+            raise ValueError(f"La llave principal '{self.key_id}' no está en ENCRYPTION_KEYS.")
         except Exception as e:
             raise ValueError(f"Error al inicializar criptografía: {e}")
 
+        # Lotes: tamaño de trozo por hilo y cantidad de hilos (None = núcleos disponibles)
+        self.batch_chunk_size = getattr(settings, 'ENCRYPTION_BATCH_CHUNK_SIZE', 256)
+        self.batch_max_workers = getattr(settings, 'ENCRYPTION_BATCH_MAX_WORKERS', None) or os.cpu_count() or 1
+        self._pools = {}
+        self._pool_lock = threading.Lock()
+
+        # Caché de descifrado: apagada por defecto (mantiene PHI en memoria)
+        self.cache = None
+        if getattr(settings, 'ENCRYPTION_CACHE_ENABLED', False):
+            self.cache = DecryptCache(
+                max_entries=getattr(settings, 'ENCRYPTION_CACHE_MAX_ENTRIES', 10000),
+                max_bytes=getattr(settings, 'ENCRYPTION_CACHE_MAX_BYTES', 8 * 1024 * 1024),
+                ttl=getattr(settings, 'ENCRYPTION_CACHE_TTL', 300),
+            )
+
     def encrypt(self, plaintext: str) -> str:
+        token = self._encrypt_uno(plaintext)
+        if token is not None:
+            metricas.registrar_cifrado('encrypt')
+        return token
+
+    def _encrypt_uno(self, plaintext: str) -> str:
         if not plaintext:
             return None
-        
+
+        combined = self._cifrar(plaintext)
+
+        # Retornar como "<id llave>:<base64>" para guardar en BD
+        return f"{self.key_id}{self.SEPARADOR}{base64.urlsafe_b64encode(combined).decode('utf-8')}"
+
+    def encrypt_bytes(self, plaintext) -> bytes:
+        """
+        Formato binario compacto: [largo id][id llave][nonce][ciphertext], sin base64.
+        Acepta texto o bytes (archivos); los bytes se leen de vuelta con decrypt_a_bytes.
+        """
+        if not plaintext:
+            return None
+        kid = self.key_id.encode('utf-8')
+        metricas.registrar_cifrado('encrypt')
+        return bytes([len(kid)]) + kid + self._cifrar(plaintext)
+
+    def _cifrar(self, plaintext) -> bytes:
         # Convertir texto a bytes
-        data = plaintext.encode('utf-8')
+        data = plaintext.encode('utf-8') if isinstance(plaintext, str) else bytes(plaintext)
         
         # Generar Nonce aleatorio de 12 bytes (VITAL para la seguridad)
         nonce = os.urandom(12)
         
-        # Cifrar
-        ciphertext = self.aead.encrypt(nonce, data, None)
-        
-        # Guardar nonce + ciphertext juntos
-        combined = nonce + ciphertext
-        
-        # Retornar como string base64 para guardar en BD
-        return base64.urlsafe_b64encode(combined).decode('utf-8')
+        # Cifrar y guardar nonce + ciphertext juntos
+        return nonce + self.aead.encrypt(nonce, data, None)
+
+    # --- FORMATOS (texto base64 <-> binario) ---
+    def _separar(self, token):
+        """(id llave, nonce + ciphertext) para un token de texto o binario."""
+        if isinstance(token, (bytes, bytearray, memoryview)):
+            token = bytes(token)
+            largo = token[0]
+            return token[1:1 + largo].decode('utf-8'), token[1 + largo:]
+        kid, separador, cuerpo = token.partition(self.SEPARADOR)
+        if not separador:
+            kid, cuerpo = self.legacy_key_id, token
+        return kid, base64.urlsafe_b64decode(cuerpo)
+
+    def token_a_binario(self, token: str) -> bytes:
+        """Convierte un token de texto al formato binario sin descifrarlo."""
+        if not token:
+            return None
+        kid, combined = self._separar(token)
+        kid = kid.encode('utf-8')
+        return bytes([len(kid)]) + kid + combined
+
+    def binario_a_token(self, binario) -> str:
+        """Inverso de token_a_binario: vuelve al texto "<id llave>:<base64>" sin descifrar."""
+        if not binario:
+            return None
+        kid, combined = self._separar(binario)
+        return f"{kid}{self.SEPARADOR}{base64.urlsafe_b64encode(combined).decode('utf-8')}"
 
-    def decrypt(self, token: str) -> str:
+    def key_id_de(self, token) -> str:
+        """Id de la llave con que se cifró el token (el base64 nunca contiene ':')."""
+        if isinstance(token, (bytes, bytearray, memoryview)):
+            return self._separar(token)[0]
+        kid, separador, _ = token.partition(self.SEPARADOR)
+        return kid if separador else self.legacy_key_id
+
+    def necesita_rotacion(self, token) -> bool:
+        return bool(token) and self.key_id_de(token) != self.key_id
+
+    def decrypt(self, token) -> str:
         if not token:
             return None
-            
+        plaintext = self._decrypt_uno(token)
+        metricas.registrar_cifrado('decrypt', errores=int(plaintext == "ERROR_DECRYPT"))
+        return plaintext
+
+    def _decrypt_uno(self, token) -> str:
+        if not token:
+            return None
+        if isinstance(token, (bytearray, memoryview)):
+            token = bytes(token)  # Hashable para la caché
+
+        if self.cache is not None:
+            cacheado = self.cache.get(token)
+            if cacheado is not None:
+                return cacheado
+
+        plaintext = self._decrypt_token(token)
+        # Los errores no se guardan: un token ilegible no debe quedar "pegado"
+        if self.cache is not None and plaintext != "ERROR_DECRYPT":
+            self.cache.set(token, plaintext)
+        return plaintext
+
+    def _decrypt_token(self, token: str) -> str:
         try:
-            # Decodificar base64 a bytes
-            combined = base64.urlsafe_b64decode(token)
-            
-            # Separar nonce (primeros 12 bytes) y ciphertext
-            nonce = combined[:12]
-            ciphertext = combined[12:]
-            
-            # Descifrar
-            plaintext = self.aead.decrypt(nonce, ciphertext, None)
-            return plaintext.decode('utf-8')
+            return self._descifrar(token).decode('utf-8')
         except Exception:
             # En producción loguearíamos el error, aquí retornamos un indicador
             return "ERROR_DECRYPT"
 
+    def _descifrar(self, token) -> bytes:
+        # Elegir la llave según el prefijo y pasar a bytes (texto base64 o binario)
+        kid, combined = self._separar(token)
+        aead = self.aeads[kid]
+
+        # Separar nonce (primeros 12 bytes) y ciphertext
+        nonce = combined[:12]
+        ciphertext = combined[12:]
+
+        # Descifrar
+        return aead.decrypt(nonce, ciphertext, None)
+
+    def decrypt_a_bytes(self, token) -> bytes:
+        """Contraparte de encrypt_bytes para archivos: devuelve bytes, sin caché. None si no se puede."""
+        if not token:
+            return None
+        try:
+            data = self._descifrar(token)
+        except Exception:
+            metricas.registrar_cifrado('decrypt', errores=1)
+            return None
+        metricas.registrar_cifrado('decrypt')
+        return data
+
+    # --- CACHÉ ---
+    def purge_cache(self):
+        if self.cache is not None:
+            self.cache.purge()
+
+    def cache_stats(self):
+        if self.cache is None:
+            return {'enabled': False}
+        return {'enabled': True, **self.cache.stats()}
+
+    # --- OPERACIONES EN LOTE ---
+    # ChaCha20-Poly1305 de cryptography libera el GIL, así que repartir los trozos
+    # entre hilos escala con los núcleos en vez de con la cantidad de filas.
+    # Las métricas se registran una vez por lote, en el hilo que llama (el del request).
+    def encrypt_many(self, plaintexts, chunk_size=None, max_workers=None) -> list:
+        tokens = self._map_en_lote(self._encrypt_uno, plaintexts, chunk_size, max_workers)
+        metricas.registrar_cifrado('encrypt', sum(1 for t in tokens if t is not None))
+        return tokens
+
+    def decrypt_many(self, tokens, chunk_size=None, max_workers=None) -> list:
+        textos = self._map_en_lote(self._decrypt_uno, tokens, chunk_size, max_workers)
+        metricas.registrar_cifrado(
+            'decrypt', sum(1 for t in textos if t is not None), errores=textos.count("ERROR_DECRYPT")
+        )
+        return textos
+
+    def _map_en_lote(self, funcion, valores, chunk_size, max_workers):
+        valores = list(valores)
+        chunk_size = max(1, chunk_size or self.batch_chunk_size)
+        max_workers = max_workers or self.batch_max_workers
+
+        # Lotes pequeños: el costo del pool supera la ganancia
+        if len(valores) <= chunk_size or max_workers <= 1:
+            return [funcion(v) for v in valores]
+
+        trozos = [valores[i:i + chunk_size] for i in range(0, len(valores), chunk_size)]
+        pool = self._get_pool(max_workers)
+        resultados = []
+        for parcial in pool.map(lambda trozo: [funcion(v) for v in trozo], trozos):
+            resultados.extend(parcial)
+        return resultados
+
+    def _get_pool(self, max_workers):
+        # Un pool por tamaño, creado una vez y reutilizado entre requests
+        with self._pool_lock:
+            if max_workers not in self._pools:
+                self._pools[max_workers] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='crypto')
+            return self._pools[max_workers]
+
 # Instancia global
 crypto_manager = CryptoManager()
\ No newline at end of file
@@ -1,34 +1,175 @@
+from django import forms
 from django.db import models
+from django.db.models.query_utils import DeferredAttribute
 from .encryption import crypto_manager
 
-class EncryptedTextField(models.TextField):
+
+class TokenCifrado(str):
+    """
+    Valor tal como viene de la BD (base64 de nonce + ciphertext), todavía sin descifrar.
+    Es un str normal, así que .values()/.values_list() siguen devolviendo el texto cifrado.
+    """
+    __slots__ = ()
+
+
+class BytesCifrados(bytes):
+    """Igual que TokenCifrado, para columnas binarias ([id llave][nonce][ciphertext])."""
+    __slots__ = ()
+
+
+PENDIENTES = (TokenCifrado, BytesCifrados)
+
+
+class DescifradoPerezoso(DeferredAttribute):
+    """
+    Descriptor de los campos cifrados: al cargar la fila guarda el token cifrado
+    y recién lo descifra la primera vez que se lee el atributo. Los querysets que
+    nunca tocan el dato (conteos, joins, listados de Partos) no pagan criptografía.
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        attname = self.field.attname
+        if attname not in instance.__dict__:
+            # Campo diferido (.only()/.defer()): lo carga DeferredAttribute
+            super().__get__(instance, cls)
+
+        valor = instance.__dict__[attname]
+        if isinstance(valor, PENDIENTES):
+            texto = crypto_manager.decrypt(valor)
+            instance.__dict__[attname] = texto
+            # Guardamos el token original para no re-cifrar si el valor no cambia
+            instance.__dict__[self.field.clave_original] = (valor, texto)
+            return texto
+        return valor
+
+    # Con __set__ el descriptor es "de datos" y __get__ se llama siempre
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CampoCifradoMixin:
+    """Lógica común de EncryptedTextField y EncryptedBinaryField."""
+    descriptor_class = DescifradoPerezoso
+
+    @property
+    def clave_original(self):
+        return f'_{self.attname}_cifrado_original'
+
+    # Al convertir a formato Python (ej. serializadores) -> Dejar tal cual
+    def to_python(self, value):
+        return value
+
+    # Antes de guardar -> Reutilizar el token si el dato nunca se leyó o no cambió
+    def pre_save(self, model_instance, add):
+        # Leemos __dict__ directo: pasar por el descriptor descifraría sin necesidad
+        valor = model_instance.__dict__.get(self.attname)
+        if isinstance(valor, PENDIENTES):
+            return valor
+        original = model_instance.__dict__.get(self.clave_original)
+        if original is not None and original[1] == valor:
+            return original[0]
+        return valor
+
+    # dumpdata exporta el texto legible (loaddata lo vuelve a cifrar)
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+
+class EncryptedTextField(CampoCifradoMixin, models.TextField):
     """
     Un campo de texto que se cifra automáticamente antes de guardarse en la BD
-    y se descifra automáticamente al leerse.
+    y se descifra de forma perezosa al leer el atributo (no en from_db_value).
     """
     description = "Text field encrypted with ChaCha20-Poly1305"
 
+    # Al leer de la base de datos -> Marcar como pendiente (sin descifrar)
+    def from_db_value(self, value, expression, connection):
+        if not value:
+            return value
+        return TokenCifrado(value)
+
+    # Al guardar en la base de datos -> Cifrar
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if isinstance(value, TokenCifrado):
+            return str(value)
+        if not value:
+            # Vacío no es dato sensible: se guarda tal cual
+            return value
+        # Ciframos el dato usando nuestra clase de encryption.py
+        return crypto_manager.encrypt(str(value))
+
+
+class EncryptedBinaryField(CampoCifradoMixin, models.BinaryField):
+    """
+    Variante compacta: guarda nonce + ciphertext como bytes crudos (sin base64),
+    ~25% menos espacio en tabla e índices. Para la API se comporta como texto.
+    """
+    description = "Binary field encrypted with ChaCha20-Poly1305"
+
     def __init__(self, *args, **kwargs):
+        # BinaryField no es editable por defecto; este campo sí (formularios, serializers)
+        kwargs.setdefault('editable', True)
         super().__init__(*args, **kwargs)
 
-    # 1. Al leer de la base de datos -> Descifrar
     def from_db_value(self, value, expression, connection):
         if value is None:
             return value
-        return crypto_manager.decrypt(value)
+        value = bytes(value)  # PostgreSQL entrega memoryview
+        if not value:
+            return ''
+        return BytesCifrados(value)
 
-    # 2. Al convertir a formato Python (ej. serializadores) -> Descifrar
-    def to_python(self, value):
-        if value is None:
-            return value
-        # Si ya es un string legible (no parece base64 o ya fue descifrado), retornarlo
-        # Esta es una validación simple, en prod sería más robusta.
-        return value
-
-    # 3. Al guardar en la base de datos -> Cifrar
     def get_prep_value(self, value):
-        value = super().get_prep_value(value)
+        if isinstance(value, BytesCifrados):
+            return bytes(value)
         if value is None:
             return value
-        # Ciframos el dato usando nuestra clase de encryption.py
-        return crypto_manager.encrypt(str(value))
\ No newline at end of file
+        if value == '':
+            return b''
+        return crypto_manager.encrypt_bytes(str(value))
+
+    def get_default(self):
+        # El default de BinaryField es b''; aquí el valor "vacío" es texto
+        default = super().get_default()
+        return '' if default == b'' else default
+
+    def formfield(self, **kwargs):
+        # En el admin se edita como texto (models.Field.formfield, saltando BinaryField)
+        return models.Field.formfield(self, **{
+            'form_class': forms.CharField,
+            'max_length': self.max_length,
+            **kwargs,
+        })
+
+
+def descifrar_en_lote(instancias, campos=None):
+    """
+    Descifra con una sola llamada a crypto_manager.decrypt_many los campos cifrados
+    pendientes de varias instancias (ej: toda una página de un listado).
+    `campos` limita qué campos descifrar; por defecto todos los cifrados del modelo.
+    """
+    pendientes = []  # (instancia, campo, token)
+    for instancia in instancias:
+        if instancia is None:
+            continue
+        for campo in instancia._meta.concrete_fields:
+            if not isinstance(campo, CampoCifradoMixin):
+                continue
+            if campos is not None and campo.name not in campos:
+                continue
+            valor = instancia.__dict__.get(campo.attname)
+            if isinstance(valor, PENDIENTES):
+                pendientes.append((instancia, campo, valor))
+
+    if not pendientes:
+        return
+
+    tokens = list(dict.fromkeys(token for _, _, token in pendientes))
+    descifrados = dict(zip(tokens, crypto_manager.decrypt_many(tokens)))
+    for instancia, campo, token in pendientes:
+        texto = descifrados[token]
+        instancia.__dict__[campo.attname] = texto
+        instancia.__dict__[campo.clave_original] = (token, texto)
@@ -0,0 +1,78 @@
+import hmac
+import base64
+import hashlib
+import unicodedata
+from django.conf import settings
+
+
+def normalizar_rut(rut: str) -> str:
+    """
+    Limpia un RUT para compararlo: sin puntos, sin guion, sin espacios y en mayúsculas.
+    '12.345.678-k' -> '12345678K'
+    """
+    if not rut:
+        return ''
+    return rut.replace('.', '').replace('-', '').replace(' ', '').strip().upper()
+
+
+def normalizar_nombre(nombre: str) -> str:
+    """
+    Minúsculas, sin tildes y solo letras/números separados por un espacio.
+    'María  José Pérez-Soto' -> 'maria jose perez soto'
+    """
+    if not nombre:
+        return ''
+    sin_tildes = unicodedata.normalize('NFKD', nombre)
+    sin_tildes = ''.join(c for c in sin_tildes if not unicodedata.combining(c))
+    limpio = ''.join(c if c.isalnum() else ' ' for c in sin_tildes.lower())
+    return ' '.join(limpio.split())
+
+
+def trigramas_nombre(nombre: str) -> set:
+    """
+    Trigramas de cada palabra, anclados al inicio con un espacio (' pe', 'per', 'ere', 'rez').
+    Así 'pér' encuentra 'Pérez' (búsqueda por prefijo de palabra). Palabras de 1 letra no aportan.
+    """
+    trigramas = set()
+    for palabra in normalizar_nombre(nombre).split():
+        palabra = f" {palabra}"
+        for i in range(len(palabra) - 2):
+            trigramas.add(palabra[i:i + 3])
+    return trigramas
+
+
+class BlindIndexer:
+    """
+    Genera índices ciegos (HMAC-SHA256 con llave propia) para buscar datos cifrados
+    con una igualdad en SQL sin tener que desencriptar fila por fila.
+    """
+
+    def __init__(self):
+        # Llave distinta a ENCRYPTION_KEY: si se filtra el índice no compromete el cifrado.
+        key_b64 = getattr(settings, 'BLIND_INDEX_KEY', None)
+        if not key_b64:
+            raise ValueError("La llave de índice ciego no está configurada en settings.")
+
+        try:
+            self.key = base64.urlsafe_b64decode(key_b64)
+        except Exception as e:
+            raise ValueError(f"Error al inicializar índice ciego: {e}")
+
+    def digest(self, valor: str, contexto: str = '') -> str:
+        # El contexto separa dominios (rut, nombre...) para que un mismo texto
+        # no produzca el mismo token en dos índices distintos.
+        mensaje = f"{contexto}:{valor}".encode('utf-8')
+        return hmac.new(self.key, mensaje, hashlib.sha256).hexdigest()
+
+    def rut(self, rut: str) -> str:
+        limpio = normalizar_rut(rut)
+        if not limpio:
+            return None
+        return self.digest(limpio, 'rut')
+
+    def tokens_nombre(self, nombre: str) -> set:
+        # 32 hex (128 bits) bastan para distinguir trigramas y achican la tabla
+        return {self.digest(t, 'nombre')[:32] for t in trigramas_nombre(nombre)}
+
+# Instancia global
+blind_indexer = BlindIndexer()
@@ -0,0 +1,116 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from core.encryption import crypto_manager
+
+CAMPOS = ['rut', 'nombre_completo', 'direccion', 'telefono', 'email']
+TAMANO_LOTE = 1000
+
+# Tipo de columna por formato y motor (mismo tipo que usan EncryptedTextField / EncryptedBinaryField)
+TIPOS = {
+    'sqlite': {'texto': 'TEXT', 'binario': 'BLOB'},
+    'postgresql': {'texto': 'TEXT', 'binario': 'BYTEA'},
+}
+
+
+class Command(BaseCommand):
+    help = ("Compara el formato de texto (base64) contra el binario (bytes crudos) de los "
+            "campos cifrados: velocidad de cifrado/descifrado y espacio real en tabla e índices, "
+            "llenando una tabla temporal por formato sobre datos sintéticos.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=100000,
+                            help="Filas sintéticas (cada una con 5 campos como Madre).")
+        parser.add_argument('--database', default='default',
+                            help="BD donde se crean las tablas temporales (sqlite o postgresql).")
+
+    def handle(self, *args, **options):
+        filas = options['filas']
+        conexion = connections[options['database']]
+        if conexion.vendor not in TIPOS:
+            raise CommandError(f"Motor no soportado para medir tamaños: {conexion.vendor}")
+
+        valores = []
+        for i in range(filas):
+            valores.append([
+                f"{10000000 + i}-{i % 10}",
+                f"Paciente Sintética Número {i}",
+                f"Avenida Siempre Viva {i}, Depto {i % 300}",
+                f"+569{i:08d}",
+                f"paciente{i}@example.com",
+            ])
+        planos = [v for fila in valores for v in fila]
+
+        self.stdout.write(f"Filas: {filas} | Valores cifrados: {len(planos)} | BD: {conexion.vendor}")
+
+        texto, t_cifrar_texto = self._medir(lambda: [crypto_manager.encrypt(v) for v in planos])
+        binario, t_cifrar_binario = self._medir(lambda: [crypto_manager.encrypt_bytes(v) for v in planos])
+        _, t_descifrar_texto = self._medir(lambda: [crypto_manager._decrypt_token(t) for t in texto])
+        _, t_descifrar_binario = self._medir(lambda: [crypto_manager._decrypt_token(b) for b in binario])
+
+        tamanos = {}
+        for formato, tokens in (('texto', texto), ('binario', binario)):
+            tamanos[formato] = self._llenar_y_medir(conexion, formato, tokens)
+
+        self.stdout.write("")
+        self.stdout.write(f"{'':<22}{'Texto base64':>16}{'Binario':>16}{'Diferencia':>14}")
+        self._fila("Bytes por valor", sum(len(t.encode('utf-8')) for t in texto) / len(planos),
+                   sum(len(b) for b in binario) / len(planos), "{:.1f}")
+        if tamanos['texto'] is None:
+            self.stdout.write("Tamaño en BD: no disponible (SQLite sin la tabla virtual dbstat)")
+        else:
+            for i, nombre in enumerate(("Tabla (MB)", "Índices (MB)", "Total (MB)")):
+                self._fila(nombre, tamanos['texto'][i] / 1e6, tamanos['binario'][i] / 1e6, "{:.2f}")
+        self._fila("Cifrar (valores/s)", len(planos) / t_cifrar_texto, len(planos) / t_cifrar_binario, "{:,.0f}")
+        self._fila("Descifrar (valores/s)", len(planos) / t_descifrar_texto, len(planos) / t_descifrar_binario, "{:,.0f}")
+
+    def _llenar_y_medir(self, conexion, formato, tokens):
+        """Tabla temporal con las columnas de Madre y su índice único por rut: (tabla, índices, total) en bytes."""
+        tabla = f"bench_cifrado_{formato}"
+        tipo = TIPOS[conexion.vendor][formato]
+        columnas = ', '.join(f"{campo} {tipo}" for campo in CAMPOS)
+        with conexion.cursor() as cursor:
+            cursor.execute(f"CREATE TEMPORARY TABLE {tabla} (id INTEGER PRIMARY KEY, {columnas})")
+            try:
+                cursor.execute(f"CREATE UNIQUE INDEX {tabla}_rut ON {tabla} (rut)")
+                marcas = ', '.join(['%s'] * (len(CAMPOS) + 1))
+                sentencia = f"INSERT INTO {tabla} (id, {', '.join(CAMPOS)}) VALUES ({marcas})"
+                filas = [[i + 1, *tokens[i * len(CAMPOS):(i + 1) * len(CAMPOS)]]
+                         for i in range(len(tokens) // len(CAMPOS))]
+                for inicio in range(0, len(filas), TAMANO_LOTE):
+                    with transaction.atomic(using=conexion.alias):
+                        cursor.executemany(sentencia, filas[inicio:inicio + TAMANO_LOTE])
+                return self._tamanos(cursor, conexion.vendor, tabla)
+            finally:
+                cursor.execute(f"DROP TABLE {tabla}")
+
+    def _tamanos(self, cursor, vendor, tabla):
+        if vendor == 'postgresql':
+            cursor.execute(
+                "SELECT pg_table_size(%s::regclass), pg_indexes_size(%s::regclass), "
+                "pg_total_relation_size(%s::regclass)", [tabla] * 3
+            )
+            return cursor.fetchone()
+        # dbstat es opcional al compilar SQLite; las tablas temporales viven en el esquema 'temp'
+        try:
+            cursor.execute(
+                "SELECT name, SUM(pgsize) FROM dbstat('temp') WHERE name IN (%s, %s) GROUP BY name",
+                [tabla, f"{tabla}_rut"],
+            )
+        except OperationalError:
+            return None
+        por_objeto = dict(cursor.fetchall())
+        datos = por_objeto.pop(tabla, 0)
+        indices = sum(por_objeto.values())
+        return datos, indices, datos + indices
+
+    def _medir(self, funcion):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        return resultado, time.perf_counter() - inicio
+
+    def _fila(self, nombre, texto, binario, formato):
+        diferencia = (binario - texto) / texto * 100
+        self.stdout.write(
+            f"{nombre:<22}{formato.format(texto):>16}{formato.format(binario):>16}{diferencia:>+13.1f}%"
+        )
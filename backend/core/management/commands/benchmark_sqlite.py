@@ -0,0 +1,168 @@
+import random
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from core.db.sqlite3.pragmas import PRAGMAS_PRODUCCION
+
+CONFIGURACIONES = [
+    ('Django por defecto', 'django.db.backends.sqlite3', {}),
+    ('WAL + pragmas', 'core.db.sqlite3', {'transaction_mode': 'IMMEDIATE', 'pragmas': PRAGMAS_PRODUCCION}),
+    ('WAL + pragmas + cola', 'core.db.sqlite3',
+     {'transaction_mode': 'IMMEDIATE', 'pragmas': PRAGMAS_PRODUCCION, 'cola_escritura': True}),
+]
+
+ESQUEMA = [
+    "CREATE TABLE bench_parto (id INTEGER PRIMARY KEY, madre INTEGER, estado TEXT, actualizado REAL)",
+    "CREATE TABLE bench_log (id INTEGER PRIMARY KEY AUTOINCREMENT, usuario INTEGER, accion TEXT, "
+    "modelo TEXT, objeto_id INTEGER, detalles TEXT, fecha REAL)",
+    "CREATE INDEX bench_log_usuario ON bench_log (usuario, fecha)",
+]
+
+
+def registrar_alias(alias, nombre, engine, opciones):
+    """Da de alta una BD temporal en connections (mismo esquema de settings que 'default')."""
+    config = dict(connections.settings['default'])
+    config.update(ENGINE=engine, NAME=str(nombre), OPTIONS=dict(opciones), CONN_MAX_AGE=0)
+    connections.settings[alias] = config
+
+
+def quitar_alias(alias):
+    connections.settings.pop(alias, None)
+    try:
+        del connections[alias]  # Si no, el mismo alias vuelve con la conexión (y NAME) anterior
+    except AttributeError:
+        pass
+
+
+class Command(BaseCommand):
+    help = ("Compara el throughput de SQLite con varios hilos mezclando lecturas, logs de auditoría "
+            "y transacciones clínicas: Django por defecto vs WAL + pragmas vs WAL + cola de escritura.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8)
+        parser.add_argument('--segundos', type=float, default=5.0, help="Duración de cada configuración.")
+        parser.add_argument('--escrituras', type=float, default=0.3,
+                            help="Fracción de operaciones que escriben (0-1).")
+        parser.add_argument('--filas', type=int, default=2000, help="Partos sintéticos precargados.")
+
+    def handle(self, *args, **options):
+        directorio = Path(tempfile.mkdtemp(prefix='benchmark_sqlite_'))
+        self.resultados = []
+        try:
+            self.stdout.write(
+                f"Hilos: {options['hilos']} | Segundos por configuración: {options['segundos']} | "
+                f"Escrituras: {options['escrituras']:.0%}"
+            )
+            for i, (nombre, engine, opciones) in enumerate(CONFIGURACIONES):
+                alias = f'benchmark_sqlite_{i}'
+                registrar_alias(alias, directorio / f'{i}.sqlite3', engine, opciones)
+                try:
+                    self._preparar(alias, options['filas'])
+                    self.resultados.append((nombre, self._correr(alias, options)))
+                finally:
+                    connections[alias].close()
+                    quitar_alias(alias)
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+        self.stdout.write("")
+        self.stdout.write(f"{'':<24}{'Ops/s':>10}{'Lecturas/s':>12}{'Escrit./s':>12}{'Bloqueos':>10}{'p95 escr. ms':>14}")
+        for nombre, r in self.resultados:
+            self.stdout.write(
+                f"{nombre:<24}{r['ops_s']:>10,.0f}{r['lecturas_s']:>12,.0f}{r['escrituras_s']:>12,.0f}"
+                f"{r['bloqueos']:>10}{r['p95_escritura_ms']:>14.1f}"
+            )
+
+    def _preparar(self, alias, filas):
+        with connections[alias].cursor() as cursor:
+            for sentencia in ESQUEMA:
+                cursor.execute(sentencia)
+            with transaction.atomic(using=alias):
+                cursor.executemany(
+                    "INSERT INTO bench_parto (id, madre, estado, actualizado) VALUES (%s, %s, %s, %s)",
+                    [(i, i, 'registrado', time.time()) for i in range(1, filas + 1)],
+                )
+        self.filas = filas
+
+    def _correr(self, alias, options):
+        fin = time.perf_counter() + options['segundos']
+        totales = {'lecturas': 0, 'escrituras': 0, 'bloqueos': 0, 'latencias': []}
+        lock = threading.Lock()
+
+        def trabajador(semilla):
+            azar = random.Random(semilla)
+            propios = {'lecturas': 0, 'escrituras': 0, 'bloqueos': 0, 'latencias': []}
+            conexion = connections[alias]
+            try:
+                while time.perf_counter() < fin:
+                    inicio = time.perf_counter()
+                    try:
+                        if azar.random() < options['escrituras']:
+                            self._escribir(conexion, alias, azar)
+                            propios['escrituras'] += 1
+                            propios['latencias'].append(time.perf_counter() - inicio)
+                        else:
+                            self._leer(conexion, azar)
+                            propios['lecturas'] += 1
+                    except OperationalError:
+                        propios['bloqueos'] += 1
+            finally:
+                conexion.close()
+                with lock:
+                    for clave in ('lecturas', 'escrituras', 'bloqueos'):
+                        totales[clave] += propios[clave]
+                    totales['latencias'] += propios['latencias']
+
+        hilos = [threading.Thread(target=trabajador, args=(n,)) for n in range(options['hilos'])]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        latencias = sorted(totales['latencias'])
+        p95 = latencias[int(len(latencias) * 0.95)] * 1000 if latencias else 0.0
+        return {
+            'ops_s': (totales['lecturas'] + totales['escrituras']) / duracion,
+            'lecturas_s': totales['lecturas'] / duracion,
+            'escrituras_s': totales['escrituras'] / duracion,
+            'bloqueos': totales['bloqueos'],
+            'p95_escritura_ms': p95,
+        }
+
+    def _escribir(self, conexion, alias, azar):
+        parto = azar.randint(1, self.filas)
+        if azar.random() < 0.5:
+            # Log suelto, como registrar_log en modo síncrono (autocommit)
+            with conexion.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO bench_log (usuario, accion, modelo, objeto_id, detalles, fecha) "
+                    "VALUES (%s, 'VIEW', 'Parto', %s, '', %s)",
+                    [azar.randint(1, 50), parto, time.time()],
+                )
+            return
+        # Escritura clínica: lee, actualiza y deja su log en la misma transacción
+        with transaction.atomic(using=alias), conexion.cursor() as cursor:
+            cursor.execute("SELECT estado FROM bench_parto WHERE id = %s", [parto])
+            cursor.fetchone()
+            cursor.execute("UPDATE bench_parto SET estado = %s, actualizado = %s WHERE id = %s",
+                           ['actualizado', time.time(), parto])
+            cursor.execute(
+                "INSERT INTO bench_log (usuario, accion, modelo, objeto_id, detalles, fecha) "
+                "VALUES (%s, 'UPDATE', 'Parto', %s, 'estado', %s)",
+                [azar.randint(1, 50), parto, time.time()],
+            )
+
+    def _leer(self, conexion, azar):
+        with conexion.cursor() as cursor:
+            cursor.execute("SELECT id, estado, actualizado FROM bench_parto WHERE id = %s",
+                           [azar.randint(1, self.filas)])
+            cursor.fetchall()
+            cursor.execute("SELECT id, accion, modelo, fecha FROM bench_log WHERE usuario = %s "
+                           "ORDER BY fecha DESC LIMIT 20", [azar.randint(1, 50)])
+            cursor.fetchall()
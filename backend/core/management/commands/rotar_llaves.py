@@ -0,0 +1,175 @@
+import json
+import os
+import multiprocessing
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from core.encryption import crypto_manager
+from core.fields import CampoCifradoMixin
+
+
+def modelos_cifrados():
+    """(etiqueta 'app.Modelo', [campos cifrados]) de cada modelo con campos cifrados."""
+    for modelo in apps.get_models():
+        campos = [f.name for f in modelo._meta.concrete_fields if isinstance(f, CampoCifradoMixin)]
+        if campos:
+            yield modelo._meta.label, campos
+
+
+def _leer_json(ruta, por_defecto=None):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return por_defecto
+
+
+def _escribir_json(ruta, datos):
+    # Escritura atómica: si el proceso muere a mitad, el checkpoint anterior queda intacto
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(datos, f)
+    os.replace(temporal, ruta)
+
+
+def rotar_rango(tarea, batch_size, directorio):
+    """
+    Re-cifra con la llave principal las filas de tarea['modelo'] con pk en (desde, hasta].
+    Avanza en lotes ordenados por pk; cada lote es una transacción corta y al terminarla
+    se guarda el último pk procesado para poder reanudar.
+    """
+    import django
+    django.setup()  # Necesario si el proceso hijo arrancó con "spawn" (Windows)
+
+    modelo = apps.get_model(tarea['modelo'])
+    campos = tarea['campos']
+    ruta = os.path.join(directorio, f"{tarea['id']}.json")
+    progreso = _leer_json(ruta, {'ultimo': tarea['desde'], 'rotadas': 0, 'ilegibles': 0, 'hecho': False})
+    if progreso['hecho']:
+        return tarea['id'], progreso
+
+    while True:
+        with transaction.atomic():
+            qs = modelo.objects.filter(pk__gt=progreso['ultimo'])
+            if tarea['hasta'] is not None:
+                qs = qs.filter(pk__lte=tarea['hasta'])
+            # FOR UPDATE bloquea solo las filas del lote (en SQLite no aplica)
+            filas = list(qs.order_by('pk').select_for_update().values_list('pk', *campos)[:batch_size])
+            if not filas:
+                break
+
+            objetos = []
+            for pk, *tokens in filas:
+                if not any(crypto_manager.necesita_rotacion(t) for t in tokens):
+                    continue
+                textos = [crypto_manager.decrypt(t) for t in tokens]
+                if "ERROR_DECRYPT" in textos:
+                    # Nunca sobrescribir un dato que no pudimos leer
+                    progreso['ilegibles'] += 1
+                    continue
+                obj = modelo(pk=pk)
+                for campo, texto in zip(campos, textos):
+                    setattr(obj, campo, texto)
+                objetos.append(obj)
+
+            # bulk_update cifra con la llave principal al guardar
+            if objetos:
+                modelo.objects.bulk_update(objetos, campos)
+
+        progreso['ultimo'] = filas[-1][0]
+        progreso['rotadas'] += len(objetos)
+        _escribir_json(ruta, progreso)
+
+    progreso['hecho'] = True
+    _escribir_json(ruta, progreso)
+    connections.close_all()
+    return tarea['id'], progreso
+
+
+class Command(BaseCommand):
+    help = ("Re-cifra todos los campos cifrados con la llave principal (ENCRYPTION_KEY_ID). "
+            "Trabaja en lotes por pk con bulk_update, guarda checkpoints para reanudar y reparte "
+            "rangos de pk entre varios procesos (en SQLite, uno solo). Antes de correrlo, todas "
+            "las instancias de la app deben usar ya el nuevo ENCRYPTION_KEY_ID.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Filas por lote/transacción.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Procesos en paralelo.")
+        parser.add_argument('--checkpoint-dir', default=str(settings.BASE_DIR / '.rotacion_llaves'),
+                            help="Directorio donde se guarda el plan y el avance.")
+        parser.add_argument('--reiniciar', action='store_true', help="Descarta el avance guardado.")
+
+    def handle(self, *args, **options):
+        directorio = os.path.join(options['checkpoint_dir'], crypto_manager.key_id)
+        os.makedirs(directorio, exist_ok=True)
+        ruta_plan = os.path.join(directorio, 'plan.json')
+
+        if options['reiniciar']:
+            for nombre in os.listdir(directorio):
+                os.remove(os.path.join(directorio, nombre))
+
+        # El plan se guarda para que al reanudar los rangos sean los mismos
+        plan = _leer_json(ruta_plan)
+        if plan is None:
+            plan = self._armar_plan(max(1, options['workers']))
+            _escribir_json(ruta_plan, plan)
+            self.stdout.write(f"Plan nuevo: {len(plan)} rangos para la llave '{crypto_manager.key_id}'")
+        else:
+            self.stdout.write(f"Reanudando plan existente ({len(plan)} rangos)")
+
+        if not plan:
+            self.stdout.write(self.style.SUCCESS("No hay datos cifrados que rotar."))
+            return
+
+        argumentos = [(tarea, options['batch_size'], directorio) for tarea in plan]
+        workers = min(options['workers'], len(plan))
+        if workers > 1 and connections['default'].vendor == 'sqlite':
+            # SQLite admite un solo escritor: varios procesos solo se bloquean entre sí
+            self.stdout.write(self.style.WARNING("SQLite: se procesan los rangos en un solo proceso."))
+            workers = 1
+        if workers <= 1:
+            resultados = [rotar_rango(*a) for a in argumentos]
+        else:
+            # Los hijos no deben heredar conexiones abiertas del padre
+            connections.close_all()
+            with multiprocessing.Pool(processes=workers) as pool:
+                resultados = pool.starmap(rotar_rango, argumentos)
+
+        total_rotadas = total_ilegibles = 0
+        for tarea_id, progreso in resultados:
+            total_rotadas += progreso['rotadas']
+            total_ilegibles += progreso['ilegibles']
+            self.stdout.write(f"  {tarea_id}: rotadas {progreso['rotadas']}, ilegibles {progreso['ilegibles']}")
+
+        if total_ilegibles:
+            raise CommandError(f"{total_ilegibles} filas no se pudieron descifrar y quedaron sin rotar.")
+        self.stdout.write(self.style.SUCCESS(f"Rotación completa: {total_rotadas} filas re-cifradas."))
+
+    def _armar_plan(self, workers):
+        """Divide el rango de pk de cada modelo en tramos contiguos, uno por proceso."""
+        plan = []
+        for etiqueta, campos in modelos_cifrados():
+            modelo = apps.get_model(etiqueta)
+            pks = modelo.objects.order_by('pk').values_list('pk', flat=True)
+            primero, ultimo = pks.first(), pks.last()
+            if primero is None:
+                continue
+            paso = max(1, (ultimo - primero + 1) // workers + 1)
+            desde = primero - 1
+            for i in range(workers):
+                # El último tramo queda abierto para incluir filas creadas durante la rotación
+                hasta = None if i == workers - 1 else min(desde + paso, ultimo)
+                plan.append({
+                    'id': f"{etiqueta}-{i}",
+                    'modelo': etiqueta,
+                    'campos': campos,
+                    'desde': desde,
+                    'hasta': hasta,
+                })
+                if hasta is None or hasta >= ultimo:
+                    if hasta is not None:
+                        plan[-1]['hasta'] = None
+                    break
+                desde = hasta
+        return plan
@@ -0,0 +1,226 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+from django.conf import settings
+from django.db import connections
+
+# Límites de los histogramas de latencia (segundos), al estilo Prometheus
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FUERA_DE_REQUEST = '(fuera_de_request)'
+
+
+class Histograma:
+    __slots__ = ('cubetas', 'suma', 'cantidad')
+
+    def __init__(self):
+        self.cubetas = [0] * (len(BUCKETS) + 1)  # La última es +Inf
+        self.suma = 0.0
+        self.cantidad = 0
+
+    def observar(self, valor):
+        self.cubetas[bisect_left(BUCKETS, valor)] += 1
+        self.suma += valor
+        self.cantidad += 1
+
+
+class Metricas:
+    """
+    Métricas en memoria del proceso, expuestas en formato texto de Prometheus (/api/metrics).
+    Pensado para dejarlo encendido: por request se toman dos perf_counter, se envuelven las
+    consultas SQL de cada conexión con execute_wrapper y se toma el lock una sola vez al final
+    (en las respuestas en streaming, al cerrarse, así cuenta también lo que se genera al enviar).
+    Los contadores de cifrado se acumulan en un thread-local del request (sin lock) y se
+    atribuyen a su ruta al terminar. Cada proceso (worker de gunicorn) lleva sus propios números.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.contadores = defaultdict(float)    # (nombre, etiquetas) -> valor
+        self.histogramas = defaultdict(Histograma)
+
+    @property
+    def activas(self):
+        return getattr(settings, 'METRICAS_ACTIVAS', True)
+
+    # --- REGISTRO ---
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        with self._lock:
+            self.contadores[(nombre, tuple(sorted(etiquetas.items())))] += valor
+
+    def observar(self, nombre, valor, **etiquetas):
+        with self._lock:
+            self.histogramas[(nombre, tuple(sorted(etiquetas.items())))].observar(valor)
+
+    def registrar_cifrado(self, operacion, cantidad=1, errores=0):
+        """Hook de CryptoManager: operacion es 'decrypt' o 'encrypt'."""
+        peticion = getattr(self._local, 'peticion', None)
+        if peticion is not None:
+            peticion[operacion] += cantidad
+            peticion['errores'] += errores
+            return
+        self.incrementar('cifrado_operaciones_total', cantidad, operacion=operacion, ruta=FUERA_DE_REQUEST)
+        if errores:
+            self.incrementar('cifrado_errores_descifrado_total', errores, ruta=FUERA_DE_REQUEST)
+
+    def cronometrar(self, reporte):
+        """Decorador para generadores de reportes: reporte_duracion_segundos{reporte}."""
+        def decorador(funcion):
+            @wraps(funcion)
+            def envoltura(*args, **kwargs):
+                inicio = time.perf_counter()
+                try:
+                    return funcion(*args, **kwargs)
+                finally:
+                    self.observar('reporte_duracion_segundos', time.perf_counter() - inicio, reporte=reporte)
+            return envoltura
+        return decorador
+
+    def cerrar_request(self, ruta, metodo, estado, duracion, sql, peticion):
+        with self._lock:
+            self.histogramas[('http_duracion_segundos', (('metodo', metodo), ('ruta', ruta)))].observar(duracion)
+            self.contadores[('http_requests_total', (('estado', estado), ('metodo', metodo), ('ruta', ruta)))] += 1
+            self.contadores[('sql_consultas_total', (('ruta', ruta),))] += sql['consultas']
+            self.contadores[('sql_segundos_total', (('ruta', ruta),))] += sql['segundos']
+            for operacion in ('decrypt', 'encrypt'):
+                if peticion[operacion]:
+                    self.contadores[('cifrado_operaciones_total', (('operacion', operacion), ('ruta', ruta)))] += peticion[operacion]
+            if peticion['errores']:
+                self.contadores[('cifrado_errores_descifrado_total', (('ruta', ruta),))] += peticion['errores']
+
+    def reiniciar(self):
+        with self._lock:
+            self.contadores.clear()
+            self.histogramas.clear()
+
+    # --- EXPOSICIÓN ---
+    @staticmethod
+    def _etiquetas(etiquetas, extra=()):
+        pares = list(etiquetas) + list(extra)
+        if not pares:
+            return ''
+        escapar = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+        return '{' + ','.join(f'{k}="{escapar(v)}"' for k, v in pares) + '}'
+
+    def prometheus(self):
+        with self._lock:
+            contadores = sorted(self.contadores.items())
+            histogramas = sorted(
+                (clave, (list(h.cubetas), h.suma, h.cantidad)) for clave, h in self.histogramas.items()
+            )
+
+        lineas = []
+        declarados = set()
+        for (nombre, etiquetas), valor in contadores:
+            if nombre not in declarados:
+                lineas.append(f"# TYPE {nombre} counter")
+                declarados.add(nombre)
+            lineas.append(f"{nombre}{self._etiquetas(etiquetas)} {valor:g}")
+
+        for (nombre, etiquetas), (cubetas, suma, cantidad) in histogramas:
+            if nombre not in declarados:
+                lineas.append(f"# TYPE {nombre} histogram")
+                declarados.add(nombre)
+            acumulado = 0
+            for limite, n in zip(list(BUCKETS) + ['+Inf'], cubetas):
+                acumulado += n
+                lineas.append(f"{nombre}_bucket{self._etiquetas(etiquetas, [('le', limite)])} {acumulado}")
+            lineas.append(f"{nombre}_sum{self._etiquetas(etiquetas)} {suma:.6f}")
+            lineas.append(f"{nombre}_count{self._etiquetas(etiquetas)} {cantidad}")
+        return '\n'.join(lineas) + '\n'
+
+# Instancia global
+metricas = Metricas()
+
+
+class _Medicion:
+    """Lo que se acumula durante un request: SQL de todas las conexiones y operaciones de cifrado."""
+
+    def __init__(self, request):
+        self.request = request
+        self.inicio = time.perf_counter()
+        self.sql = {'consultas': 0, 'segundos': 0.0}
+        self.peticion = defaultdict(int)
+        self.cerrada = False
+
+    def medir_sql(self, execute, sql_texto, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql_texto, params, many, context)
+        finally:
+            self.sql['consultas'] += 1
+            self.sql['segundos'] += time.perf_counter() - inicio
+
+    @contextmanager
+    def activa(self):
+        # Todas las bases (primaria, réplica...), no solo la conexión por defecto
+        metricas._local.peticion = self.peticion
+        try:
+            with ExitStack() as envolturas:
+                for alias in connections:
+                    envolturas.enter_context(connections[alias].execute_wrapper(self.medir_sql))
+                yield
+        finally:
+            metricas._local.peticion = None
+
+    def cerrar(self, estado):
+        if self.cerrada:
+            return
+        self.cerrada = True
+        match = getattr(self.request, 'resolver_match', None)
+        ruta = (match.view_name or match.route) if match else 'sin_ruta'
+        metricas.cerrar_request(ruta, self.request.method, estado, time.perf_counter() - self.inicio,
+                                self.sql, self.peticion)
+
+
+class _ContenidoMedido:
+    """
+    Envuelve el streaming_content: cada trozo se genera con la medición activa y el request
+    se registra cuando la respuesta se cierra (enviada completa o cortada por el cliente).
+    """
+
+    def __init__(self, contenido, medicion, estado):
+        self.iterador = iter(contenido)
+        self.medicion = medicion
+        self.estado = estado
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self.medicion.activa():
+            return next(self.iterador)
+
+    def close(self):
+        self.medicion.cerrar(self.estado)
+
+
+class MetricasMiddleware:
+    """Latencia por ruta (nombre de la vista, no la URL: así no explota la cantidad de series)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not metricas.activas:
+            return self.get_response(request)
+
+        medicion = _Medicion(request)
+        try:
+            with medicion.activa():
+                response = self.get_response(request)
+        except BaseException:
+            medicion.cerrar('5xx')
+            raise
+
+        estado = f"{response.status_code // 100}xx"
+        # Un archivo (FileResponse) se deja pasar tal cual para no perder sendfile
+        if (getattr(response, 'streaming', False) and not response.is_async
+                and getattr(response, 'file_to_stream', None) is None):
+            response.streaming_content = _ContenidoMedido(response.streaming_content, medicion, estado)
+        else:
+            medicion.cerrar(estado)
+        return response
@@ -0,0 +1,222 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from core.metricas import metricas
+
+_en_replica = ContextVar('en_replica', default=False)
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+# Cachés que no se comparten entre procesos: la marca de "escribió hace poco" no llega a los demás workers
+CACHES_POR_PROCESO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def usar_replica():
+    """Las lecturas hechas dentro van a la réplica (si está configurada y al día)."""
+    token = _en_replica.set(True)
+    try:
+        yield
+    finally:
+        _en_replica.reset(token)
+
+
+class EstadoReplica:
+    """
+    Salud de la réplica: se mide el atraso con una consulta cada REPLICA_LAG_REFRESCO segundos
+    y se comparte entre los hilos del proceso. Si no responde o va más atrasada que
+    REPLICA_LAG_MAX, las lecturas marcadas vuelven a la primaria hasta la siguiente medición.
+    """
+
+    def __init__(self):
+        self._disponible = False
+        self._medido = None
+        self._lock = threading.Lock()
+
+    @property
+    def alias(self):
+        return getattr(settings, 'REPLICA_ALIAS', 'replica')
+
+    def configurada(self):
+        return self.alias in settings.DATABASES
+
+    def medir_lag(self):
+        """Segundos de atraso respecto de la primaria (0 si el motor no lo informa)."""
+        conexion = connections[self.alias]
+        with conexion.cursor() as cursor:
+            if conexion.vendor == 'postgresql':
+                # Sin WAL pendiente no hay atraso aunque la última transacción sea antigua
+                cursor.execute(
+                    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+                    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+                )
+            else:
+                cursor.execute("SELECT 0")
+            return float(cursor.fetchone()[0] or 0)
+
+    def disponible(self):
+        if not self.configurada():
+            return False
+        intervalo = getattr(settings, 'REPLICA_LAG_REFRESCO', 2)
+        if self._medido is not None and time.monotonic() - self._medido < intervalo:
+            return self._disponible
+        with self._lock:
+            if self._medido is not None and time.monotonic() - self._medido < intervalo:
+                return self._disponible
+            try:
+                lag = self.medir_lag()
+                self._disponible = lag <= getattr(settings, 'REPLICA_LAG_MAX', 5)
+            except Exception as e:
+                logger.warning("Réplica '%s' no responde, se lee de la primaria: %s", self.alias, e)
+                connections[self.alias].close()
+                self._disponible = False
+            self._medido = time.monotonic()
+        return self._disponible
+
+    def invalidar(self):
+        """Obliga a medir de nuevo en la próxima lectura."""
+        self._medido = None
+
+# Instancia global
+estado_replica = EstadoReplica()
+
+
+# --- LEER LO QUE UNO MISMO ESCRIBIÓ ---
+def _llave_escritura(usuario_id):
+    return f"replica:escritura:{usuario_id}"
+
+
+def marcar_escritura(usuario_id):
+    """Tras una escritura del usuario, sus lecturas van a la primaria por REPLICA_PEGAJOSO_SEGUNDOS."""
+    cache.set(_llave_escritura(usuario_id), True, getattr(settings, 'REPLICA_PEGAJOSO_SEGUNDOS', 10))
+
+
+def escribio_hace_poco(usuario_id):
+    return cache.get(_llave_escritura(usuario_id), False)
+
+
+def revisar_cache_compartida(app_configs, **kwargs):
+    """System check: con réplica y una caché por proceso, leer lo propio solo funciona con un worker."""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if not estado_replica.configurada() or backend not in CACHES_POR_PROCESO:
+        return []
+    return [checks.Warning(
+        f"La réplica '{estado_replica.alias}' está activa pero la caché es {backend.rsplit('.', 1)[-1]}: "
+        "cada worker tiene la suya y un usuario puede no ver lo que acaba de escribir.",
+        hint="Configure en CACHES una caché compartida (Redis, Memcached o DatabaseCache).",
+        id='core.W001',
+    )]
+
+
+def _destino(request):
+    """Decide si las lecturas de este request (ya autenticado) pueden ir a la réplica."""
+    if not estado_replica.configurada() or request.method not in METODOS_SEGUROS:
+        return False
+    usuario = getattr(request, 'user', None)
+    if usuario is not None and usuario.is_authenticated and escribio_hace_poco(usuario.id):
+        metricas.incrementar('replica_lecturas_total', destino='primaria', motivo='escritura_propia')
+        return False
+    if not estado_replica.disponible():
+        metricas.incrementar('replica_lecturas_total', destino='primaria', motivo='lag')
+        return False
+    metricas.incrementar('replica_lecturas_total', destino='replica', motivo='')
+    return True
+
+
+def _iterar_en_replica(iterable):
+    # Las respuestas en streaming consultan la BD al enviarse, después de salir de la vista
+    iterador = iter(iterable)
+    while True:
+        with usar_replica():
+            try:
+                trozo = next(iterador)
+            except StopIteration:
+                return
+        yield trozo
+
+
+def _respuesta_en_replica(response):
+    if getattr(response, 'streaming', False):
+        response.streaming_content = _iterar_en_replica(response.streaming_content)
+    return response
+
+
+# --- ANOTACIONES POR VISTA ---
+def lectura_en_replica(vista):
+    """
+    Para vistas de función de solo lectura. Va debajo de @api_view/@permission_classes, así
+    corre con el usuario ya autenticado y los permisos revisados contra la primaria.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if not _destino(request):
+            return vista(request, *args, **kwargs)
+        with usar_replica():
+            return _respuesta_en_replica(vista(request, *args, **kwargs))
+    return envoltura
+
+
+class LecturaReplicaMixin:
+    """Para viewsets: las acciones de `acciones_replica` (GET) leen de la réplica."""
+    acciones_replica = ('list',)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.acciones_replica and _destino(request):
+            self._token_replica = _en_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_token_replica', None)
+        if token is not None:
+            self._token_replica = None
+            _en_replica.reset(token)
+            response = _respuesta_en_replica(response)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class RouterReplica:
+    """Lecturas marcadas -> réplica; todo lo demás (y toda escritura) -> primaria."""
+
+    def db_for_read(self, model, **hints):
+        if _en_replica.get() and estado_replica.configurada():
+            return estado_replica.alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bases = {DEFAULT_DB_ALIAS, estado_replica.alias}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por la replicación, no por migrate
+        return False if db == estado_replica.alias else None
+
+
+class ReplicaMiddleware:
+    """Anota las escrituras exitosas de cada usuario para no mandarlo a una réplica atrasada."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in METODOS_SEGUROS and response.status_code < 400 and estado_replica.configurada():
+            usuario = getattr(request, 'user', None)
+            if usuario is not None and usuario.is_authenticated:
+                marcar_escritura(usuario.id)
+        return response
@@ -1,3 +1,158 @@
-from django.test import TestCase
+import base64
+import os
+from unittest import mock
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+from core.encryption import CryptoManager, DecryptCache, crypto_manager
+from core.fields import BytesCifrados, EncryptedBinaryField
 
-# Create your tests here.
+
+# ==========================================
+# CIFRADO EN LOTE (decrypt_many / encrypt_many)
+# ==========================================
+class CifradoEnLoteTest(SimpleTestCase):
+
+    def test_conserva_el_orden_al_repartir_entre_hilos(self):
+        textos = [f"Paciente {i}" for i in range(50)]
+        # Trozos de 3 en 4 hilos: el resultado se arma con trozos terminados en distinto orden
+        tokens = crypto_manager.encrypt_many(textos, chunk_size=3, max_workers=4)
+        self.assertEqual(crypto_manager.decrypt_many(tokens, chunk_size=3, max_workers=4), textos)
+        self.assertEqual(crypto_manager.decrypt_many(tokens, chunk_size=3, max_workers=1), textos)
+
+    def test_errores_y_vacios_quedan_en_su_posicion(self):
+        bueno = crypto_manager.encrypt("Ana")
+        resultado = crypto_manager.decrypt_many(['garbage', bueno, None, '', bueno], chunk_size=2, max_workers=2)
+        self.assertEqual(resultado, ["ERROR_DECRYPT", "Ana", None, None, "Ana"])
+
+    def test_encrypt_many_deja_vacios_sin_cifrar(self):
+        tokens = crypto_manager.encrypt_many(['Ana', None, '', 'Berta'], chunk_size=1, max_workers=2)
+        self.assertIsNone(tokens[1])
+        self.assertIsNone(tokens[2])
+        self.assertNotEqual(tokens[0], 'Ana')
+        self.assertEqual(crypto_manager.decrypt_many(tokens), ['Ana', None, None, 'Berta'])
+
+
+# ==========================================
+# CACHÉ DE DESCIFRADO (LRU con TTL y tope de bytes)
+# ==========================================
+class DecryptCacheTest(SimpleTestCase):
+
+    def test_vence_por_ttl(self):
+        cache = DecryptCache(ttl=10)
+        with mock.patch('core.encryption.time.monotonic', return_value=100.0):
+            cache.set('token', 'Ana')
+            self.assertEqual(cache.get('token'), 'Ana')
+        with mock.patch('core.encryption.time.monotonic', return_value=111.0):
+            self.assertIsNone(cache.get('token'))
+        self.assertEqual(cache.stats(), {'entries': 0, 'bytes': 0, 'hits': 1, 'misses': 1})
+
+    def test_tope_de_bytes_expulsa_la_menos_usada(self):
+        # Cada entrada pesa 2 (token) + 4 (texto) = 6 bytes: caben dos
+        cache = DecryptCache(max_bytes=12)
+        cache.set('t1', 'aaaa')
+        cache.set('t2', 'bbbb')
+        cache.get('t1')  # t2 pasa a ser la menos usada
+        cache.set('t3', 'cccc')
+        self.assertIsNone(cache.get('t2'))
+        self.assertEqual((cache.get('t1'), cache.get('t3')), ('aaaa', 'cccc'))
+        self.assertEqual(cache.stats()['bytes'], 12)
+
+        cache.set('t4', 'x' * 20)  # Más grande que el tope completo: no se guarda
+        self.assertIsNone(cache.get('t4'))
+        self.assertEqual(cache.stats()['entries'], 2)
+
+    def test_purge(self):
+        cache = DecryptCache()
+        cache.set('t1', 'Ana')
+        cache.purge()
+        self.assertIsNone(cache.get('t1'))
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+    @override_settings(ENCRYPTION_CACHE_ENABLED=True)
+    def test_crypto_manager_usa_la_cache_y_no_guarda_errores(self):
+        cripto = CryptoManager()
+        token = cripto.encrypt("Ana")
+        self.assertEqual([cripto.decrypt(token), cripto.decrypt(token)], ["Ana", "Ana"])
+        self.assertEqual(cripto.decrypt('garbage'), "ERROR_DECRYPT")
+        self.assertEqual(cripto.cache_stats(), {'enabled': True, 'entries': 1, 'bytes': len(token) + 3, 'hits': 1, 'misses': 2})
+
+        cripto.purge_cache()
+        self.assertEqual(cripto.cache_stats()['entries'], 0)
+
+
+# ==========================================
+# LLAVERO Y PREFIJO DE LLAVE ("<id>:<base64>")
+# ==========================================
+LLAVE_2 = base64.urlsafe_b64encode(os.urandom(32)).decode()
+
+
+class LlaveroTest(SimpleTestCase):
+
+    def setUp(self):
+        # Tokens cifrados con la llave 1, antes de la rotación
+        with override_settings(ENCRYPTION_KEYS={'1': settings.ENCRYPTION_KEY}, ENCRYPTION_KEY_ID='1'):
+            antigua = CryptoManager()
+        self.con_llave_1 = antigua.encrypt("Ana")
+        self.sin_prefijo = self.con_llave_1.split(':', 1)[1]  # Formato de antes del llavero
+        self.binario_1 = antigua.encrypt_bytes("Ana")
+
+        with override_settings(ENCRYPTION_KEYS={'1': settings.ENCRYPTION_KEY, '2': LLAVE_2},
+                               ENCRYPTION_KEY_ID='2', ENCRYPTION_LEGACY_KEY_ID='1'):
+            self.cripto = CryptoManager()
+
+    def test_descifra_tokens_de_cada_llave(self):
+        con_llave_2 = self.cripto.encrypt("Berta")
+        self.assertTrue(con_llave_2.startswith('2:'))
+        self.assertTrue(self.con_llave_1.startswith('1:'))
+        for token, esperado in ((self.sin_prefijo, "Ana"), (self.con_llave_1, "Ana"), (con_llave_2, "Berta"),
+                                (self.binario_1, "Ana"), (self.cripto.encrypt_bytes("Berta"), "Berta")):
+            with self.subTest(token=token[:8]):
+                self.assertEqual(self.cripto.decrypt(token), esperado)
+
+    def test_necesita_rotacion_todo_lo_que_no_sea_la_llave_principal(self):
+        self.assertEqual(self.cripto.key_id_de(self.sin_prefijo), '1')
+        self.assertTrue(self.cripto.necesita_rotacion(self.sin_prefijo))
+        self.assertTrue(self.cripto.necesita_rotacion(self.con_llave_1))
+        self.assertTrue(self.cripto.necesita_rotacion(self.binario_1))
+        self.assertFalse(self.cripto.necesita_rotacion(self.cripto.encrypt("Berta")))
+        self.assertFalse(self.cripto.necesita_rotacion(self.cripto.encrypt_bytes("Berta")))
+
+    def test_llave_desconocida(self):
+        self.assertEqual(self.cripto.decrypt('9:' + self.sin_prefijo), "ERROR_DECRYPT")
+        with override_settings(ENCRYPTION_KEYS={'1': settings.ENCRYPTION_KEY}, ENCRYPTION_KEY_ID='2'):
+            with self.assertRaises(ValueError):
+                CryptoManager()
+
+
+# ==========================================
+# FORMATO BINARIO ([largo id][id llave][nonce][ciphertext])
+# ==========================================
+class FormatoBinarioTest(SimpleTestCase):
+
+    def test_ida_y_vuelta(self):
+        for texto in ("Ana", "María José Pérez-Soto", "ñ" * 300):
+            binario = crypto_manager.encrypt_bytes(texto)
+            self.assertIsInstance(binario, bytes)
+            self.assertEqual(crypto_manager.decrypt(binario), texto)
+            self.assertEqual(crypto_manager.decrypt(memoryview(binario)), texto)  # Así lo entrega PostgreSQL
+            self.assertLess(len(binario), len(crypto_manager.encrypt(texto)))
+        self.assertIsNone(crypto_manager.encrypt_bytes(''))
+        self.assertIsNone(crypto_manager.encrypt_bytes(None))
+
+    def test_token_de_texto_a_binario_sin_descifrar(self):
+        token = crypto_manager.encrypt("Ana")
+        for entrada in (token, token.split(':', 1)[1]):  # Con prefijo de llave y antiguo sin prefijo
+            binario = crypto_manager.token_a_binario(entrada)
+            self.assertEqual(crypto_manager.key_id_de(binario), crypto_manager.key_id_de(entrada))
+            self.assertEqual(crypto_manager.decrypt(binario), "Ana")
+        self.assertIsNone(crypto_manager.token_a_binario(''))
+
+    def test_campo_binario(self):
+        campo = EncryptedBinaryField()
+        guardado = campo.get_prep_value("Ana")
+        self.assertEqual(crypto_manager.decrypt(guardado), "Ana")
+        leido = campo.from_db_value(memoryview(guardado), None, None)
+        self.assertIsInstance(leido, BytesCifrados)
+        self.assertEqual(campo.get_prep_value(leido), guardado)  # Sin volver a cifrar
+        self.assertEqual((campo.get_prep_value(''), campo.from_db_value(b'', None, None)), (b'', ''))
+        self.assertEqual((campo.get_prep_value(None), campo.from_db_value(None, None, None)), (None, None))
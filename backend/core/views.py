@@ -1,3 +1,11 @@
-from django.shortcuts import render
+from django.http import HttpResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from core.metricas import metricas
 
-# Create your views here.
+
+# GET /api/metrics -> formato texto de Prometheus (solo staff)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metricas_prometheus(request):
+    return HttpResponse(metricas.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -15,6 +15,12 @@ export interface Alta {
   autorizador?: string;
 }
 
+export interface ResumenAltas {
+  por_estado: Record<string, number>;
+  pendientes: number;
+  total: number;
+}
+
 // Alias para compatibilidad
 export type AltaMedica = Alta;
 
@@ -25,8 +31,15 @@ export const altasApi = {
   },
 
   getPendientes: async (): Promise<Alta[]> => {
-    const response = await api.get('/api/altas/');
-    return response.data.filter((a: Alta) => a.estado === 'PENDIENTE');
+    // El filtro se hace en el servidor
+    const response = await api.get('/api/altas/', { params: { estado: 'PENDIENTE' } });
+    return response.data;
+  },
+
+  // Solo conteos por estado (para badges/notificaciones), sin traer las altas
+  getResumen: async (): Promise<ResumenAltas> => {
+    const response = await api.get('/api/altas/resumen/');
+    return response.data;
   },
 
   getById: async (id: number): Promise<Alta> => {
@@ -61,6 +74,21 @@ export const altasApi = {
     });
     return response.data;
   },
+
+  // ZIP con los PDF de varias altas (por ids y/o filtros, ej: { estado: 'AUTORIZADA', desde: '2025-01-31' })
+  descargarLotePDF: async (ids?: number[], filtros: Record<string, string> = {}): Promise<void> => {
+    const response = await api.post('/api/altas/pdf-lote/', ids ? { ids } : {}, {
+      params: filtros,
+      responseType: 'blob',
+    });
+    const url = window.URL.createObjectURL(new Blob([response.data]));
+    const link = document.createElement('a');
+    link.href = url;
+    link.setAttribute('download', 'Altas.zip');
+    document.body.appendChild(link);
+    link.click();
+    link.remove();
+  },
 };
 
 export default altasApi;
\ No newline at end of file
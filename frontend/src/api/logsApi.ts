@@ -1,4 +1,5 @@
 import api from './axios';
+import { reportesApi } from './reportesApi';
 
 export interface LogActividad {
   id: number;
@@ -12,24 +13,25 @@ export interface LogActividad {
   ip_address: string | null;
 }
 
+// Filtros del servidor (mismos en /api/logs/ y en el PDF). Fechas AAAA-MM-DD, hasta inclusive
+export interface FiltrosLog {
+  usuario?: string;
+  rol?: string;
+  accion?: string;
+  modelo?: string;
+  ip?: string;
+  desde?: string;
+  hasta?: string;
+}
+
 export const logsApi = {
-  getAll: async (): Promise<LogActividad[]> => {
-    const response = await api.get('/api/logs/');
+  getAll: async (filtros: FiltrosLog = {}): Promise<LogActividad[]> => {
+    const response = await api.get('/api/logs/', { params: filtros });
     return response.data;
   },
 
-  exportarAuditoriaPDF: async (): Promise<void> => {
-    // CORRECCIÓN: La ruta en urls.py es 'reportes/logs/'
-    const response = await api.get('/api/reportes/logs/', {
-      responseType: 'blob',
-    });
-    
-    const url = window.URL.createObjectURL(new Blob([response.data]));
-    const link = document.createElement('a');
-    link.href = url;
-    link.setAttribute('download', 'Auditoria.pdf');
-    document.body.appendChild(link);
-    link.click();
-    link.remove();
+  exportarAuditoriaPDF: async (filtros: FiltrosLog = {}, limite = 100): Promise<void> => {
+    // Se genera en la cola de reportes (no bloquea al servidor web)
+    await reportesApi.generarYDescargar('auditoria', { ...filtros, limite }, 'Auditoria.pdf');
   },
 };
\ No newline at end of file
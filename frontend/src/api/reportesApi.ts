@@ -1,32 +1,75 @@
 import api from './axios';
 
+export interface ReporteJob {
+  id: number;
+  tipo: 'excel_partos' | 'rem' | 'auditoria' | 'alta_pdf';
+  parametros?: Record<string, unknown>;
+  estado: 'PENDIENTE' | 'EN_PROCESO' | 'LISTO' | 'ERROR' | 'VENCIDO';
+  error?: string;
+  nombre_archivo: string;
+  descarga: string | null;
+}
+
+const esperar = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+const INTERVALO_MS = 2000;
+// Un trabajo que nadie toma en este tiempo indica que no hay worker (procesar_reportes) corriendo
+const MAX_PENDIENTE_MS = 60 * 1000;
+// Tope total; el servidor da por muerto un trabajo EN_PROCESO a los 10 min (REPORTES_JOB_TIMEOUT)
+const MAX_ESPERA_MS = 12 * 60 * 1000;
+
+// Errores del propio reporte (falló en el worker, nadie lo tomó, tardó demasiado): su texto sirve al usuario
+export class ErrorReporte extends Error {}
+
+export const mensajeError = (error: unknown, porDefecto: string): string =>
+  error instanceof ErrorReporte ? error.message : porDefecto;
+
+const guardarArchivo = (data: Blob, nombre: string) => {
+  const url = window.URL.createObjectURL(new Blob([data]));
+  const link = document.createElement('a');
+  link.href = url;
+  link.setAttribute('download', nombre);
+  document.body.appendChild(link);
+  link.click();
+  link.remove();
+};
+
 export const reportesApi = {
+  // Encola el reporte, consulta su estado cada 2s y lo descarga al quedar listo.
+  // El servidor lo genera en un worker aparte (procesar_reportes), no dentro del request:
+  // si nadie lo toma o no termina a tiempo se corta con un error en vez de esperar para siempre.
+  generarYDescargar: async (
+    tipo: ReporteJob['tipo'],
+    parametros: Record<string, unknown> = {},
+    nombreDescarga?: string,
+  ): Promise<void> => {
+    let job: ReporteJob = (await api.post('/api/reportes/jobs/', { tipo, parametros })).data;
+    const inicio = Date.now();
+
+    while (job.estado === 'PENDIENTE' || job.estado === 'EN_PROCESO') {
+      const transcurrido = Date.now() - inicio;
+      if (job.estado === 'PENDIENTE' && transcurrido > MAX_PENDIENTE_MS) {
+        throw new ErrorReporte('El servidor no tomó el reporte: revise que el worker de reportes (procesar_reportes) esté corriendo.');
+      }
+      if (transcurrido > MAX_ESPERA_MS) {
+        throw new ErrorReporte('El reporte tardó demasiado en generarse. Intente de nuevo más tarde.');
+      }
+      await esperar(INTERVALO_MS);
+      job = (await api.get(`/api/reportes/jobs/${job.id}/`)).data;
+    }
+    if (job.estado !== 'LISTO' || !job.descarga) {
+      throw new ErrorReporte(job.error || `Reporte ${job.estado.toLowerCase()}`);
+    }
+
+    const response = await api.get(job.descarga, { responseType: 'blob' });
+    guardarArchivo(response.data, nombreDescarga || job.nombre_archivo);
+  },
+
   descargarExcel: async (): Promise<void> => {
-    const response = await api.get('/api/reportes/excel/', {
-      responseType: 'blob',
-    });
-    
-    const url = window.URL.createObjectURL(new Blob([response.data]));
-    const link = document.createElement('a');
-    link.href = url;
-    link.setAttribute('download', 'Reporte_Partos.xlsx');
-    document.body.appendChild(link);
-    link.click();
-    link.remove();
+    await reportesApi.generarYDescargar('excel_partos', {}, 'Reporte_Partos.xlsx');
   },
 
   descargarPDF: async (): Promise<void> => {
-    // CORRECCIÓN: La ruta en urls.py es 'reportes/rem/'
-    const response = await api.get('/api/reportes/rem/', {
-      responseType: 'blob',
-    });
-    
-    const url = window.URL.createObjectURL(new Blob([response.data]));
-    const link = document.createElement('a');
-    link.href = url;
-    link.setAttribute('download', 'Reporte_REM.pdf');
-    document.body.appendChild(link);
-    link.click();
-    link.remove();
+    await reportesApi.generarYDescargar('rem', {}, 'Reporte_REM.pdf');
   },
-};
\ No newline at end of file
+};
@@ -471,8 +471,8 @@ export default function EnfermeraPage() {
                         <select name="tipo_parto" value={datosParto.tipo_parto} onChange={handleDatosPartoChange} style={styles.input}>
                           <option value="">Seleccione...</option>
                           <option value="EUTOCICO">Eutócico (Vaginal Normal)</option>
-                          <option value="CESAREA URGENCIA">Cesárea Urgencia</option>
-                          <option value="CESAREA ELECTIVA">Cesárea Electiva</option>
+                          <option value="CESAREA_URGENCIA">Cesárea Urgencia</option>
+                          <option value="CESAREA_ELECTIVA">Cesárea Electiva</option>
                           <option value="FORCEPS">Fórceps</option>
                           <option value="VACUUM">Vacuum</option>
                         </select>
@@ -1,7 +1,7 @@
 import { useState, useEffect } from 'react';
 import { madresApi } from '../../api/madresApi'; // Asegúrate que el archivo sea madresApi.ts (minúscula)
 import { partosApi } from '../../api/partosApi';
-import { reportesApi } from '../../api/reportesApi';
+import { reportesApi, mensajeError } from '../../api/reportesApi';
 import { logsApi, type LogActividad } from '../../api/logsApi';
 import { altasApi, type Alta } from '../../api/altasApi';
 import type { Madre, Parto } from '../../types/models';
@@ -157,7 +157,7 @@ export default function EspecialistaPage({ initialTab = 'informes' }: { initialT
           nombre: madre?.nombre_completo || 'N/A',
           comuna: madre?.comuna || 'N/A',
           fechaParto: parto.fecha,
-          tipoParto: parto.tipo_parto,
+          tipoParto: parto.tipo_parto_display || parto.tipo_parto,
           profesional: parto.profesional_acargo,
           rn: parto.recien_nacidos?.length || 0,
           pesoRN: rn?.peso_gramos || 0,
@@ -184,17 +184,17 @@ export default function EspecialistaPage({ initialTab = 'informes' }: { initialT
 
   const exportarExcel = async () => {
     try { await reportesApi.descargarExcel(); } 
-    catch { alert('Error al descargar Excel'); }
+    catch (e) { alert(mensajeError(e, 'Error al descargar Excel')); }
   };
 
   const exportarPDF = async () => {
     try { await reportesApi.descargarPDF(); } 
-    catch { alert('Error al descargar PDF'); }
+    catch (e) { alert(mensajeError(e, 'Error al descargar PDF')); }
   };
 
   const exportarAuditoria = async () => {
     try { await logsApi.exportarAuditoriaPDF(); } 
-    catch { alert('Error al descargar auditoría'); }
+    catch (e) { alert(mensajeError(e, 'Error al descargar auditoría')); }
   };
 
   const handleAutorizar = async (alta: Alta) => {
@@ -13,9 +13,9 @@ export default function MatronaPage() {
   useEffect(() => {
     const checkPendientes = async () => {
       try {
-        const response = await api.get('/api/altas/');
-        const pendientes = response.data.filter((alta: any) => alta.estado === 'PENDIENTE');
-        setAltasPendientes(pendientes.length);
+        // Solo el conteo: el servidor no serializa ni descifra ninguna alta
+        const response = await api.get('/api/altas/resumen/');
+        setAltasPendientes(response.data.pendientes);
       } catch (error) {
         console.error("Error buscando notificaciones:", error);
       }
@@ -40,7 +40,8 @@ export interface Parto {
   madre: number;
   fecha: string;
   hora: string;
-  tipo_parto: string;
+  tipo_parto: string;  // Código: EUTOCICO, CESAREA_URGENCIA, CESAREA_ELECTIVA, FORCEPS, VACUUM...
+  tipo_parto_display?: string;
   edad_gestacional: number;
   profesional_acargo: string;
   observaciones?: string | null;